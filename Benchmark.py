@@ -0,0 +1,273 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from Loggers import configure_console_logger, configure_perf_logger, timed
+from PromptEngine import PromptEngine, parse_file_paths
+from ContentCache import ContentCache
+from TokenCounter import TokenCounter
+from SearchIndex import SEARCH_FUZZY, SEARCH_GLOB, SEARCH_REGEX, SEARCH_SUBSTRING
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = (1000, 10000)
+BENCHMARK_WHITELIST = "py,cs,cpp,h,json"
+# (extension, share of files); the last two are not whitelisted, so ingestion has something to skip
+EXTENSION_MIX = (("py", 40), ("cs", 15), ("cpp", 12), ("h", 8), ("json", 10), ("md", 10), ("bin", 5))
+# (share of files, smallest, largest size in bytes)
+SIZE_MIX = ((80, 100, 2_000), (18, 2_000, 16_000), (2, 16_000, 128_000))
+MAX_DEPTH = 8
+FILTER_QUERIES = (("mod", SEARCH_SUBSTRING), ("module_1", SEARCH_SUBSTRING), ("*/pkg_3/*.py", SEARCH_GLOB),
+                  ("pkgmdl", SEARCH_FUZZY), (r"module_\d+7\.cs$", SEARCH_REGEX), ("", SEARCH_SUBSTRING))
+TREE_MARKER = ".benchmark_tree"
+
+_CODE_LINES = (
+    "def handler_{n}(request, context=None):\n",
+    "    \"\"\"Handle one request.\"\"\"\n",
+    "    value = compute(request.items, limit={n})  # keep under the limit\n",
+    "    if value is None:\n",
+    "        return []\n",
+    "    return [item for item in value if item.enabled]\n",
+    "\n",
+)
+
+
+def generate_tree(root, file_count, seed=0):
+    """
+    Write a synthetic source tree of file_count files under root: nested packages up to MAX_DEPTH deep (some with
+    spaces in their names), a mix of extensions and file sizes from EXTENSION_MIX and SIZE_MIX. Deterministic per seed.
+    """
+    rng = random.Random(seed)
+    extensions = [extension for extension, _ in EXTENSION_MIX]
+    extension_weights = [weight for _, weight in EXTENSION_MIX]
+    folders = [root]
+    for i in range(max(file_count // 20, 1)):
+        parent = rng.choice(folders)
+        if parent.count(os.sep) - root.count(os.sep) >= MAX_DEPTH:
+            parent = root
+        name = f"pkg_{i % 10}" if i % 7 else f"sub dir {i}"
+        folders.append(os.path.join(parent, f"{name}_{i}" if i >= 10 else name))
+    for folder in folders:
+        os.makedirs(folder, exist_ok=True)
+
+    block = "".join(_CODE_LINES)
+    for i in range(file_count):
+        extension = rng.choices(extensions, extension_weights)[0]
+        _, smallest, largest = rng.choices(SIZE_MIX, [share for share, _, _ in SIZE_MIX])[0]
+        size = rng.randint(smallest, largest)
+        path = os.path.join(rng.choice(folders), f"module_{i}.{extension}")
+        if extension == "bin":
+            with open(path, "wb") as f:
+                f.write(rng.randbytes(size))
+            continue
+        text = block.replace("{n}", str(i)) * (size // len(block) + 1)
+        with open(path, "w", encoding="utf-8", newline="\n") as f:
+            f.write(text[:size])
+    with open(os.path.join(root, TREE_MARKER), "w", encoding="utf-8") as f:
+        f.write(f"{file_count} {seed}\n")
+
+
+def ensure_tree(base_dir, file_count, seed):
+    """The tree for file_count under base_dir, generated once and reused on later runs."""
+    root = os.path.join(base_dir, f"tree_{file_count}")
+    marker = os.path.join(root, TREE_MARKER)
+    if os.path.exists(marker):
+        with open(marker, "r", encoding="utf-8") as f:
+            if f.read().split() == [str(file_count), str(seed)]:
+                return root
+        shutil.rmtree(root)
+    started = time.perf_counter()
+    generate_tree(root, file_count, seed)
+    logger.info(f"[Benchmark] Generated {file_count:,} files in {root} ({time.perf_counter() - started:.1f}s).")
+    return root
+
+
+class StageResult:
+    def __init__(self, stage, file_count, seconds, items, unit, peak_bytes):
+        self.stage = stage
+        self.file_count = file_count
+        self.seconds = seconds
+        self.items = items
+        self.unit = unit
+        self.peak_bytes = peak_bytes
+
+    @property
+    def throughput(self):
+        return self.items / self.seconds if self.seconds > 0 else float("inf")
+
+    def to_dict(self):
+        return {"stage": self.stage, "files": self.file_count, "seconds": round(self.seconds, 6), "items": self.items,
+                "unit": self.unit, "throughput": round(self.throughput, 1), "peak_bytes": self.peak_bytes}
+
+
+class BenchmarkRun:
+    """
+    Runs the headless stages against one tree, recording time and throughput, or peak memory with trace_memory
+    (tracemalloc slows Python code several times over, so timings from a traced run are not representative).
+    """
+
+    def __init__(self, tree_root, file_count, work_dir, select_count, trace_memory=False):
+        self.tree_root = tree_root
+        self.file_count = file_count
+        self.work_dir = work_dir
+        self.select_count = select_count
+        self.trace_memory = trace_memory
+        self.results = []
+
+    def measure(self, stage, unit, func):
+        """Run func() once as a stage; it returns how many `unit`s it processed."""
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.start()
+        try:
+            with timed(f"benchmark.{stage}", files=self.file_count, traced=self.trace_memory) as span:
+                started = time.perf_counter()
+                items = func()
+                seconds = time.perf_counter() - started
+                span["items"] = items
+        finally:
+            peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+            if self.trace_memory:
+                tracemalloc.stop()
+        result = StageResult(stage, self.file_count, seconds, items, unit, peak)
+        self.results.append(result)
+        return result
+
+    def new_engine(self, state_name="state.json", **caches):
+        engine = PromptEngine(state_file_path=os.path.join(self.work_dir, state_name), **caches)
+        engine.set_whitelist(BENCHMARK_WHITELIST)
+        return engine
+
+    def run(self):
+        engine = self.new_engine(content_cache=ContentCache(), token_counter=TokenCounter())
+        self.measure("process_directory", "files", lambda: len(engine.process_directory(self.tree_root, recursive=True)))
+        paths = list(engine.file_entries)
+
+        def add_files():
+            add_engine = self.new_engine()
+            return sum(1 for path in paths if add_engine.add_file(path))
+        self.measure("add_file", "files", add_files)
+
+        def filter_files():
+            for term, mode in FILTER_QUERIES:
+                engine.file_entries.match(term, mode)
+            return len(FILTER_QUERIES)
+        self.measure("filter_files", "queries", filter_files)
+
+        selected = paths[::max(len(paths) // max(self.select_count, 1), 1)][:self.select_count]
+        engine.select_paths(selected, clear=True)
+        engine.last_query_text = "Find where handler results are filtered and explain the limit."
+        self.measure("save_state", "files", lambda: engine.save_state() or len(paths))
+
+        def load_state():
+            loaded = self.new_engine()
+            loaded.load_state()
+            return len(loaded.file_entries)
+        self.measure("load_state", "files", load_state)
+
+        def update_prompt():
+            result = engine.build_prompt()
+            return sum(len(segment) for _, segment in result.segments)
+        self.measure("update_prompt_cold", "chars", update_prompt)
+        self.measure("update_prompt_warm", "chars", update_prompt)
+
+        payload = " ".join("{" + path + "}" if " " in path else path for path in paths)
+        self.measure("parse_file_paths", "paths", lambda: len(parse_file_paths(payload)))
+        return self.results
+
+
+def format_results(results):
+    lines = [f"{'files':>8}  {'stage':<20} {'seconds':>9} {'throughput':>22} {'peak memory':>12}"]
+    for result in results:
+        peak = f"{result.peak_bytes / (1024 * 1024):,.1f} MB" if result.peak_bytes is not None else "-"
+        throughput = f"{result.throughput:,.0f} {result.unit}/s"
+        lines.append(f"{result.file_count:>8,}  {result.stage:<20} {result.seconds:>9.3f} {throughput:>22} {peak:>12}")
+    return "\n".join(lines)
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Stages slower than the baseline run by more than `tolerance` (a fraction), as printable lines."""
+    previous = {(row["files"], row["stage"]): row["seconds"] for row in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get((result.file_count, result.stage))
+        if before and result.seconds > before * (1 + tolerance):
+            regressions.append(f"{result.file_count:,} files, {result.stage}: {before:.3f}s -> {result.seconds:.3f}s "
+                               f"(+{100 * (result.seconds / before - 1):.0f}%)")
+    return regressions
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog="Benchmark.py",
+        description="Time the headless stages (ingestion, filtering, state save/load, prompt build, drop parsing) "
+                    "on synthetic source trees and report throughput and peak memory.",
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), metavar="N",
+                        help="tree sizes in files (default: %(default)s; 100000 takes a few hundred MB of disk)")
+    parser.add_argument("--select", type=int, default=2000, metavar="N",
+                        help="files selected for the prompt build stages (default: %(default)s)")
+    parser.add_argument("--tree-dir", help="keep generated trees here and reuse them on later runs (default: a temp dir)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the generated trees (default: %(default)s)")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the second, traced pass over each tree that measures peak memory")
+    parser.add_argument("--json", metavar="FILE", help="also write the results as JSON (usable as a --baseline)")
+    parser.add_argument("--baseline", metavar="FILE", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="slowdown over the baseline reported as a regression (default: %(default)s = 25%%)")
+    parser.add_argument("--perf-log", metavar="FILE", help="write every timing span as a JSON line to FILE")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress to stderr")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    configure_console_logger(logging.INFO if args.verbose else logging.WARNING, stream=sys.stderr)
+    if args.perf_log:
+        configure_perf_logger(path=args.perf_log)
+
+    base_dir = args.tree_dir or tempfile.mkdtemp(prefix="prompt_builder_benchmark_")
+    os.makedirs(base_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix="prompt_builder_state_")
+    results = []
+    try:
+        for file_count in args.sizes:
+            tree_root = ensure_tree(base_dir, file_count, args.seed)
+            run_results = BenchmarkRun(tree_root, file_count, work_dir, args.select).run()
+            if not args.no_memory:
+                traced = BenchmarkRun(tree_root, file_count, work_dir, args.select, trace_memory=True).run()
+                peaks = {result.stage: result.peak_bytes for result in traced}
+                for result in run_results:
+                    result.peak_bytes = peaks.get(result.stage)
+            results.extend(run_results)
+            print(format_results(run_results), flush=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        if not args.tree_dir:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "trace_memory": not args.no_memory,
+                       "results": [result.to_dict() for result in results]}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nSlower than the baseline:\n" + "\n".join(regressions))
+            return 1
+        print("\nNo stage slower than the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import math
+
+
+PRIORITY_LOW = -1
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 1
+PRIORITY_NAMES = {PRIORITY_LOW: "low", PRIORITY_NORMAL: "normal", PRIORITY_HIGH: "high"}
+
+# How much keeping a file of each priority is worth to the solver
+PRIORITY_WEIGHTS = {PRIORITY_LOW: 1, PRIORITY_NORMAL: 2, PRIORITY_HIGH: 4}
+
+# Upper bound on (candidates x capacity buckets) for the exact DP pass; beyond it only greedy runs
+MAX_DP_CELLS = 250_000
+
+
+class PackCandidate:
+    __slots__ = ("key", "tokens", "priority", "pinned")
+
+    def __init__(self, key, tokens, priority=PRIORITY_NORMAL, pinned=False):
+        self.key = key
+        self.tokens = tokens
+        self.priority = priority
+        self.pinned = pinned
+
+    @property
+    def weight(self):
+        return PRIORITY_WEIGHTS.get(self.priority, PRIORITY_WEIGHTS[PRIORITY_NORMAL])
+
+
+class PackResult:
+    def __init__(self, kept, dropped, budget):
+        self.kept = kept
+        self.dropped = dropped
+        self.budget = budget
+        self.used_tokens = sum(c.tokens for c in kept)
+        self.dropped_tokens = sum(c.tokens for c in dropped)
+
+    @property
+    def remaining_tokens(self):
+        return self.budget - self.used_tokens
+
+    @property
+    def over_budget(self):
+        """True only when the pinned files alone do not fit."""
+        return self.used_tokens > self.budget
+
+
+def _greedy(candidates, capacity):
+    """Best value-per-token first, skipping anything that no longer fits."""
+    order = sorted(candidates, key=lambda c: (-(c.weight / c.tokens) if c.tokens else -math.inf, c.tokens))
+    chosen = []
+    used = 0
+    for c in order:
+        if used + c.tokens <= capacity:
+            chosen.append(c)
+            used += c.tokens
+    # Classic 1/2-approximation guard: a single heavy, valuable file may beat the greedy fill
+    best_single = max((c for c in candidates if c.tokens <= capacity), key=lambda c: c.weight, default=None)
+    if best_single is not None and best_single.weight > sum(c.weight for c in chosen):
+        return [best_single]
+    return chosen
+
+
+def _scaled_dp(candidates, capacity):
+    """0/1 knapsack on token costs rounded up into at most MAX_DP_CELLS / n buckets, so answers stay feasible."""
+    n = len(candidates)
+    buckets = min(capacity, MAX_DP_CELLS // max(n, 1))
+    if buckets <= 0:
+        return None
+    scale = buckets / capacity
+    costs = [math.ceil(c.tokens * scale) for c in candidates]
+
+    best = [0] * (buckets + 1)
+    taken = []
+    for i, c in enumerate(candidates):
+        cost, value = costs[i], c.weight
+        row = bytearray(buckets + 1)
+        if cost <= buckets:
+            for w in range(buckets, cost - 1, -1):
+                candidate_value = best[w - cost] + value
+                if candidate_value > best[w]:
+                    best[w] = candidate_value
+                    row[w] = 1
+        taken.append(row)
+
+    chosen = []
+    w = buckets
+    for i in range(n - 1, -1, -1):
+        if taken[i][w]:
+            chosen.append(candidates[i])
+            w -= costs[i]
+    chosen.reverse()
+    return chosen
+
+
+def pack_to_budget(candidates, budget):
+    """
+    Choose which candidates to keep under `budget` tokens.
+
+    Pinned candidates are always kept; the rest are packed into the remaining room maximizing the summed
+    priority weight. A greedy value-density pass always runs; an exact DP over scaled costs runs too when
+    the problem is small enough, and the better of the two wins.
+    """
+    pinned = [c for c in candidates if c.pinned]
+    free = [c for c in candidates if not c.pinned]
+    capacity = budget - sum(c.tokens for c in pinned)
+
+    if capacity <= 0 or not free:
+        chosen = [] if capacity < 0 else [c for c in free if c.tokens == 0]
+    elif sum(c.tokens for c in free) <= capacity:
+        chosen = free
+    else:
+        chosen = _greedy(free, capacity)
+        exact = _scaled_dp(free, capacity)
+        if exact is not None and sum(c.weight for c in exact) > sum(c.weight for c in chosen):
+            chosen = exact
+
+    chosen_keys = {c.key for c in chosen}
+    kept = pinned + [c for c in free if c.key in chosen_keys]
+    dropped = [c for c in free if c.key not in chosen_keys]
+    return PackResult(kept, dropped, budget)
@@ -0,0 +1,226 @@
+import argparse
+import itertools
+import logging
+import os
+import sys
+
+from Loggers import configure_console_logger, configure_perf_logger, timed
+from PromptEngine import PromptEngine, default_state_file_path
+from ContentCache import ContentCache
+from TokenCounter import TokenCounter, load_estimator
+from Ingestion import expand_path_arguments
+
+
+logger = logging.getLogger(__name__)
+
+# Defaults for --serve; kept here so plain prompt builds never import the HTTP server (see PromptServer)
+DEFAULT_SERVE_HOST = "127.0.0.1"
+DEFAULT_SERVE_PORT = 8765
+SERVE_TOKEN_VARIABLE = "PROMPT_SERVER_TOKEN"
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="Build an LLM code prompt without the GUI. With no PATHS, the files selected in the saved "
+                    "state are used; the prompt is streamed to stdout or --output.",
+    )
+    parser.add_argument("paths", nargs="*", metavar="PATH",
+                        help="files, folders or glob patterns (e.g. 'src/**/*.py') to include")
+    parser.add_argument("-q", "--query", help="query text placed before the files (default: the saved last query)")
+    parser.add_argument("--query-file", help="read the query text from a file ('-' for stdin)")
+    parser.add_argument("-o", "--output", help="write the prompt to this file instead of stdout")
+    parser.add_argument("-s", "--state", default=default_state_file_path(),
+                        help="state file to read settings and files from (default: %(default)s)")
+    parser.add_argument("--no-state", action="store_true", help="ignore the state file entirely")
+    parser.add_argument("--workspace", help="saved workspace to use (default: the one last active in the GUI)")
+    parser.add_argument("-w", "--whitelist", help="comma-separated extensions, overriding the saved whitelist")
+    parser.add_argument("--no-recursive", action="store_true", help="only add the top level of given folders")
+    parser.add_argument("--max-file-kb", type=int,
+                        help="cut files larger than this to their head and tail (0: no cap; default: saved setting)")
+    parser.add_argument("--minify", action="store_true", help="strip comments and blank lines, compact JSON")
+    parser.add_argument("--dedupe", action="store_true", help="emit identical file contents once, referenced from the other paths")
+    parser.add_argument("--rank", type=int, metavar="K",
+                        help="include the K loaded files most relevant to the query (BM25), instead of the selection")
+    parser.add_argument("--deps", type=int, metavar="DEPTH",
+                        help="also include loaded files the chosen ones import/include, up to DEPTH hops (0: no limit)")
+    parser.add_argument("--changed", action="store_true",
+                        help="use the files that differ from --base in the repositories of the loaded files")
+    parser.add_argument("--diff", action="store_true", help="include only each file's git diff against --base")
+    parser.add_argument("--base", help="git revision to diff against (default: saved setting, HEAD)")
+    parser.add_argument("--context", type=int, help="lines of context around diff hunks (default: saved setting, 3)")
+    parser.add_argument("--split", type=int, metavar="LIMIT",
+                        help="split the prompt into numbered parts of at most LIMIT characters, "
+                             "written next to --output as NAME.part1.txt, NAME.part2.txt, ...")
+    parser.add_argument("--split-tokens", action="store_true", help="count the --split LIMIT in tokens instead of characters")
+    parser.add_argument("--all", action="store_true", help="with no PATHS, use every saved file instead of only selected ones")
+    parser.add_argument("--serve", nargs="?", type=int, const=DEFAULT_SERVE_PORT, metavar="PORT",
+                        help="run a local prompt server (default port %(const)s) instead of building one prompt")
+    parser.add_argument("--host", default=DEFAULT_SERVE_HOST,
+                        help="address for --serve to listen on (default: %(default)s; others require a token)")
+    parser.add_argument("--token", default=os.environ.get(SERVE_TOKEN_VARIABLE),
+                        help=f"token clients of --serve must send in X-Prompt-Token (default: ${SERVE_TOKEN_VARIABLE}, "
+                             "else a random one printed at startup)")
+    parser.add_argument("--cache-mb", type=int, default=256,
+                        help="memory for file contents kept warm by --serve (default: %(default)s)")
+    parser.add_argument("--cli", action="store_true", help="run headless even when no other arguments are given")
+    parser.add_argument("--perf-log", nargs="?", const="-", metavar="FILE",
+                        help="log per-stage timings as JSON lines to FILE (default: stderr)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress to stderr")
+    return parser
+
+
+def read_query(args, engine):
+    if args.query is not None:
+        return args.query
+    if args.query_file == "-":
+        return sys.stdin.read().rstrip("\n")
+    if args.query_file:
+        with open(args.query_file, "r", encoding="utf-8") as f:
+            return f.read().rstrip("\n")
+    return engine.last_query_text
+
+
+def rank_file_infos(engine, query_text, top_k):
+    """Update the relevance index for the loaded files and return the top_k FileInfos for the query."""
+    from RelevanceIndex import RelevanceIndexJob
+    job = RelevanceIndexJob(engine.relevance_index, list(engine.file_entries), index_path=engine.relevance_index_path(),
+                            keep_paths=engine.all_workspace_paths())
+    job.run()
+    ranked = engine.rank_files(query_text, top_k=top_k)
+    logger.info(f"[CommandLine] Index updated in {job.elapsed:.2f}s ({job.updated_count} of {job.total} files re-indexed); "
+                f"query took {engine.relevance_index.last_query_seconds * 1000:.1f} ms.")
+    return [engine.file_entries.get(path) for path, _ in ranked]
+
+
+def write_prompt(engine, query_text, file_infos, output, missing_paths, skipped):
+    if output:
+        out = open(output, "w", encoding="utf-8")
+    else:
+        sys.stdout.reconfigure(encoding="utf-8", errors="replace")
+        out = sys.stdout
+    try:
+        with timed("write_prompt", files=len(file_infos)) as span:
+            chars = 0
+            for chunk in engine.iter_prompt(query_text, file_infos, missing_paths=missing_paths, skipped=skipped):
+                out.write(chunk)
+                chars += len(chunk)
+            out.flush()
+            span["chars"] = chars
+    except BrokenPipeError:
+        # Downstream (e.g. `| head`) stopped reading; that's fine
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def split_prompt(engine, query_text, file_infos, args, missing_paths, skipped):
+    """Write the prompt as numbered parts: one pass to plan the split, a second to stream the parts to disk."""
+    from PromptSplitter import plan_parts, write_parts
+    measure = len
+    if args.split_tokens:
+        counter = engine.token_counter or TokenCounter(load_estimator(os.path.dirname(os.path.abspath(__file__))))
+        measure = counter.count
+    # The first chunk is the query header, which every part repeats
+    segments = itertools.islice(engine.iter_prompt(query_text, file_infos), 1, None)
+    plan = plan_parts(query_text, segments, args.split, measure)
+    segments = itertools.islice(engine.iter_prompt(query_text, file_infos, missing_paths, skipped), 1, None)
+    paths = write_parts(query_text, segments, plan, args.output)
+    logger.info(f"[CommandLine] Split the prompt into {len(paths)} parts of at most {args.split:,} "
+                f"{'tokens' if args.split_tokens else 'characters'}: {paths[0]} ...")
+
+
+def serve(engine, args):
+    from PromptServer import PromptServer
+    try:
+        server = PromptServer(engine, host=args.host, port=args.serve, workspace=args.workspace, token=args.token)
+    except (OSError, ValueError) as e:
+        print(f"Cannot listen on {args.host}:{args.serve}: {e}", file=sys.stderr)
+        return 1
+    print(f"Serving prompts on {server.address} (Ctrl+C to stop)", file=sys.stderr)
+    if not args.token:
+        print(f"Send this token in the X-Prompt-Token header: {server.token}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    # stdout carries the prompt, so logs go to stderr
+    configure_console_logger(logging.INFO if args.verbose else logging.WARNING, stream=sys.stderr)
+    if args.perf_log:
+        configure_perf_logger(path=None if args.perf_log == "-" else args.perf_log)
+
+    content_cache = token_counter = None
+    if args.serve is not None:
+        # The server keeps file contents and token counts warm between requests
+        content_cache = ContentCache(max_bytes=max(args.cache_mb, 1) * 1024 * 1024)
+        token_counter = TokenCounter(load_estimator(os.path.dirname(os.path.abspath(__file__))))
+    engine = PromptEngine(state_file_path=args.state, content_cache=content_cache, token_counter=token_counter)
+    if not args.no_state:
+        engine.load_state(restore_files=not args.paths or args.serve is not None, workspace=args.workspace)
+    if args.whitelist is not None:
+        engine.set_whitelist(args.whitelist)
+    engine.segment_processor.minify |= args.minify
+    engine.segment_processor.dedupe |= args.dedupe
+    if args.max_file_kb is not None:
+        engine.set_max_file_bytes(args.max_file_kb * 1024 if args.max_file_kb > 0 else None)
+
+    engine.diff_only |= args.diff
+    if args.base:
+        engine.diff_base = args.base
+    if args.context is not None:
+        engine.diff_context = max(args.context, 0)
+    if args.serve is not None:
+        return serve(engine, args)
+    if args.split is not None and not args.output:
+        print("--split needs --output to name the part files.", file=sys.stderr)
+        return 1
+
+    for path in expand_path_arguments(args.paths, engine.ignore_patterns):
+        if not engine.process_file_path(path, recursive=not args.no_recursive, selected=True):
+            logger.info(f"[CommandLine] Nothing added for {path}")
+
+    query_text = read_query(args, engine)
+    if args.changed:
+        try:
+            engine.select_changed_files()
+        except OSError as e:
+            print(f"Cannot list changed files: {e}", file=sys.stderr)
+            return 1
+    if args.deps is not None:
+        engine.add_dependencies(args.deps or None)
+    if args.rank:
+        file_infos = rank_file_infos(engine, query_text, args.rank)
+    elif args.all:
+        file_infos = [info for _, info in engine.file_entries.items()]
+    else:
+        file_infos = engine.file_entries.selected_infos()
+    if not file_infos:
+        print("No files to include: pass PATHS or select files in the GUI first.", file=sys.stderr)
+        return 1
+
+    missing_paths = []
+    skipped = []
+
+    if args.split is not None:
+        try:
+            split_prompt(engine, query_text, file_infos, args, missing_paths, skipped)
+        except ValueError as e:
+            print(f"Cannot split the prompt: {e}", file=sys.stderr)
+            return 1
+    else:
+        write_prompt(engine, query_text, file_infos, args.output, missing_paths, skipped)
+
+    if missing_paths:
+        logger.warning(f"[CommandLine] {len(missing_paths)} file(s) no longer exist and were skipped.")
+    if skipped:
+        logger.warning(f"[CommandLine] {len(skipped)} binary or unreadable file(s) were skipped.")
+    written = len(file_infos) - len(missing_paths) - len(skipped)
+    logger.info(f"[CommandLine] Wrote {written} files to {args.output or 'stdout'}.")
+    return 0
@@ -0,0 +1,82 @@
+import os
+import threading
+from collections import OrderedDict
+
+from FileReader import BinaryFileError, DEFAULT_MAX_FILE_BYTES, read_file_text
+
+
+class ContentCache:
+    """
+    LRU cache of decoded file contents (FileText), invalidated by stat signature.
+
+    An entry is reused only while the file's (size, mtime_ns, inode) and the per-file byte cap are unchanged, so
+    an edited file is always re-read. Binary files are remembered too, so they are sniffed once. Entries are
+    evicted least-recently-used first once their decoded sizes exceed max_bytes. Safe to share between threads.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, max_file_bytes=DEFAULT_MAX_FILE_BYTES):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # path -> (signature, FileText or None for binary, cost)
+        self._lock = threading.Lock()
+
+    def signature(self, stat_result):
+        return stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino, self.max_file_bytes
+
+    def read(self, path):
+        """Return the file's text, from memory if unchanged on disk. Raises OSError (BinaryFileError for binaries)."""
+        return self.read_entry(path)[0].text
+
+    def read_entry(self, path):
+        """Like read(), but returns (FileText, was_cache_hit)."""
+        signature = self.signature(os.stat(path))
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                if entry[1] is None:
+                    raise BinaryFileError(f"binary file: {path}")
+                return entry[1], True
+            self.misses += 1
+
+        try:
+            file_text = read_file_text(path, signature[3])
+        except BinaryFileError:
+            self._store(path, signature, None)
+            raise
+
+        self._store(path, signature, file_text)
+        return file_text, False
+
+    def _store(self, path, signature, file_text):
+        cost = len(file_text.text) if file_text is not None else 0
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.current_bytes -= old[2]
+            if cost > self.max_bytes:
+                return
+            self._entries[path] = (signature, file_text, cost)
+            self.current_bytes += cost
+            while self.current_bytes > self.max_bytes:
+                _, (_, _, evicted_cost) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_cost
+
+    def invalidate(self, path):
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.current_bytes -= old[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,223 @@
+import ast
+import logging
+import os
+import re
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+PYTHON_EXTENSIONS = {"py", "pyw"}
+C_LIKE_EXTENSIONS = {"c", "cc", "cpp", "cxx", "h", "hh", "hpp", "hxx", "inl"}
+CSHARP_EXTENSIONS = {"cs"}
+# Module paths longer than this many components are not indexed (keeps the lookup table small)
+MAX_MODULE_DEPTH = 8
+
+_INCLUDE = re.compile(r'^[ \t]*#[ \t]*include[ \t]*[<"]([^>"\n]+)[>"]', re.MULTILINE)
+_USING = re.compile(r'^[ \t]*(?:global[ \t]+)?using[ \t]+(?:static[ \t]+)?(?:\w+[ \t]*=[ \t]*)?([\w.]+)[ \t]*;', re.MULTILINE)
+_NAMESPACE = re.compile(r'^[ \t]*namespace[ \t]+([\w.]+)', re.MULTILINE)
+
+
+def _extension(path):
+    return os.path.splitext(path)[1].lower().lstrip('.')
+
+
+def python_references(text):
+    """Imported module names; relative imports are kept as ('.' * level + module)."""
+    references = []
+    for node in ast.walk(ast.parse(text)):
+        if isinstance(node, ast.Import):
+            references.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = "." * node.level + (node.module or "")
+            references.append(base)
+            # `from pkg import mod` may name a submodule rather than an attribute
+            separator = "" if base.endswith(".") else "."
+            references.extend(base + separator + alias.name for alias in node.names if alias.name != "*")
+    return references
+
+
+def c_like_references(text):
+    return _INCLUDE.findall(text)
+
+
+def csharp_references(text):
+    """('using', namespace) and ('namespace', declared namespace) pairs."""
+    return ([("using", name) for name in _USING.findall(text)]
+            + [("namespace", name) for name in _NAMESPACE.findall(text)])
+
+
+def python_module_names(path):
+    """Dotted names a .py file could be imported as, from the bare module name up to MAX_MODULE_DEPTH components."""
+    parts = os.path.normpath(os.path.splitext(path)[0]).split(os.sep)
+    if parts[-1] == "__init__":
+        parts.pop()
+    parts = [part for part in parts[-MAX_MODULE_DEPTH:] if part]
+    return [".".join(parts[i:]) for i in range(len(parts))]
+
+
+def _common_prefix_length(a, b):
+    return len(os.path.commonprefix([a, b]))
+
+
+class DependencyGraph:
+    """
+    Import/include graph over the files of a FileStore.
+
+    Each file's raw references (Python imports via ast, C/C++ #includes, C# usings and namespace declarations)
+    are parsed once and cached with the file's (size, mtime_ns); they are resolved to loaded files through lookup
+    tables that are rebuilt only when the file list changes. When several loaded files match a reference, the
+    one sharing the longest path prefix with the importing file wins.
+    """
+
+    def __init__(self, store, read_text):
+        self.store = store
+        self.read_text = read_text
+        self.last_expand_seconds = None
+        self._references = {}  # path -> (signature, references)
+        self._tables_version = None
+        self._python_modules = {}  # dotted name -> [paths]
+        self._file_suffixes = {}  # lower-cased trailing path ('foo/bar.h', 'bar.h') -> [paths]
+        self._namespaces = None  # C# namespace -> [paths declaring it]; built on first use
+        self._lock = threading.Lock()
+
+    # --- Parsing ---
+
+    def references(self, path):
+        """Raw references of one file, re-parsed only when it changed on disk."""
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            return []
+        signature = (stat_result.st_size, stat_result.st_mtime_ns)
+        cached = self._references.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        extension = _extension(path)
+        references = []
+        if extension in PYTHON_EXTENSIONS or extension in C_LIKE_EXTENSIONS or extension in CSHARP_EXTENSIONS:
+            try:
+                text = self.read_text(path)
+                if extension in PYTHON_EXTENSIONS:
+                    references = python_references(text)
+                elif extension in C_LIKE_EXTENSIONS:
+                    references = c_like_references(text)
+                else:
+                    references = csharp_references(text)
+            except (OSError, SyntaxError, ValueError, RecursionError) as e:
+                logger.info(f"[DependencyGraph] No references read from {path}: {e}")
+        if cached is not None and extension in CSHARP_EXTENSIONS:
+            self._namespaces = None  # its namespace declarations may have changed
+        self._references[path] = (signature, references)
+        return references
+
+    # --- Resolution ---
+
+    def _ensure_tables(self):
+        if self._tables_version == self.store.version:
+            return
+        python_modules = {}
+        file_suffixes = {}
+        for path in self.store:
+            extension = _extension(path)
+            if extension in PYTHON_EXTENSIONS:
+                for name in python_module_names(path):
+                    python_modules.setdefault(name, []).append(path)
+            elif extension in C_LIKE_EXTENSIONS:
+                parts = os.path.normpath(path).lower().split(os.sep)
+                for i in range(max(len(parts) - MAX_MODULE_DEPTH, 0), len(parts)):
+                    file_suffixes.setdefault("/".join(parts[i:]), []).append(path)
+        self._python_modules = python_modules
+        self._file_suffixes = file_suffixes
+        self._namespaces = None
+        self._tables_version = self.store.version
+
+    def _closest(self, candidates, importer):
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return candidates[0]
+        return max(candidates, key=lambda candidate: (_common_prefix_length(candidate, importer), candidate))
+
+    def _resolve_python(self, path, reference):
+        if reference.startswith("."):
+            level = len(reference) - len(reference.lstrip("."))
+            base = os.path.dirname(path)
+            for _ in range(level - 1):
+                base = os.path.dirname(base)
+            module = reference[level:]
+            target = os.path.join(base, *module.split(".")) if module else base
+            for candidate in (target + ".py", os.path.join(target, "__init__.py")):
+                if candidate in self.store:
+                    return [candidate]
+            return []
+        found = self._closest(self._python_modules.get(reference), path)
+        return [found] if found is not None else []
+
+    def _resolve_include(self, path, reference):
+        local = os.path.normpath(os.path.join(os.path.dirname(path), reference))
+        if local in self.store:
+            return [local]
+        key = "/".join(part for part in reference.lower().replace("\\", "/").split("/") if part and part != ".")
+        found = self._closest(self._file_suffixes.get(key), path)
+        return [found] if found is not None else []
+
+    def _namespace_table(self):
+        """Which loaded C# files declare each namespace; parsing every .cs file the first time it is needed."""
+        if self._namespaces is None:
+            namespaces = {}
+            for candidate in self.store:
+                if _extension(candidate) in CSHARP_EXTENSIONS:
+                    for kind, name in self.references(candidate):
+                        if kind == "namespace":
+                            namespaces.setdefault(name, []).append(candidate)
+            self._namespaces = namespaces
+        return self._namespaces
+
+    def _resolve_csharp(self, path, references):
+        found = []
+        for kind, name in references:
+            if kind == "using":
+                found.extend(self._namespace_table().get(name, ()))
+        return found
+
+    def dependencies(self, path):
+        """Loaded files that `path` directly imports or includes."""
+        references = self.references(path)
+        extension = _extension(path)
+        if extension in PYTHON_EXTENSIONS:
+            found = [dep for reference in references for dep in self._resolve_python(path, reference)]
+        elif extension in C_LIKE_EXTENSIONS:
+            found = [dep for reference in references for dep in self._resolve_include(path, reference)]
+        elif extension in CSHARP_EXTENSIONS:
+            found = self._resolve_csharp(path, references)
+        else:
+            found = []
+        return [dep for dep in dict.fromkeys(found) if dep != path]
+
+    def expand(self, paths, depth=1):
+        """
+        Loaded files reachable from `paths` through at most `depth` import/include hops (all of them for
+        depth None), not counting `paths` themselves, in discovery order.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            self._ensure_tables()
+            seen = set(paths)
+            frontier = list(paths)
+            found = []
+            level = 0
+            while frontier and (depth is None or level < depth):
+                next_frontier = []
+                for path in frontier:
+                    for dep in self.dependencies(path):
+                        if dep not in seen:
+                            seen.add(dep)
+                            found.append(dep)
+                            next_frontier.append(dep)
+                frontier = next_frontier
+                level += 1
+        self.last_expand_seconds = time.perf_counter() - started
+        return found
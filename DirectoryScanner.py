@@ -0,0 +1,238 @@
+import logging
+import os
+import re
+
+
+logger = logging.getLogger(__name__)
+
+# Applied at every level of every scan, in .gitignore syntax. Editable from the GUI and saved in the state file.
+DEFAULT_IGNORE_PATTERNS = [
+    '.git/', '.hg/', '.svn/', '.vs/', '.idea/', '.vscode/',
+    'node_modules/', 'venv/', '.venv/', 'env/', '__pycache__/', '.mypy_cache/', '.pytest_cache/', '.tox/',
+    'bin/', 'obj/', 'build/', 'dist/', 'out/', 'target/', '*.egg-info/',
+]
+
+IGNORE_FILE_NAMES = ('.gitignore', '.ignore')
+
+
+def _glob_to_regex(pattern):
+    """Translate one .gitignore glob into a regex matched against '/'-separated relative paths."""
+    i, n = 0, len(pattern)
+    out = []
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i):
+                if pattern.startswith('**/', i):
+                    out.append('(?:.*/)?')
+                    i += 3
+                else:
+                    out.append('.*')
+                    i += 2
+                continue
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append('[' + body.replace('\\', '\\\\') + ']')
+                i = end
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return re.compile(''.join(out), re.IGNORECASE if os.name == 'nt' else 0)
+
+
+class IgnoreRule:
+    __slots__ = ("pattern", "negated", "dir_only", "anchored", "regex")
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.negated = pattern.startswith('!')
+        if self.negated:
+            pattern = pattern[1:]
+        elif pattern.startswith('\\!') or pattern.startswith('\\#'):
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        # A slash anywhere but the end ties the pattern to the ignore file's directory
+        self.anchored = '/' in pattern
+        self.regex = _glob_to_regex(pattern.lstrip('/'))
+
+    def matches(self, rel_path, name, is_dir):
+        if self.dir_only and not is_dir:
+            return False
+        return self.regex.fullmatch(rel_path if self.anchored else name) is not None
+
+
+def compile_ignore_patterns(lines):
+    rules = []
+    for line in lines:
+        line = line.rstrip('\n').rstrip('\r')
+        if not line.endswith('\\ '):
+            line = line.rstrip()
+        if not line or line.startswith('#'):
+            continue
+        rules.append(IgnoreRule(line))
+    return rules
+
+
+def read_ignore_file(path):
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return compile_ignore_patterns(f)
+    except OSError as e:
+        logger.warning(f"[DirectoryScanner] Could not read ignore file {path}: {e}")
+        return []
+
+
+def is_ignored(rule_sets, path, name, is_dir):
+    """rule_sets: [(base_dir, rules), ...] from outermost to innermost; the last matching rule wins."""
+    ignored = False
+    for base_dir, rules in rule_sets:
+        rel_path = None
+        for rule in rules:
+            if rule.anchored and rel_path is None:
+                rel_path = path[len(base_dir) + 1:].replace(os.sep, '/')
+            if rule.matches(rel_path, name, is_dir):
+                ignored = not rule.negated
+    return ignored
+
+
+def is_path_ignored(path, base_dir, rules):
+    """Check a path and each folder between base_dir and it against one rule list (for glob results)."""
+    base_dir = os.path.abspath(base_dir)
+    rel_parts = os.path.relpath(os.path.abspath(path), base_dir).split(os.sep)
+    if rel_parts[0] == os.pardir:
+        base_dir = os.path.dirname(os.path.abspath(path))
+        rel_parts = [os.path.basename(path)]
+    current = base_dir
+    for i, part in enumerate(rel_parts):
+        current = os.path.join(current, part)
+        is_dir = i < len(rel_parts) - 1 or os.path.isdir(current)
+        if is_ignored([(base_dir, rules)], current, part, is_dir):
+            return True
+    return False
+
+
+class DirectoryScanner:
+    """
+    os.scandir-based replacement for os.walk that prunes ignored directories before descending into them.
+
+    Ignore rules come from the user's pattern list (applied everywhere) and from every .gitignore/.ignore found
+    between the enclosing repository root and the directory being scanned.
+    """
+
+    def __init__(self, extensions=(), ignore_patterns=DEFAULT_IGNORE_PATTERNS, use_ignore_files=True,
+                 max_depth=None, max_files=None, cancelled=None):
+        self.extensions = frozenset(ext.lower().lstrip('.') for ext in extensions)
+        self.user_rules = compile_ignore_patterns(ignore_patterns)
+        self.use_ignore_files = use_ignore_files
+        self.max_depth = max_depth
+        self.max_files = max_files
+        self.cancelled = cancelled
+
+        self.files_seen = 0
+        self.files_accepted = 0
+        self.dirs_visited = 0
+        self.dirs_pruned = 0
+        self.truncated = False
+
+    def accepts_extension(self, name):
+        if not self.extensions:
+            return True
+        dot = name.rfind('.')
+        return dot > 0 and name[dot + 1:].lower() in self.extensions
+
+    def _ancestor_rule_sets(self, root):
+        """
+        Ignore files above root, up to the enclosing repository (a folder containing .git). Outside any repository
+        there are none: a .gitignore in an unrelated parent folder (e.g. the home folder) does not apply.
+        """
+        rule_sets = []
+        current = os.path.dirname(root)
+        while current and os.path.dirname(current) != current:
+            for ignore_name in IGNORE_FILE_NAMES:
+                ignore_path = os.path.join(current, ignore_name)
+                if os.path.isfile(ignore_path):
+                    rule_sets.append((current, read_ignore_file(ignore_path)))
+            if os.path.exists(os.path.join(current, '.git')):
+                rule_sets.reverse()
+                return rule_sets
+            current = os.path.dirname(current)
+        return []
+
+    def scan(self, root):
+        """Yield normalized paths of the accepted files under root."""
+        root = os.path.normpath(os.path.abspath(root))
+        base_rule_sets = [(root, self.user_rules)]
+        if self.use_ignore_files and os.path.exists(root) and not os.path.exists(os.path.join(root, '.git')):
+            base_rule_sets.extend(self._ancestor_rule_sets(root))
+
+        stack = [(root, 0, base_rule_sets)]
+        while stack:
+            if self.cancelled is not None and self.cancelled.is_set():
+                return
+            dir_path, depth, rule_sets = stack.pop()
+            self.dirs_visited += 1
+
+            try:
+                with os.scandir(dir_path) as it:
+                    entries = list(it)
+            except OSError as e:
+                logger.warning(f"[DirectoryScanner] Cannot list {dir_path}: {e}")
+                continue
+
+            if self.use_ignore_files:
+                local_rules = [
+                    (dir_path, read_ignore_file(entry.path))
+                    for entry in entries
+                    if entry.name in IGNORE_FILE_NAMES
+                ]
+                if local_rules:
+                    rule_sets = rule_sets + local_rules
+
+            sub_dirs = []
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    # Links to folders are not followed (as with os.walk), nor are they files to read
+                    if not is_dir and entry.is_symlink() and entry.is_dir():
+                        continue
+                except OSError:
+                    continue
+
+                if is_dir:
+                    if self.max_depth is not None and depth >= self.max_depth:
+                        continue
+                    if is_ignored(rule_sets, entry.path, entry.name, True):
+                        self.dirs_pruned += 1
+                        continue
+                    sub_dirs.append(entry.path)
+                    continue
+
+                self.files_seen += 1
+                if not self.accepts_extension(entry.name):
+                    continue
+                if is_ignored(rule_sets, entry.path, entry.name, False):
+                    continue
+
+                self.files_accepted += 1
+                yield entry.path
+                if self.max_files is not None and self.files_accepted >= self.max_files:
+                    self.truncated = True
+                    logger.warning(f"[DirectoryScanner] Stopped scanning {root} after {self.max_files} files (max files reached).")
+                    return
+
+            # Reverse so the stack pops sub-directories in listing order
+            for sub_dir in reversed(sub_dirs):
+                stack.append((sub_dir, depth + 1, rule_sets))
@@ -0,0 +1,174 @@
+import math
+
+from BudgetPacker import PRIORITY_NAMES, PRIORITY_NORMAL
+
+
+class VirtualFileList:
+    """
+    Draws only the visible rows of a FileStore onto a Canvas.
+
+    A small pool of canvas items (checkbox box, check mark, outline toggle, label, token cost) is created once per
+    visible slot and re-pointed at different rows while scrolling, so the widget count does not grow with the
+    number of loaded files. Clicking the outline toggle (the square right of the checkbox) calls on_outline_toggle
+    instead of changing the selection.
+    """
+
+    ROW_HEIGHT = 22
+    BOX_SIZE = 12
+    LEFT_PADDING = 6
+    OUTLINE_X = 24
+    LABEL_X = 42
+    RIGHT_PADDING = 8
+    OUTLINE_FILL = "#5b8dd6"
+
+    def __init__(self, canvas, scrollbar, store, on_toggle=None, on_context_menu=None, on_outline_toggle=None):
+        self.canvas = canvas
+        self.scrollbar = scrollbar
+        self.store = store
+        self.on_toggle = on_toggle
+        self.on_outline_toggle = on_outline_toggle
+        self.on_context_menu = on_context_menu
+        self.rows = []  # store indices of the rows that pass the current filter
+        self.top = 0  # index into self.rows of the first visible row
+        self._pool = []
+
+        self.scrollbar.configure(command=self.yview)
+        self.canvas.bind("<Configure>", lambda e: self.redraw())
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<Button-3>", self._on_right_click)
+        self.canvas.bind("<Button-2>", self._on_right_click)  # macOS
+
+    # --- Public API ---
+
+    def set_rows(self, rows):
+        self.rows = rows
+        self.top = self._clamp_top(self.top)
+        self.redraw()
+
+    def visible_row_count(self):
+        height = max(self.canvas.winfo_height(), 1)
+        return int(math.ceil(height / self.ROW_HEIGHT))
+
+    def yview(self, *args):
+        """Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units'|'pages')."""
+        if not args:
+            return
+        if args[0] == "moveto":
+            self.top = self._clamp_top(int(round(float(args[1]) * len(self.rows))))
+            self.redraw()
+        elif args[0] == "scroll":
+            self.yview_scroll(int(args[1]), args[2])
+
+    def yview_scroll(self, number, what="units"):
+        step = max(self.visible_row_count() - 1, 1) if what == "pages" else 1
+        self.top = self._clamp_top(self.top + number * step)
+        self.redraw()
+
+    def redraw(self):
+        visible = self.visible_row_count()
+        self._ensure_pool(visible)
+        width = max(self.canvas.winfo_width(), 1)
+
+        for slot, items in enumerate(self._pool):
+            background, box, check, outline, label, cost = items
+            row = self.top + slot
+            if slot >= visible or row >= len(self.rows):
+                for item in items:
+                    self.canvas.itemconfigure(item, state="hidden")
+                continue
+
+            index = self.rows[row]
+            y = slot * self.ROW_HEIGHT
+            box_top = y + (self.ROW_HEIGHT - self.BOX_SIZE) // 2
+            box_left = self.LEFT_PADDING
+
+            self.canvas.coords(background, 0, y, width, y + self.ROW_HEIGHT)
+            self.canvas.coords(box, box_left, box_top, box_left + self.BOX_SIZE, box_top + self.BOX_SIZE)
+            self.canvas.coords(
+                check,
+                box_left + 2, box_top + self.BOX_SIZE // 2,
+                box_left + self.BOX_SIZE // 2 - 1, box_top + self.BOX_SIZE - 3,
+                box_left + self.BOX_SIZE - 2, box_top + 2,
+            )
+            self.canvas.coords(outline, self.OUTLINE_X, box_top, self.OUTLINE_X + self.BOX_SIZE, box_top + self.BOX_SIZE)
+            self.canvas.coords(label, self.LABEL_X, y + self.ROW_HEIGHT // 2)
+            self.canvas.coords(cost, width - self.RIGHT_PADDING, y + self.ROW_HEIGHT // 2)
+            info = self.store.info_at(index)
+            self.canvas.itemconfigure(label, text=info.censored_path)
+            self.canvas.itemconfigure(cost, text=self._row_badge(info))
+
+            self.canvas.itemconfigure(background, state="normal")
+            self.canvas.itemconfigure(box, state="normal")
+            self.canvas.itemconfigure(outline, state="normal", fill=self.OUTLINE_FILL if info.outline else "white")
+            self.canvas.itemconfigure(label, state="normal")
+            self.canvas.itemconfigure(cost, state="normal")
+            self.canvas.itemconfigure(check, state="normal" if self.store.is_selected_at(index) else "hidden")
+
+        if self.rows:
+            first = self.top / len(self.rows)
+            last = min((self.top + visible) / len(self.rows), 1.0)
+        else:
+            first, last = 0.0, 1.0
+        self.scrollbar.set(first, last)
+
+    def row_at(self, y):
+        """Store index of the row under canvas y, or None."""
+        row = self.top + y // self.ROW_HEIGHT
+        if row < 0 or row >= len(self.rows):
+            return None
+        return self.rows[row]
+
+    # --- Internals ---
+
+    @staticmethod
+    def _row_badge(info):
+        parts = []
+        if info.missing:
+            parts.append("missing")
+        if info.read_note is not None:
+            parts.append(info.read_note)
+        if info.outline:
+            parts.append("outline")
+        if info.pinned:
+            parts.append("pinned")
+        if info.priority != PRIORITY_NORMAL:
+            parts.append(PRIORITY_NAMES[info.priority])
+        if info.token_count is not None:
+            parts.append(f"{info.token_count:,} tok")
+        return " · ".join(parts)
+
+    def _clamp_top(self, top):
+        max_top = max(len(self.rows) - self.visible_row_count() + 1, 0)
+        return max(0, min(top, max_top))
+
+    def _ensure_pool(self, count):
+        bg = self.canvas.cget("background")
+        while len(self._pool) < count:
+            background = self.canvas.create_rectangle(0, 0, 0, 0, fill=bg, outline="")
+            box = self.canvas.create_rectangle(0, 0, 0, 0, outline="black", fill="white")
+            check = self.canvas.create_line(0, 0, 0, 0, 0, 0, width=2)
+            outline = self.canvas.create_rectangle(0, 0, 0, 0, outline="grey50", fill="white")
+            label = self.canvas.create_text(0, 0, anchor="w", text="")
+            cost = self.canvas.create_text(0, 0, anchor="e", text="", fill="grey40")
+            self._pool.append((background, box, check, outline, label, cost))
+
+    def _on_click(self, event):
+        index = self.row_at(event.y)
+        if index is None:
+            return
+        if self.OUTLINE_X - 2 <= event.x <= self.OUTLINE_X + self.BOX_SIZE + 2:
+            info = self.store.info_at(index)
+            info.outline = not info.outline
+            self.redraw()
+            if self.on_outline_toggle:
+                self.on_outline_toggle(info)
+            return
+        self.store.toggle_at(index)
+        self.redraw()
+        if self.on_toggle:
+            self.on_toggle(self.store.info_at(index))
+
+    def _on_right_click(self, event):
+        index = self.row_at(event.y)
+        if index is not None and self.on_context_menu:
+            self.on_context_menu(self.store.info_at(index), event)
@@ -0,0 +1,130 @@
+import codecs
+import mmap
+import os
+
+
+DEFAULT_MAX_FILE_BYTES = 1024 * 1024
+SNIFF_BYTES = 8192
+# Share of a sample's bytes that may be control characters before the file counts as binary
+MAX_CONTROL_RATIO = 0.1
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+_TEXT_CONTROL_BYTES = {0x08, 0x09, 0x0A, 0x0C, 0x0D, 0x1B}
+# Deleting every byte except the suspicious control bytes leaves just those to count
+_NOT_CONTROL_BYTES = bytes(byte for byte in range(256) if byte >= 0x20 or byte in _TEXT_CONTROL_BYTES)
+
+
+class BinaryFileError(OSError):
+    """Raised for files that are not text. An OSError, so callers that skip unreadable files skip these too."""
+
+
+class FileText:
+    """Decoded (possibly truncated) text of a file."""
+
+    __slots__ = ("text", "encoding", "size", "truncated")
+
+    def __init__(self, text, encoding, size, truncated):
+        self.text = text
+        self.encoding = encoding
+        self.size = size  # bytes on disk
+        self.truncated = truncated
+
+
+def sniff_encoding(sample):
+    """Encoding for a file starting with `sample`, or None if it looks binary."""
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    if b"\0" in sample:
+        return None
+    if sample:
+        control = len(bytes(sample).translate(None, _NOT_CONTROL_BYTES))
+        if control / len(sample) > MAX_CONTROL_RATIO:
+            return None
+    try:
+        # Incremental so a multi-byte character cut off at the end of the sample doesn't count against UTF-8
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+def _normalize_newlines(text):
+    """CRLF and lone CR to LF, as reading in text mode does."""
+    if "\r" not in text:
+        return text
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _decode(data, encoding):
+    if encoding == "utf-8":
+        try:
+            return _normalize_newlines(data.decode("utf-8")), "utf-8"
+        except UnicodeDecodeError:
+            # Valid UTF-8 at the start but not throughout: a legacy 8-bit file with plain ASCII up front
+            return _normalize_newlines(data.decode("latin-1")), "latin-1"
+    return _normalize_newlines(data.decode(encoding, errors="replace").lstrip("\ufeff")), encoding
+
+
+def _utf8_char_start(view, offset, step):
+    """`offset` moved by `step` (-1 or 1, at most 3 bytes) off UTF-8 continuation bytes, onto a character start."""
+    for _ in range(3):
+        if not 0 < offset < len(view) or view[offset] & 0xC0 != 0x80:
+            break
+        offset += step
+    return offset
+
+
+def truncation_marker(omitted_bytes, size):
+    return f"\n... [truncated: {omitted_bytes:,} of {size:,} bytes omitted] ...\n"
+
+
+def read_file_text(path, max_bytes=DEFAULT_MAX_FILE_BYTES):
+    """
+    Read a text file, sniffing the first bytes for binary content and encoding.
+
+    Files over `max_bytes` keep their first two thirds and last third of that budget, cut at line breaks, with a
+    marker in between; they are read through mmap so only the kept pages are ever loaded. Raises BinaryFileError
+    for binary files and OSError like open() would.
+    """
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if max_bytes is None or size <= max_bytes:
+            data = file.read()
+            encoding = sniff_encoding(data[:SNIFF_BYTES])
+            if encoding is None:
+                raise BinaryFileError(f"binary file: {path}")
+            text, encoding = _decode(data, encoding)
+            return FileText(text, encoding, size, False)
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            encoding = sniff_encoding(view[:SNIFF_BYTES])
+            if encoding is None:
+                raise BinaryFileError(f"binary file: {path}")
+            head_end = max_bytes * 2 // 3
+            tail_start = size - (max_bytes - head_end)
+            if encoding.startswith("utf-16"):
+                # Keep two-byte code units aligned; line breaks aren't single bytes here
+                head_end -= head_end % 2
+                tail_start += tail_start % 2
+            else:
+                # Prefer whole lines: end the head after its last newline, start the tail after its first one
+                newline = view.rfind(b"\n", 0, head_end)
+                if newline > 0:
+                    head_end = newline + 1
+                elif encoding != "latin-1":
+                    # No line break to cut at: at least don't cut a multi-byte character in two
+                    head_end = _utf8_char_start(view, head_end, -1)
+                newline = view.find(b"\n", tail_start, size - 1)
+                if newline >= 0:
+                    tail_start = newline + 1
+                elif encoding != "latin-1":
+                    tail_start = _utf8_char_start(view, tail_start, 1)
+            head, encoding = _decode(view[:head_end], encoding)
+            tail, _ = _decode(view[tail_start:], encoding)
+        text = head + truncation_marker(tail_start - head_end, size) + tail
+        return FileText(text, encoding, size, True)
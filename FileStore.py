@@ -0,0 +1,217 @@
+import bisect
+
+from BudgetPacker import PRIORITY_NORMAL
+from SearchIndex import SearchIndex, SEARCH_SUBSTRING
+
+
+class FileInfo:
+    __slots__ = ("file_path", "censored_path", "lower_path", "token_count", "priority", "pinned", "outline", "missing", "read_note")
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.censored_path = self.censor_username(file_path)
+        self.lower_path = file_path.lower()
+        self.token_count = None  # known once the file has been part of a built prompt
+        self.priority = PRIORITY_NORMAL
+        self.pinned = False
+        self.outline = False  # include only the signature outline instead of the full contents
+        self.missing = False  # set when a background existence check finds the file gone
+        self.read_note = None  # 'truncated', 'binary' or 'unreadable' after the last build that included it
+
+    @staticmethod
+    def censor_username(path):
+        parts = path.split('\\')
+        if 'Users' in parts and len(parts) > parts.index('Users') + 1:
+            parts[parts.index('Users') + 1] = 'MyUsername'
+        return '\\'.join(parts)
+
+
+class FileStore:
+    """
+    Tk-free model of the loaded files.
+
+    Paths are kept in a sorted list with a parallel bytearray holding one selection flag per path,
+    so the file list can be rendered, filtered and bulk-selected without any per-file widgets.
+    Row indices returned by match() are only valid until the next add/remove (see `version`).
+    """
+
+    def __init__(self):
+        self._paths = []
+        self._infos = {}
+        self._selected = bytearray()
+        self.version = 0
+        self.search_index = SearchIndex(self)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __contains__(self, path):
+        return path in self._infos
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def get(self, path, default=None):
+        return self._infos.get(path, default)
+
+    def items(self):
+        """(path, FileInfo) pairs in sorted path order."""
+        infos = self._infos
+        return [(path, infos[path]) for path in self._paths]
+
+    def index_of(self, path):
+        i = bisect.bisect_left(self._paths, path)
+        if i < len(self._paths) and self._paths[i] == path:
+            return i
+        return -1
+
+    def path_at(self, index):
+        return self._paths[index]
+
+    def info_at(self, index):
+        return self._infos[self._paths[index]]
+
+    def is_selected_at(self, index):
+        return bool(self._selected[index])
+
+    # --- Mutation ---
+
+    def add(self, path, selected=False):
+        """Add one path, keeping sort order. Returns False if it was already present."""
+        if path in self._infos:
+            return False
+        i = bisect.bisect_left(self._paths, path)
+        self._paths.insert(i, path)
+        self._selected.insert(i, 1 if selected else 0)
+        self._infos[path] = FileInfo(path)
+        self.version += 1
+        return True
+
+    def add_many(self, paths, selected=False):
+        """Add many paths with a single merge. Returns the list of newly added paths, sorted."""
+        new_paths = sorted({path for path in paths if path not in self._infos})
+        if not new_paths:
+            return []
+
+        flag = 1 if selected else 0
+        if len(new_paths) * 8 < len(self._paths):
+            # A few paths into a big list: inserting in place is cheaper than rebuilding.
+            for path in new_paths:
+                i = bisect.bisect_left(self._paths, path)
+                self._paths.insert(i, path)
+                self._selected.insert(i, flag)
+        else:
+            old_paths, old_selected = self._paths, self._selected
+            merged_paths = []
+            merged_selected = bytearray()
+            i = j = 0
+            while i < len(old_paths) and j < len(new_paths):
+                if old_paths[i] < new_paths[j]:
+                    merged_paths.append(old_paths[i])
+                    merged_selected.append(old_selected[i])
+                    i += 1
+                else:
+                    merged_paths.append(new_paths[j])
+                    merged_selected.append(flag)
+                    j += 1
+            merged_paths.extend(old_paths[i:])
+            merged_selected.extend(old_selected[i:])
+            merged_paths.extend(new_paths[j:])
+            merged_selected.extend([flag] * (len(new_paths) - j))
+            self._paths, self._selected = merged_paths, merged_selected
+
+        for path in new_paths:
+            self._infos[path] = FileInfo(path)
+        self.version += 1
+        return new_paths
+
+    def load(self, records):
+        """
+        Replace the whole store from (path, selected, pinned, priority, outline) records in one pass.
+        Duplicate paths keep their first record. Returns the number of paths loaded.
+        """
+        infos = {}
+        selected = {}
+        for path, is_selected, pinned, priority, outline in records:
+            if path in infos:
+                continue
+            info = FileInfo(path)
+            info.pinned = pinned
+            info.priority = priority
+            info.outline = outline
+            infos[path] = info
+            selected[path] = 1 if is_selected else 0
+        self._paths = sorted(infos)
+        self._selected = bytearray(selected[path] for path in self._paths)
+        self._infos = infos
+        self.version += 1
+        return len(self._paths)
+
+    def remove_many(self, paths):
+        """Remove the given paths. Returns the number of paths removed."""
+        doomed = {path for path in paths if path in self._infos}
+        if not doomed:
+            return 0
+        keep = [i for i, path in enumerate(self._paths) if path not in doomed]
+        self._paths = [self._paths[i] for i in keep]
+        self._selected = bytearray(self._selected[i] for i in keep)
+        for path in doomed:
+            del self._infos[path]
+        self.version += 1
+        return len(doomed)
+
+    def remove_indices(self, indices):
+        return self.remove_many([self._paths[i] for i in indices])
+
+    def remove_selected(self):
+        return self.remove_many(self.selected_paths())
+
+    def clear(self):
+        self._paths = []
+        self._infos = {}
+        self._selected = bytearray()
+        self.version += 1
+
+    # --- Selection ---
+
+    def is_selected(self, path):
+        i = self.index_of(path)
+        return i >= 0 and bool(self._selected[i])
+
+    def set_selected(self, path, value):
+        i = self.index_of(path)
+        if i >= 0:
+            self._selected[i] = 1 if value else 0
+
+    def toggle_at(self, index):
+        self._selected[index] ^= 1
+        return bool(self._selected[index])
+
+    def set_selected_indices(self, indices, value):
+        flag = 1 if value else 0
+        selected = self._selected
+        if len(indices) == len(selected):
+            # Every row matches (e.g. empty search): flip the whole bitmap at once.
+            self._selected = bytearray([flag]) * len(selected)
+            return
+        for i in indices:
+            selected[i] = flag
+
+    def missing_paths(self):
+        return [path for path in self._paths if self._infos[path].missing]
+
+    def selected_count(self):
+        return self._selected.count(1)
+
+    def selected_paths(self):
+        return [path for path, flag in zip(self._paths, self._selected) if flag]
+
+    def selected_infos(self):
+        infos = self._infos
+        return [infos[path] for path, flag in zip(self._paths, self._selected) if flag]
+
+    # --- Search ---
+
+    def match(self, search_term, mode=SEARCH_SUBSTRING):
+        """Row indices (in sorted order) whose path matches search_term, case-insensitively (see SearchIndex)."""
+        return self.search_index.match(search_term, mode)
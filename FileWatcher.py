@@ -0,0 +1,340 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+
+from DirectoryScanner import compile_ignore_patterns, is_ignored
+
+
+logger = logging.getLogger(__name__)
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class WatchEvents:
+    """Paths reported since the last drain. created/deleted are hints: check the disk before acting on them."""
+
+    def __init__(self):
+        self.changed = set()
+        self.created = set()
+        self.deleted = set()
+        self.created_dirs = set()
+        self.overflowed = False  # events were lost; treat every tracked file as possibly changed
+
+    def __bool__(self):
+        return bool(self.changed or self.created or self.deleted or self.created_dirs or self.overflowed)
+
+
+def iter_watch_dirs(files, folders, ignore_patterns=()):
+    """Folders holding the tracked files, the watched folders, and every non-ignored folder under recursive ones."""
+    dirs = {os.path.dirname(path) for path in files}
+    rules = compile_ignore_patterns(ignore_patterns)
+    for root, recursive in folders.items():
+        dirs.add(root)
+        if not recursive:
+            continue
+        stack = [root]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False) and not is_ignored([(root, rules)], entry.path, entry.name, True):
+                            dirs.add(entry.path)
+                            stack.append(entry.path)
+            except OSError:
+                continue
+    return dirs
+
+
+class _Inotify:
+    """Thin ctypes wrapper over the Linux inotify API."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        return wd
+
+    def rm_watch(self, wd):
+        self._rm_watch(self.fd, wd)
+
+    def read_events(self):
+        """Yield (wd, mask, name) for everything queued; returns when the queue is empty."""
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                yield wd, mask, name
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileWatcher:
+    """
+    Watches the folders holding the tracked files (plus whole watched folders) on a worker thread.
+
+    Uses inotify on Linux, so an idle watcher is a thread blocked in select() and costs nothing. Elsewhere, or when
+    inotify runs out of watches, it falls back to polling: every `poll_interval` seconds it stats the next
+    `batch_size` tracked files and re-lists only the folders whose mtime moved. The GUI polls drain() from an
+    after() callback, like the ingest jobs.
+    """
+
+    def __init__(self, poll_interval=2.0, batch_size=2000, use_inotify=True):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.backend = "polling"
+
+        self._lock = threading.Lock()
+        self._events = WatchEvents()
+        self._targets = None  # (files, folders, ignore_patterns) waiting to be applied by the worker
+        self._stopped = threading.Event()
+        self._wake_read, self._wake_write = os.pipe()
+        self._pipe_lock = threading.Lock()  # guards closing the wake pipe, which stop() or the worker may do
+
+        self._inotify = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+                self.backend = "inotify"
+            except (OSError, AttributeError) as e:
+                logger.info(f"[FileWatcher] inotify unavailable ({e}); polling instead.")
+
+        # Worker-thread state
+        self._wd_dirs = {}
+        self._dir_wds = {}
+        self._dir_listings = {}  # polling: folder -> (mtime_ns, set of names)
+        self._file_signatures = {}  # polling: file -> (size, mtime_ns) or None
+        self._poll_cursor = 0
+        self._thread = threading.Thread(target=self._run, name="FileWatcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wake()
+        self._thread.join(2.0)
+        # A worker still busy (e.g. walking folders in _apply_targets) closes the pipe itself on its way out
+        if not self._thread.is_alive():
+            self._close_wake_pipe()
+
+    def set_targets(self, files, folders, ignore_patterns=()):
+        """Replace what is watched. Cheap for the caller: folder walking happens on the worker thread."""
+        with self._lock:
+            self._targets = (list(files), dict(folders), list(ignore_patterns))
+        self._wake()
+
+    def drain(self):
+        """Return the WatchEvents gathered since the last call (possibly empty)."""
+        with self._lock:
+            events, self._events = self._events, WatchEvents()
+        return events
+
+    # --- Worker thread ---
+
+    def _wake(self):
+        with self._pipe_lock:
+            if self._wake_write is None:
+                return
+            try:
+                os.write(self._wake_write, b"x")
+            except OSError:
+                pass
+
+    def _close_wake_pipe(self):
+        with self._pipe_lock:
+            if self._wake_write is not None:
+                os.close(self._wake_read)
+                os.close(self._wake_write)
+                self._wake_read = self._wake_write = None
+
+    def _run(self):
+        try:
+            while not self._stopped.is_set():
+                with self._lock:
+                    targets, self._targets = self._targets, None
+                if targets is not None:
+                    self._apply_targets(*targets)
+
+                if self._inotify is not None:
+                    readable, _, _ = select.select([self._inotify.fd, self._wake_read], [], [])
+                    if self._wake_read in readable:
+                        os.read(self._wake_read, 4096)
+                    if self._inotify is not None and self._inotify.fd in readable:
+                        self._read_inotify()
+                else:
+                    readable, _, _ = select.select([self._wake_read], [], [], self.poll_interval)
+                    if readable:
+                        os.read(self._wake_read, 4096)
+                    else:
+                        self._poll_once()
+        except Exception as e:
+            logger.warning(f"[FileWatcher] Watcher stopped: {e}")
+        finally:
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+            if self._stopped.is_set():
+                self._close_wake_pipe()
+
+    def _apply_targets(self, files, folders, ignore_patterns):
+        dirs = iter_watch_dirs(files, folders, ignore_patterns)
+        if self._inotify is not None:
+            self._update_inotify_watches(dirs)
+        if self._inotify is None:
+            # Only paths that are new to the watcher are stat'ed/listed; known ones keep their last signature
+            signatures, listings = self._file_signatures, self._dir_listings
+            self._file_signatures = {path: signatures[path] if path in signatures else _stat_signature(path)
+                                     for path in files}
+            self._dir_listings = {d: listings[d] if d in listings else _list_dir(d) for d in dirs}
+            self._poll_cursor = 0
+        logger.info(f"[FileWatcher] Watching {len(dirs)} folders for {len(files)} files ({self.backend}).")
+
+    def _update_inotify_watches(self, dirs):
+        for d in list(self._dir_wds):
+            if d not in dirs:
+                self._inotify.rm_watch(self._dir_wds.pop(d))
+        for d in dirs:
+            if d not in self._dir_wds:
+                try:
+                    self._add_inotify_watch(d)
+                except OSError as e:
+                    if e.errno == errno.ENOSPC:
+                        logger.warning("[FileWatcher] Out of inotify watches (fs.inotify.max_user_watches); polling instead.")
+                        self._inotify.close()
+                        self._inotify = None
+                        self.backend = "polling"
+                        return
+                    # Folder vanished between listing and watching; nothing to watch
+
+    def _add_inotify_watch(self, d):
+        wd = self._inotify.add_watch(d)
+        self._wd_dirs[wd] = d
+        self._dir_wds[d] = wd
+
+    def _read_inotify(self):
+        events = WatchEvents()
+        for wd, mask, name in self._inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                events.overflowed = True
+                continue
+            if mask & IN_IGNORED:
+                d = self._wd_dirs.pop(wd, None)
+                if d is not None and self._dir_wds.get(d) == wd:
+                    del self._dir_wds[d]
+                continue
+            d = self._wd_dirs.get(wd)
+            if d is None or not name:
+                continue
+            path = os.path.join(d, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    events.created_dirs.add(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    events.deleted.add(path)
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                events.created.add(path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                events.deleted.add(path)
+            else:
+                events.changed.add(path)
+        self._publish(events)
+
+    def _poll_once(self):
+        events = WatchEvents()
+        # Only folders whose mtime moved are listed again (entries were added, removed or renamed)
+        for d, listing in list(self._dir_listings.items()):
+            fresh = _list_dir(d, listing)
+            if fresh is listing:
+                continue
+            old_names = listing[1] if listing else set()
+            new_names = fresh[1] if fresh else set()
+            for name in new_names - old_names:
+                path = os.path.join(d, name)
+                (events.created_dirs if os.path.isdir(path) else events.created).add(path)
+            for name in old_names - new_names:
+                events.deleted.add(os.path.join(d, name))
+            self._dir_listings[d] = fresh
+
+        # Content edits don't touch the folder, so stat a slice of the tracked files each tick
+        files = list(self._file_signatures)
+        if files:
+            start = self._poll_cursor % len(files)
+            for path in files[start:start + self.batch_size]:
+                signature = _stat_signature(path)
+                if signature != self._file_signatures[path]:
+                    self._file_signatures[path] = signature
+                    if signature is not None:
+                        events.changed.add(path)
+            self._poll_cursor = start + self.batch_size
+        self._publish(events)
+
+    def _publish(self, events):
+        if not events:
+            return
+        with self._lock:
+            pending = self._events
+            pending.changed |= events.changed
+            pending.created |= events.created
+            pending.deleted |= events.deleted
+            pending.created_dirs |= events.created_dirs
+            pending.overflowed = pending.overflowed or events.overflowed
+
+
+def _stat_signature(path):
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    return stat_result.st_size, stat_result.st_mtime_ns
+
+
+def _list_dir(d, previous=None):
+    """(mtime_ns, names) for a folder; returns `previous` itself when the folder's mtime hasn't moved."""
+    try:
+        mtime = os.stat(d).st_mtime_ns
+        if previous is not None and previous[0] == mtime:
+            return previous
+        return mtime, set(os.listdir(d))
+    except OSError:
+        return None
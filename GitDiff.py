@@ -0,0 +1,222 @@
+import logging
+import os
+import subprocess
+import threading
+
+from FileReader import read_file_text
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE = "HEAD"
+DEFAULT_CONTEXT_LINES = 3
+# Paths passed to one git invocation (keeps the command line under OS limits)
+PATHS_PER_CALL = 500
+# Untracked files: marker used in place of a diff header
+UNTRACKED_HEADER = "(new file, not yet tracked by git)\n"
+
+
+class GitError(OSError):
+    """git is missing or a git command failed. An OSError, so callers treat it like an unreadable file."""
+
+
+def run_git(root, args):
+    try:
+        completed = subprocess.run(
+            ["git", "-C", root, "-c", "core.quotePath=false", *args],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL,
+        )
+    except OSError as e:
+        raise GitError(f"git could not be run: {e}") from e
+    if completed.returncode != 0:
+        raise GitError(f"git {' '.join(args[:2])} failed in {root}: {completed.stderr.decode(errors='replace').strip()}")
+    return completed.stdout
+
+
+_C_ESCAPES = {"a": 7, "b": 8, "t": 9, "n": 10, "v": 11, "f": 12, "r": 13, '"': 34, "\\": 92}
+
+
+def unquote_path(name):
+    """A path as git prints it: C-style quoted ("a/t\\303\\251st.txt") when it has special characters, else verbatim."""
+    if not (len(name) >= 2 and name.startswith('"') and name.endswith('"')):
+        return name
+    data = bytearray()
+    body = name[1:-1]
+    i = 0
+    while i < len(body):
+        char = body[i]
+        if char == "\\" and i + 1 < len(body):
+            octal = body[i + 1:i + 4]
+            if len(octal) == 3 and all(digit in "01234567" for digit in octal):
+                data.append(int(octal, 8) & 0xFF)
+                i += 4
+                continue
+            escape = body[i + 1]
+            if escape in _C_ESCAPES:
+                data.append(_C_ESCAPES[escape])
+            else:
+                data.extend(escape.encode("utf-8", errors="surrogateescape"))
+            i += 2
+            continue
+        data.extend(char.encode("utf-8", errors="surrogateescape"))
+        i += 1
+    return data.decode("utf-8", errors="surrogateescape")
+
+
+def _diff_path(name, root):
+    """Absolute path for a ---/+++ name ('b/dir/file'), or None for /dev/null."""
+    # git appends a TAB to these lines when the (unquoted) name contains a space
+    name = unquote_path(name.rstrip("\n").rstrip("\t"))
+    if name == "/dev/null":
+        return None
+    return os.path.normpath(os.path.join(root, name[2:]))
+
+
+def split_file_diffs(patch, root):
+    """{absolute path: hunks} from a unified diff; per-file headers are dropped, deleted files are left out."""
+    diffs = {}
+    path = None
+    lines = []
+
+    def flush():
+        if path is not None and lines:
+            diffs[path] = "".join(lines)
+
+    for line in patch.splitlines(keepends=True):
+        if line.startswith("diff --git "):
+            flush()
+            path, lines = None, []
+        elif line.startswith("+++ ") and not lines:
+            path = _diff_path(line[4:], root)
+        elif line.startswith("Binary files ") and path is None:
+            # No ---/+++ lines for binaries: the name is in the header sentence
+            path = _diff_path(line.rstrip("\n").rsplit(" and ", 1)[-1][:-len(" differ")], root)
+            if path is not None:
+                lines.append(line)
+        elif path is not None and (line.startswith(("@@", "+", "-", " ", "\\")) or lines):
+            lines.append(line)
+    flush()
+    return diffs
+
+
+def untracked_diff(path, max_bytes):
+    """An untracked file shown as one all-added hunk."""
+    lines = read_file_text(path, max_bytes).text.splitlines(keepends=True)
+    body = "".join("+" + line for line in lines)
+    if body and not body.endswith("\n"):
+        body += "\n"
+    return f"{UNTRACKED_HEADER}@@ -0,0 +1,{len(lines)} @@\n{body}"
+
+
+class GitDiffCache:
+    """
+    Working-tree diffs against a base revision, for the files of one or more git repositories.
+
+    Repository roots are found by walking up to a `.git` entry, memoized per folder, so mapping many files to
+    their repositories costs a few stats rather than a git call each. Diffs are cached by (resolved base commit,
+    context lines, size, mtime_ns): files that haven't changed since the last prompt are never diffed again,
+    and each build asks git only about the rest, in one call per repository (per PATHS_PER_CALL files). Thread-safe.
+    """
+
+    def __init__(self, max_file_bytes=None, max_entries=65536):
+        self.max_file_bytes = max_file_bytes
+        self.max_entries = max_entries
+        self._roots = {}  # folder -> repository root or None
+        self._entries = {}  # path -> (key, diff text or None when unchanged)
+        self._lock = threading.Lock()
+
+    def repository_root(self, path):
+        """Root of the git repository holding a file, or None."""
+        return self.folder_repository_root(os.path.dirname(os.path.abspath(path)))
+
+    def folder_repository_root(self, folder):
+        visited = []
+        root = None
+        while True:
+            if folder in self._roots:
+                root = self._roots[folder]
+                break
+            visited.append(folder)
+            if os.path.exists(os.path.join(folder, ".git")):
+                root = folder
+                break
+            parent = os.path.dirname(folder)
+            if parent == folder:
+                break
+            folder = parent
+        for folder in visited:
+            self._roots[folder] = root
+        return root
+
+    def group_by_repository(self, paths):
+        groups = {}
+        for path in paths:
+            root = self.repository_root(path)
+            if root is not None:
+                groups.setdefault(root, []).append(path)
+        return groups
+
+    def changed_paths(self, roots, base=DEFAULT_BASE):
+        """Files that differ from `base` in each repository (modified, added, renamed or untracked); not deleted ones."""
+        changed = []
+        for root in roots:
+            listing = run_git(root, ["diff", "--name-only", "-z", "--diff-filter=d", base, "--"])
+            listing += run_git(root, ["ls-files", "--others", "--exclude-standard", "-z"])
+            changed.extend(os.path.normpath(os.path.join(root, name))
+                           for name in listing.decode("utf-8", errors="surrogateescape").split("\0") if name)
+        return sorted(set(changed))
+
+    def diffs(self, paths, base=DEFAULT_BASE, context=DEFAULT_CONTEXT_LINES):
+        """
+        {path: diff text} for the given paths that differ from `base`; unchanged and non-repository files are left out.
+        Paths may be relative to the working directory: results are keyed by the paths as given.
+        """
+        result = {}
+        for root, repo_paths in self.group_by_repository(paths).items():
+            commit = run_git(root, ["rev-parse", "--verify", base + "^{commit}"]).decode().strip()
+            keys = {}
+            stale = []
+            for path in repo_paths:
+                try:
+                    stat_result = os.stat(path)
+                except OSError:
+                    continue
+                key = (commit, context, stat_result.st_size, stat_result.st_mtime_ns)
+                entry = self._entries.get(path)
+                if entry is not None and entry[0] == key:
+                    if entry[1] is not None:
+                        result[path] = entry[1]
+                else:
+                    keys[path] = key
+                    stale.append(path)
+            if not stale:
+                continue
+
+            relative = [os.path.relpath(path, root) for path in stale]
+            fresh = {}
+            untracked = set()
+            for start in range(0, len(relative), PATHS_PER_CALL):
+                chunk = relative[start:start + PATHS_PER_CALL]
+                patch = run_git(root, ["diff", f"-U{context}", "--no-color", "--no-ext-diff", "--src-prefix=a/",
+                                       "--dst-prefix=b/", commit, "--", *chunk])
+                chunk_diffs = split_file_diffs(patch.decode("utf-8", errors="replace"), root)
+                fresh.update(chunk_diffs)
+                if len(chunk_diffs) < len(chunk):
+                    listing = run_git(root, ["ls-files", "--others", "--exclude-standard", "-z", "--", *chunk])
+                    untracked.update(os.path.normpath(os.path.join(root, name))
+                                     for name in listing.decode("utf-8", errors="surrogateescape").split("\0") if name)
+            with self._lock:
+                for path in stale:
+                    absolute = os.path.abspath(path)
+                    text = fresh.get(absolute)
+                    if text is None and absolute in untracked:
+                        try:
+                            text = untracked_diff(path, self.max_file_bytes)
+                        except OSError as e:
+                            logger.info(f"[GitDiffCache] Skipping untracked file {path}: {e}")
+                    self._entries[path] = (keys[path], text)
+                    if text is not None:
+                        result[path] = text
+                while len(self._entries) > self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+        return result
@@ -0,0 +1,237 @@
+import glob
+import logging
+import os
+import queue
+import threading
+
+from Loggers import timed
+from DirectoryScanner import DirectoryScanner, DEFAULT_IGNORE_PATTERNS, compile_ignore_patterns, is_path_ignored
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_whitelist(whitelist_input):
+    """'py, cs, .JSON' -> ['py', 'cs', 'json']"""
+    return [ext.strip().lower().lstrip('.') for ext in whitelist_input.split(',') if ext.strip()]
+
+
+def is_whitelisted(file_path, extensions):
+    """extensions is a set of lowercase extensions without the dot; an empty set allows everything."""
+    if not extensions:
+        return True
+    return os.path.splitext(file_path)[1].lower().lstrip('.') in extensions
+
+
+def expand_path_arguments(patterns, ignore_patterns=()):
+    """Expand glob patterns; glob matches inside ignored folders (node_modules, venv, ...) are dropped."""
+    rules = compile_ignore_patterns(ignore_patterns)
+    paths = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                logger.warning(f"[Ingestion] No matches for {pattern}")
+            paths.extend(path for path in matches if not is_path_ignored(path, os.getcwd(), rules))
+        else:
+            paths.append(pattern)
+    return paths
+
+
+class ScanStats:
+    def __init__(self):
+        self.scanned_count = 0
+        self.skipped_count = 0
+
+
+def iter_accepted_files(paths, extensions, recursive, ignore_patterns=DEFAULT_IGNORE_PATTERNS,
+                        max_depth=None, max_files=None, cancelled=None, stats=None):
+    """
+    Yield the whitelisted files for a mix of file and folder paths.
+
+    Folders go through DirectoryScanner (ignore rules, optional limits; without recursion only their top level);
+    explicitly given files bypass the ignore rules but still honor the whitelist.
+    """
+    stats = stats if stats is not None else ScanStats()
+    max_depth = max_depth if recursive else 0
+    for path in paths:
+        if cancelled is not None and cancelled.is_set():
+            return
+        if os.path.isdir(path):
+            scanner = DirectoryScanner(
+                extensions,
+                ignore_patterns=ignore_patterns,
+                max_depth=max_depth,
+                max_files=max_files,
+                cancelled=cancelled,
+            )
+            seen_before = stats.scanned_count
+            for file_path in scanner.scan(path):
+                stats.scanned_count = seen_before + scanner.files_seen
+                yield file_path
+            stats.scanned_count = seen_before + scanner.files_seen
+            stats.skipped_count += scanner.files_seen - scanner.files_accepted
+            logger.info(
+                f"[Ingestion] Scanned {path}: {scanner.files_accepted} files accepted, "
+                f"{scanner.dirs_pruned} ignored folders pruned."
+            )
+        else:
+            stats.scanned_count += 1
+            if is_whitelisted(path, extensions):
+                yield path
+            else:
+                stats.skipped_count += 1
+                logger.info(f"Skipping {path} due to extension not in whitelist.")
+
+
+class IngestJob:
+    """
+    Walks files and folders on a worker thread and streams whitelisted file paths back in batches.
+
+    The worker never touches Tk: the GUI polls drain() from an after() callback and merges whatever
+    has arrived in one go.
+    """
+
+    def __init__(self, paths, whitelisted_extensions, recursive, batch_size=500,
+                 ignore_patterns=DEFAULT_IGNORE_PATTERNS, max_depth=None, max_files=None):
+        self.paths = list(paths)
+        self.extensions = set(whitelisted_extensions)
+        self.recursive = recursive
+        self.batch_size = batch_size
+        self.ignore_patterns = list(ignore_patterns)
+        self.max_depth = max_depth
+        self.max_files = max_files
+
+        self.stats = ScanStats()
+        self.accepted_count = 0
+        self.finished = False
+
+        self._batches = queue.Queue()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="IngestJob", daemon=True)
+
+    @property
+    def scanned_count(self):
+        return self.stats.scanned_count
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def drain(self):
+        """Return every batch that has arrived since the last call, flattened into one list."""
+        paths = []
+        while True:
+            try:
+                paths.extend(self._batches.get_nowait())
+            except queue.Empty:
+                return paths
+
+    def _run(self):
+        with timed("ingest", roots=len(self.paths), recursive=self.recursive) as span:
+            self._scan()
+            span["scanned"] = self.stats.scanned_count
+            span["accepted"] = self.accepted_count
+
+    def _scan(self):
+        batch = []
+        try:
+            accepted = iter_accepted_files(
+                self.paths,
+                self.extensions,
+                self.recursive,
+                ignore_patterns=self.ignore_patterns,
+                max_depth=self.max_depth,
+                max_files=self.max_files,
+                cancelled=self._cancelled,
+                stats=self.stats,
+            )
+            for file_path in accepted:
+                if self._cancelled.is_set():
+                    break
+                batch.append(file_path)
+                self.accepted_count += 1
+                if len(batch) >= self.batch_size:
+                    self._batches.put(batch)
+                    batch = []
+        except Exception as e:
+            logger.warning(f"[IngestJob] Error while scanning {self.paths}: {e}")
+        finally:
+            if batch:
+                self._batches.put(batch)
+            self.finished = True
+
+
+class ExistenceCheckJob:
+    """
+    Finds which of a list of paths no longer exist, on a worker thread.
+
+    Paths are grouped by folder so each folder is listed once instead of stat-ing every file; missing
+    paths are streamed back in batches through drain(), like IngestJob.
+    """
+
+    def __init__(self, paths, batch_size=500):
+        self.paths = list(paths)
+        self.batch_size = batch_size
+        self.checked_count = 0
+        self.missing_count = 0
+        self.finished = False
+
+        self._batches = queue.Queue()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ExistenceCheckJob", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def drain(self):
+        paths = []
+        while True:
+            try:
+                paths.extend(self._batches.get_nowait())
+            except queue.Empty:
+                return paths
+
+    def _run(self):
+        by_folder = {}
+        for path in self.paths:
+            folder, name = os.path.split(path)
+            by_folder.setdefault(folder, []).append(name)
+
+        batch = []
+        try:
+            for folder, names in by_folder.items():
+                if self._cancelled.is_set():
+                    break
+                try:
+                    present = set(os.listdir(folder))
+                except OSError:
+                    present = set()
+                for name in names:
+                    path = os.path.join(folder, name)
+                    # Listing misses on case-insensitive filesystems when the saved case differs; ask directly then
+                    if name not in present and not (present and os.path.exists(path)):
+                        batch.append(path)
+                self.checked_count += len(names)
+                if len(batch) >= self.batch_size:
+                    self.missing_count += len(batch)
+                    self._batches.put(batch)
+                    batch = []
+        except Exception as e:
+            logger.warning(f"[ExistenceCheckJob] Error while checking files: {e}")
+        finally:
+            if batch:
+                self.missing_count += len(batch)
+                self._batches.put(batch)
+            self.finished = True
@@ -1,48 +1,72 @@
 import tkinter as tk
-from tkinter import filedialog, scrolledtext, Checkbutton, Label, Frame, Canvas, Scrollbar, Entry
+from tkinter import filedialog, messagebox, scrolledtext, ttk, Checkbutton, Canvas, Scrollbar
 from tkinterdnd2 import DND_FILES, TkinterDnD
 from datetime import datetime
 import os
+import time
+import re
 import logging
-import json  # <<< NEW
-from Loggers import configure_console_logger
+from Loggers import configure_console_logger, record_span, timed
+from PerfPanel import PerfPanel
+from FileListView import VirtualFileList
+from FileStore import FileInfo
+from Ingestion import IngestJob
+from PromptEngine import PromptEngine, normalize_input_path, parse_file_paths
+from ContentCache import ContentCache
+from PromptBuilder import PromptBuildJob, PromptDocument, PromptBuildResult, format_header, format_segment
+from TokenCounter import TokenCounter, load_estimator
+from FileWatcher import FileWatcher
+from SearchIndex import SEARCH_MODES, SEARCH_SUBSTRING
+from PromptSplitter import iter_parts, plan_parts, write_parts
+from BudgetPacker import PackCandidate, pack_to_budget, PRIORITY_NAMES, PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH
 
 
 configure_console_logger()
 logger = logging.getLogger(__name__)
 
 
-class FileInfo:
-    def __init__(self, file_path):
-        self.file_path = file_path
-        self.check_var = tk.BooleanVar()
-        self.censored_path = self.censor_username(file_path)
-
-    @staticmethod
-    def censor_username(path):
-        parts = path.split('\\')
-        if 'Users' in parts and len(parts) > parts.index('Users') + 1:
-            parts[parts.index('Users') + 1] = 'MyUsername'
-        return '\\'.join(parts)
-
-
 class LLMCodePromptBuilder(TkinterDnD.Tk):
+    # Above this many changed segments a rebuild replaces the preview instead of splicing it
+    MAX_SPLICE_EDITS = 50
+    # Prompts up to this many characters are previewed whole; larger ones show only their head and tail
+    PREVIEW_FULL_CHARS = 200_000
+    PREVIEW_HEAD_CHARS = 48_000
+    PREVIEW_TAIL_CHARS = 16_000
+    # Saves requested within this window are written once, from a snapshot taken when it ends
+    SAVE_DELAY_MS = 500
+    # Search runs once typing pauses this long
+    SEARCH_DELAY_MS = 120
+    # Rank by Query selects this many files unless the Top K entry says otherwise
+    DEFAULT_RANK_TOP_K = 20
+    DEPENDENCY_DEPTHS = ("1", "2", "3", "5", "All")
+    # How often watch mode picks up the watcher's events
+    WATCH_POLL_MS = 300
+
     def __init__(self):
         super().__init__()
         self.title("LLM Code Prompt Builder")
         self.geometry("1200x750")
         self.resizable(False, False)
         self.last_update = "N/A"
-        self.file_entries = {}
 
-        # <<< NEW: track the query used in the last successful Update Prompt
-        self.last_query_text = ""
+        # All non-UI state (file list, settings, caches, state file) lives in the engine
+        self.engine = PromptEngine(
+            content_cache=ContentCache(),
+            token_counter=TokenCounter(load_estimator(os.path.dirname(os.path.abspath(__file__)))),
+        )
+        self.file_entries = self.engine.file_entries
+        self.content_cache = self.engine.content_cache
+        self.token_counter = self.engine.token_counter
+
+        self.build_job = None
+        # Segment index of the prompt currently shown; lets single-file changes be spliced in
+        self.prompt_document = None
 
         # <<< NEW: where to store state (same folder as this script)
-        self.state_file_path = os.path.join(
-            os.path.dirname(os.path.abspath(__file__)),
-            "llm_code_prompt_builder_state.json"
-        )
+        self.state_file_path = self.engine.state_file_path
+        self.engine.enable_write_behind()
+        self.save_after_id = None
+        self.deferred_save_count = 0
 
         # Query Section
         self.query_frame = tk.Frame(self)
@@ -63,18 +87,51 @@ class LLMCodePromptBuilder(TkinterDnD.Tk):
         self.recursion_checkbox = Checkbutton(self.options_frame, text="Recursively Add Files in Subfolders", variable=self.recursion_var)
         self.recursion_checkbox.pack(side=tk.LEFT)
 
-        self.whitelisted_extensions = ['py', 'cs', 'cpp', 'json']
+        # Named workspaces: each keeps its own file list, settings and last query
+        self.workspace_label = tk.Label(self.options_frame, text="Workspace:")
+        self.workspace_label.pack(side=tk.LEFT, padx=(10, 0))
+        self.workspace_combobox = ttk.Combobox(self.options_frame, width=16)
+        self.workspace_combobox.pack(side=tk.LEFT)
+        self.workspace_combobox.bind("<<ComboboxSelected>>", self.on_workspace_change)
+        self.workspace_combobox.bind("<Return>", self.on_workspace_change)
+        self.delete_workspace_button = tk.Button(self.options_frame, text="Delete", command=self.delete_workspace)
+        self.delete_workspace_button.pack(side=tk.LEFT, padx=(2, 0))
 
         self.whitelist_label = tk.Label(self.options_frame, text="Whitelisted Extensions:")
         self.whitelist_label.pack(side=tk.LEFT, padx=(10, 0))
         self.whitelist_entry = tk.Entry(self.options_frame)
         self.whitelist_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
-        self.whitelist_entry.insert(0, ', '.join(self.whitelisted_extensions))
+        self.whitelist_entry.insert(0, ', '.join(self.engine.whitelisted_extensions))
 
         # <<< NEW: track changes to whitelist and save
         self.whitelist_entry.bind("<FocusOut>", self.on_whitelist_change)
         self.whitelist_entry.bind("<Return>", self.on_whitelist_change)
 
+        # Folder scan options: ignored folders/files (.gitignore syntax) and optional limits
+        self.scan_options_frame = tk.Frame(self)
+        self.scan_options_frame.pack(side=tk.TOP, fill=tk.X, padx=10, pady=(0, 5))
+        self.ignore_label = tk.Label(self.scan_options_frame, text="Ignored Patterns:")
+        self.ignore_label.pack(side=tk.LEFT)
+        self.ignore_entry = tk.Entry(self.scan_options_frame)
+        self.ignore_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
+        self.ignore_entry.insert(0, ', '.join(self.engine.ignore_patterns))
+        self.max_depth_label = tk.Label(self.scan_options_frame, text="Max Depth:")
+        self.max_depth_label.pack(side=tk.LEFT)
+        self.max_depth_entry = tk.Entry(self.scan_options_frame, width=5)
+        self.max_depth_entry.pack(side=tk.LEFT, padx=(0, 10))
+        self.max_files_label = tk.Label(self.scan_options_frame, text="Max Files:")
+        self.max_files_label.pack(side=tk.LEFT)
+        self.max_files_entry = tk.Entry(self.scan_options_frame, width=8)
+        self.max_files_entry.pack(side=tk.LEFT, padx=(0, 10))
+        self.max_file_kb_label = tk.Label(self.scan_options_frame, text="Max KB/File:")
+        self.max_file_kb_label.pack(side=tk.LEFT)
+        self.max_file_kb_entry = tk.Entry(self.scan_options_frame, width=6)
+        self.max_file_kb_entry.pack(side=tk.LEFT)
+
+        for entry in (self.ignore_entry, self.max_depth_entry, self.max_files_entry, self.max_file_kb_entry):
+            entry.bind("<FocusOut>", self.on_scan_options_change)
+            entry.bind("<Return>", self.on_scan_options_change)
+
         # Manual Path Entry Area
         self.manual_entry_frame = tk.Frame(self)
         self.manual_entry_frame.pack(side=tk.TOP, fill=tk.X, padx=10, pady=5)
@@ -103,6 +160,17 @@ class LLMCodePromptBuilder(TkinterDnD.Tk):
         self.folder_button = tk.Button(self.button_frame, text="Select Folder", command=self.select_folder)
         self.folder_button.pack(side=tk.LEFT, padx=5)
 
+        # Ingestion progress (only packed while a folder/drop is being scanned)
+        self.ingest_jobs = []
+        self.existence_job = None
+        self.ingest_progress_frame = tk.Frame(self.button_frame)
+        self.ingest_progress_label = tk.Label(self.ingest_progress_frame, text="")
+        self.ingest_progress_label.pack(side=tk.LEFT, padx=5)
+        self.ingest_progress_bar = ttk.Progressbar(self.ingest_progress_frame, mode='indeterminate', length=200)
+        self.ingest_progress_bar.pack(side=tk.LEFT, padx=5)
+        self.ingest_cancel_button = tk.Button(self.ingest_progress_frame, text="Cancel", command=self.cancel_ingestion)
+        self.ingest_cancel_button.pack(side=tk.LEFT)
+
         # Separator
         self.add_separator()
 
@@ -129,6 +197,13 @@ class LLMCodePromptBuilder(TkinterDnD.Tk):
         self.remove_all_button = tk.Button(self.selection_buttons_frame, text="Remove All", command=self.remove_all)
         self.remove_all_button.pack(side=tk.LEFT, padx=5)
 
+        # Add Dependencies: select what the selected files import/include, up to the chosen depth
+        self.add_dependencies_button = tk.Button(self.selection_buttons_frame, text="Add Dependencies", command=self.add_dependencies)
+        self.add_dependencies_button.pack(side=tk.LEFT, padx=(10, 0))
+        self.dependency_depth_combobox = ttk.Combobox(self.selection_buttons_frame, values=self.DEPENDENCY_DEPTHS, state="readonly", width=4)
+        self.dependency_depth_combobox.set(self.DEPENDENCY_DEPTHS[0])
+        self.dependency_depth_combobox.pack(side=tk.LEFT, padx=5)
+
         # Add Search Box
         self.search_frame = tk.Frame(self.file_controls_frame)
         self.search_frame.pack(fill=tk.X, pady=5)
@@ -136,25 +211,69 @@ class LLMCodePromptBuilder(TkinterDnD.Tk):
         self.search_label = tk.Label(self.search_frame, text="Search:")
         self.search_label.pack(side=tk.LEFT, padx=5)
 
-        self.search_entry = tk.Entry(self.search_frame, width=50)
-        self.search_entry.pack(side=tk.LEFT, fill=tk.X, padx=(0, 10))
-        self.search_entry.bind("<KeyRelease>", self.filter_files)
+        self.search_entry = tk.Entry(self.search_frame, width=40)
+        self.search_entry.pack(side=tk.LEFT, fill=tk.X, padx=(0, 5))
+        self.search_entry.bind("<KeyRelease>", self.schedule_filter_files)
+        self.search_entry_background = self.search_entry.cget("background")
+        self.search_after_id = None
+
+        self.search_mode_combobox = ttk.Combobox(self.search_frame, values=SEARCH_MODES, state="readonly", width=9)
+        self.search_mode_combobox.set(SEARCH_SUBSTRING)
+        self.search_mode_combobox.pack(side=tk.LEFT, padx=(0, 10))
+        self.search_mode_combobox.bind("<<ComboboxSelected>>", self.filter_files)
+
+        # Rank by Query: order the list by BM25 relevance to the query text, optionally selecting the top K
+        self.rank_frame = tk.Frame(self.file_controls_frame)
+        self.rank_frame.pack(fill=tk.X)
+        self.rank_button = tk.Button(self.rank_frame, text="Rank by Query", command=self.rank_by_query)
+        self.rank_button.pack(side=tk.LEFT, padx=5)
+        self.rank_top_k_label = tk.Label(self.rank_frame, text="Top K:")
+        self.rank_top_k_label.pack(side=tk.LEFT)
+        self.rank_top_k_entry = tk.Entry(self.rank_frame, width=5)
+        self.rank_top_k_entry.insert(0, str(self.DEFAULT_RANK_TOP_K))
+        self.rank_top_k_entry.pack(side=tk.LEFT, padx=(0, 5))
+        self.rank_select_var = tk.BooleanVar(value=False)
+        self.rank_select_checkbox = Checkbutton(self.rank_frame, text="Select Top K", variable=self.rank_select_var)
+        self.rank_select_checkbox.pack(side=tk.LEFT)
+        self.rank_status_label = tk.Label(self.rank_frame, text="", fg="grey40")
+        self.rank_status_label.pack(side=tk.LEFT, padx=5)
+        self.rank_job = None
+        self.rank_order = None  # path -> position in the last ranking; ranked files are listed first
 
         # Container for file list and scrollbar
         self.file_list_container = tk.Frame(self.file_controls_frame)
         self.file_list_container.pack(side="left", fill="both", expand=True)
 
-        # File list area with checkboxes and labels
-        self.file_list_canvas = Canvas(self.file_list_container, borderwidth=0)
-        self.file_list_frame = Frame(self.file_list_canvas)
-        self.file_list_scrollbar = Scrollbar(self.file_list_container, orient="vertical", command=self.file_list_canvas.yview)
-        self.file_list_canvas.configure(yscrollcommand=self.file_list_scrollbar.set)
+        # File list area: only the visible rows are drawn, straight onto the canvas
+        self.file_list_canvas = Canvas(self.file_list_container, borderwidth=0, highlightthickness=0)
+        self.file_list_scrollbar = Scrollbar(self.file_list_container, orient="vertical")
 
         self.file_list_scrollbar.pack(side="right", fill="y")
         self.file_list_canvas.pack(side="left", fill="both", expand=True)
-        self.file_list_canvas.create_window((0, 0), window=self.file_list_frame, anchor="nw")
 
-        self.file_list_frame.bind("<Configure>", self.on_frame_configure)
+        self.file_list_view = VirtualFileList(
+            self.file_list_canvas,
+            self.file_list_scrollbar,
+            self.file_entries,
+            on_toggle=self.on_file_checkbox_toggled,
+            on_context_menu=self.show_file_context_menu,
+            on_outline_toggle=self.on_file_outline_toggled,
+        )
+
+        # Right-click menu for a file row: pinning and priority for Fit to Budget
+        self.file_context_menu = tk.Menu(self, tearoff=0)
+        self.file_context_info = None
+        self.file_pinned_var = tk.BooleanVar(value=False)
+        self.file_priority_var = tk.IntVar(value=PRIORITY_NORMAL)
+        self.file_context_menu.add_checkbutton(label="Pinned (always fit)", variable=self.file_pinned_var, command=self.on_file_pin_changed)
+        self.file_context_menu.add_separator()
+        for priority in (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW):
+            self.file_context_menu.add_radiobutton(
+                label=f"Priority: {PRIORITY_NAMES[priority].title()}",
+                variable=self.file_priority_var,
+                value=priority,
+                command=self.on_file_priority_changed,
+            )
 
         # Right frame for prompt controls
         self.prompt_controls_frame = tk.Frame(self.prompt_frame)
@@ -164,21 +283,97 @@ class LLMCodePromptBuilder(TkinterDnD.Tk):
         self.button_center_frame = tk.Frame(self.prompt_controls_frame)
         self.button_center_frame.pack(side=tk.TOP, pady=0, anchor='n')
 
-        # Update Button
-        self.update_button = tk.Button(self.button_center_frame, text="Update Prompt", command=self.update_prompt)
-        self.update_button.pack(side=tk.TOP, pady=5)
+        # Update and Fit to Budget Buttons
+        self.build_buttons_frame = tk.Frame(self.button_center_frame)
+        self.build_buttons_frame.pack(side=tk.TOP, pady=5)
+        self.update_button = tk.Button(self.build_buttons_frame, text="Update Prompt", command=self.update_prompt)
+        self.update_button.pack(side=tk.LEFT)
+        self.fit_budget_button = tk.Button(self.build_buttons_frame, text="Fit to Budget", command=self.fit_to_budget)
+        self.fit_budget_button.pack(side=tk.LEFT, padx=5)
+
+        self.build_options_frame = tk.Frame(self.button_center_frame)
+        self.build_options_frame.pack(side=tk.TOP)
+
+        # Watch mode: follow edits, new and deleted files on disk
+        self.file_watcher = None
+        self.stale_file_count = 0
+        self.watch_var = tk.BooleanVar(value=False)
+        self.watch_checkbox = Checkbutton(self.build_options_frame, text="Watch Files", variable=self.watch_var, command=self.on_watch_toggle)
+        self.watch_checkbox.pack(side=tk.LEFT)
+        self.auto_rebuild_var = tk.BooleanVar(value=False)
+        self.auto_rebuild_checkbox = Checkbutton(self.build_options_frame, text="Auto-Rebuild", variable=self.auto_rebuild_var)
+        self.auto_rebuild_checkbox.pack(side=tk.LEFT)
+
+        # Post-processing: strip comments/blank lines and emit duplicate files once
+        self.minify_var = tk.BooleanVar(value=False)
+        self.minify_checkbox = Checkbutton(self.build_options_frame, text="Minify", variable=self.minify_var, command=self.on_post_processing_change)
+        self.minify_checkbox.pack(side=tk.LEFT, padx=(10, 0))
+        self.dedupe_var = tk.BooleanVar(value=False)
+        self.dedupe_checkbox = Checkbutton(self.build_options_frame, text="Dedupe", variable=self.dedupe_var, command=self.on_post_processing_change)
+        self.dedupe_checkbox.pack(side=tk.LEFT)
+
+        # Git diff mode: select changed files and include only their hunks
+        self.diff_options_frame = tk.Frame(self.button_center_frame)
+        self.diff_options_frame.pack(side=tk.TOP)
+        self.select_changed_button = tk.Button(self.diff_options_frame, text="Select Changed", command=self.select_changed_files)
+        self.select_changed_button.pack(side=tk.LEFT, padx=(0, 5))
+        self.diff_only_var = tk.BooleanVar(value=False)
+        self.diff_only_checkbox = Checkbutton(self.diff_options_frame, text="Diff Only", variable=self.diff_only_var, command=self.on_diff_options_change)
+        self.diff_only_checkbox.pack(side=tk.LEFT)
+        self.diff_base_label = tk.Label(self.diff_options_frame, text="Base:")
+        self.diff_base_label.pack(side=tk.LEFT)
+        self.diff_base_entry = tk.Entry(self.diff_options_frame, width=12)
+        self.diff_base_entry.pack(side=tk.LEFT, padx=(0, 5))
+        self.diff_context_label = tk.Label(self.diff_options_frame, text="Context:")
+        self.diff_context_label.pack(side=tk.LEFT)
+        self.diff_context_entry = tk.Entry(self.diff_options_frame, width=3)
+        self.diff_context_entry.pack(side=tk.LEFT)
+        for entry in (self.diff_base_entry, self.diff_context_entry):
+            entry.bind("<FocusOut>", self.on_diff_options_change)
+            entry.bind("<Return>", self.on_diff_options_change)
+
+        # Prompt build progress (only packed while a build is running)
+        self.build_progress_frame = tk.Frame(self.button_center_frame)
+        self.build_progress_bar = ttk.Progressbar(self.build_progress_frame, mode='determinate', length=200)
+        self.build_progress_bar.pack(side=tk.LEFT, padx=5)
+        self.build_cancel_button = tk.Button(self.build_progress_frame, text="Cancel", command=self.cancel_prompt_build)
+        self.build_cancel_button.pack(side=tk.LEFT)
 
         # Text display area with label
         self.text_display_frame = tk.Frame(self.prompt_controls_frame)
         self.text_display_frame.pack(fill=tk.BOTH, expand=False, pady=0)  # Removed height and padding
-        self.text_display_label = tk.Label(self.text_display_frame, text="Prompt:")
-        self.text_display_label.pack()
+        self.text_display_header = tk.Frame(self.text_display_frame)
+        self.text_display_header.pack(fill=tk.X)
+        self.text_display_label = tk.Label(self.text_display_header, text="Prompt:")
+        self.text_display_label.pack(side=tk.LEFT, expand=True)
+        # Jump list: one entry per file segment; selecting one scrolls to it (or shows it, for large prompts)
+        self.jump_paths = []
+        self.jump_combobox = ttk.Combobox(self.text_display_header, state="readonly", width=45)
+        self.jump_combobox.pack(side=tk.RIGHT)
+        self.jump_combobox.bind("<<ComboboxSelected>>", self.on_jump_selected)
+        self.jump_label = tk.Label(self.text_display_header, text="Jump to:")
+        self.jump_label.pack(side=tk.RIGHT)
+        # True while the widget holds the whole prompt (so edits can be spliced in); large prompts show a window
+        self.preview_is_full = True
         self.text_display = scrolledtext.ScrolledText(self.text_display_frame, state='disabled', height=10)
         self.text_display.pack(fill=tk.BOTH, expand=True)
 
-        # Clipboard button below the text display
-        self.clipboard_button = tk.Button(self.prompt_controls_frame, text="Copy to Clipboard", command=self.copy_to_clipboard)
-        self.clipboard_button.pack(side=tk.TOP, pady=5)
+        # Clipboard and export buttons below the text display; both work from the built prompt, not the widget
+        self.output_buttons_frame = tk.Frame(self.prompt_controls_frame)
+        self.output_buttons_frame.pack(side=tk.TOP, pady=5)
+        self.clipboard_button = tk.Button(self.output_buttons_frame, text="Copy to Clipboard", command=self.copy_to_clipboard)
+        self.clipboard_button.pack(side=tk.LEFT)
+        self.save_prompt_button = tk.Button(self.output_buttons_frame, text="Save to File", command=self.save_prompt_to_file)
+        self.save_prompt_button.pack(side=tk.LEFT, padx=5)
+        # Prompts over the context budget can be taken out in parts that each fit it
+        self.part_label = tk.Label(self.output_buttons_frame, text="Copy Part:")
+        self.part_label.pack(side=tk.LEFT, padx=(10, 0))
+        self.part_combobox = ttk.Combobox(self.output_buttons_frame, state="readonly", width=10,
+                                          postcommand=self.refresh_part_choices)
+        self.part_combobox.pack(side=tk.LEFT)
+        self.part_combobox.bind("<<ComboboxSelected>>", self.copy_part_to_clipboard)
+        self.save_parts_button = tk.Button(self.output_buttons_frame, text="Save Parts...", command=self.save_parts_to_files)
+        self.save_parts_button.pack(side=tk.LEFT, padx=5)
 
         # Stats and update frame
         self.stats_update_frame = tk.Frame(self.prompt_controls_frame)
@@ -193,10 +388,38 @@ class LLMCodePromptBuilder(TkinterDnD.Tk):
         self.char_count_label.pack(side=tk.LEFT, padx=10)
         self.word_count_label = tk.Label(self.stats_update_frame, text="Words: 0")
         self.word_count_label.pack(side=tk.LEFT, padx=10)
+        self.cache_stats_label = tk.Label(self.stats_update_frame, text="Cache: 0 hits / 0 misses")
+        self.cache_stats_label.pack(side=tk.LEFT, padx=10)
 
         # Label for latest update timestamp
         self.update_timestamp_label = tk.Label(self.stats_update_frame, text="Latest Update: N/A")
         self.update_timestamp_label.pack(side=tk.RIGHT, padx=10)
+        # Optional window with per-stage timings (ingest, filter, build, state save/load)
+        self.perf_panel = PerfPanel(self)
+        self.perf_button = tk.Button(self.stats_update_frame, text="Perf", command=self.perf_panel.open)
+        self.perf_button.pack(side=tk.RIGHT)
+
+        # Token count against the model's context window
+        self.token_stats_frame = tk.Frame(self.prompt_controls_frame)
+        self.token_stats_frame.pack(fill=tk.X)
+        self.token_count_label = tk.Label(self.token_stats_frame, text="Tokens: 0")
+        self.token_count_label.pack(side=tk.LEFT, padx=10)
+        self.token_budget_label = tk.Label(self.token_stats_frame, text="Context Budget:")
+        self.token_budget_label.pack(side=tk.LEFT)
+        self.token_budget_entry = tk.Entry(self.token_stats_frame, width=10)
+        self.token_budget_entry.pack(side=tk.LEFT)
+        self.token_budget_entry.insert(0, str(self.engine.token_budget))
+        self.token_budget_entry.bind("<FocusOut>", self.on_token_budget_change)
+        self.token_budget_entry.bind("<Return>", self.on_token_budget_change)
+        self.post_process_label = tk.Label(self.token_stats_frame, text="")
+        self.post_process_label.pack(side=tk.LEFT, padx=10)
+        self.token_estimator_label = tk.Label(self.token_stats_frame, text=f"({self.token_counter.name})", fg="grey40")
+        self.token_estimator_label.pack(side=tk.RIGHT, padx=10)
+        # Files the last build skipped (binary/unreadable) or cut to the size cap; click for the list
+        self.read_issues = ([], [])
+        self.read_issues_label = tk.Label(self.token_stats_frame, text="", fg="blue", cursor="hand2")
+        self.read_issues_label.pack(side=tk.RIGHT, padx=10)
+        self.read_issues_label.bind("<Button-1>", self.show_read_issues)
 
         # Bind the mouse scroll to the canvas
         self.file_list_canvas.bind_all("<MouseWheel>", self.on_mouse_wheel)
@@ -211,254 +434,615 @@ class LLMCodePromptBuilder(TkinterDnD.Tk):
 
     # <<< NEW
     def on_close(self):
-        self.save_state()
+        self.cancel_ingestion()
+        if self.existence_job is not None:
+            self.existence_job.cancel()
+        if self.rank_job is not None:
+            self.rank_job.cancel()
+        self.stop_watching()
+        self.cancel_prompt_build()
+        self.perf_panel.close()
+        self.save_state_now()
+        self.engine.close_state()
+        logger.info(f"[LLMCodePromptBuilder] {self.deferred_save_count} save requests folded into pending saves.")
         self.destroy()
 
     # <<< NEW
     def on_whitelist_change(self, event=None):
-        whitelist_input = self.whitelist_entry.get().strip()
-        self.whitelisted_extensions = [ext.strip().lower() for ext in whitelist_input.split(',') if ext.strip()]
+        self.reload_whitelist()
         self.save_state()
 
+    def reload_whitelist(self):
+        return self.engine.set_whitelist(self.whitelist_entry.get().strip())
+
+    def on_scan_options_change(self, event=None):
+        self.reload_scan_options()
+        self.save_state()
+
+    def reload_scan_options(self):
+        self.engine.ignore_patterns = [p.strip() for p in self.ignore_entry.get().split(',') if p.strip()]
+        self.engine.scan_max_depth = self._parse_optional_int(self.max_depth_entry.get())
+        self.engine.scan_max_files = self._parse_optional_int(self.max_files_entry.get())
+        max_file_kb = self._parse_optional_int(self.max_file_kb_entry.get())
+        self.engine.set_max_file_bytes(max_file_kb * 1024 if max_file_kb else None)
+
+    @staticmethod
+    def _parse_optional_int(text):
+        text = text.strip()
+        return int(text) if text.isdigit() else None
+
+    def _show_scan_options(self):
+        self.ignore_entry.delete(0, tk.END)
+        self.ignore_entry.insert(0, ', '.join(self.engine.ignore_patterns))
+        self.max_depth_entry.delete(0, tk.END)
+        self.max_depth_entry.insert(0, "" if self.engine.scan_max_depth is None else str(self.engine.scan_max_depth))
+        self.max_files_entry.delete(0, tk.END)
+        self.max_files_entry.insert(0, "" if self.engine.scan_max_files is None else str(self.engine.scan_max_files))
+        self.max_file_kb_entry.delete(0, tk.END)
+        self.max_file_kb_entry.insert(0, "" if self.engine.max_file_bytes is None else str(self.engine.max_file_bytes // 1024))
+
     # <<< NEW
     def save_state(self):
-        """Save whitelisted extensions, file list, and last query to JSON."""
-        try:
-            state = {
-                "whitelisted_extensions": self.whitelisted_extensions,
-                "files": [
-                    {
-                        "path": path,
-                        "selected": bool(info.check_var.get())
-                    }
-                    for path, info in self.file_entries.items()
-                ],
-                # store last query that was used when Update Prompt last succeeded
-                "last_query": self.last_query_text,
-            }
-            with open(self.state_file_path, "w", encoding="utf-8") as f:
-                json.dump(state, f, indent=2)
-        except Exception as e:
-            logger.warning(f"[LLMCodePromptBuilder] Failed to save state: {e}")
+        """Schedule a save; everything requested within SAVE_DELAY_MS is written once."""
+        if self.save_after_id is not None:
+            self.deferred_save_count += 1
+            return
+        self.save_after_id = self.after(self.SAVE_DELAY_MS, self.save_state_now)
+
+    def save_state_now(self):
+        """Snapshot the state on the UI thread and hand it to the background writer."""
+        if self.save_after_id is not None:
+            self.after_cancel(self.save_after_id)
+            self.save_after_id = None
+        self.engine.save_state()
 
     # <<< NEW
     def load_state(self):
         """Load state from JSON and restore whitelist, file list, and last query."""
-        if not os.path.exists(self.state_file_path):
-            return
+        self.engine.load_state()
+        self.show_workspace()
+
+    def show_workspace(self):
+        """Sync every widget with the engine's active workspace: one render, then a background existence check."""
+        self.workspace_combobox.config(values=self.engine.workspace_names())
+        self.workspace_combobox.set(self.engine.workspace_name)
+        self.whitelist_entry.delete(0, tk.END)
+        self.whitelist_entry.insert(0, ", ".join(self.engine.whitelisted_extensions))
+        self._show_scan_options()
+        self.token_budget_entry.delete(0, tk.END)
+        self.token_budget_entry.insert(0, str(self.engine.token_budget))
+        self.minify_var.set(self.engine.segment_processor.minify)
+        self.dedupe_var.set(self.engine.segment_processor.dedupe)
+        self.diff_only_var.set(self.engine.diff_only)
+        self.diff_base_entry.delete(0, tk.END)
+        self.diff_base_entry.insert(0, self.engine.diff_base)
+        self.diff_context_entry.delete(0, tk.END)
+        self.diff_context_entry.insert(0, str(self.engine.diff_context))
+        self.query_input.delete("1.0", tk.END)
+        self.query_input.insert("1.0", self.engine.last_query_text)
 
-        try:
-            with open(self.state_file_path, "r", encoding="utf-8") as f:
-                state = json.load(f)
-        except Exception as e:
-            logger.warning(f"[LLMCodePromptBuilder] Failed to load state: {e}")
+        self.filter_files()
+        self.start_existence_check()
+
+    def start_existence_check(self):
+        if self.existence_job is not None:
+            self.existence_job.cancel()
+        if len(self.file_entries):
+            self.existence_job = self.engine.start_existence_check()
+            self.after(100, self.poll_existence_check, self.existence_job)
+
+    def poll_existence_check(self, job):
+        if job is not self.existence_job:
+            return  # superseded by a newer check
+        finished = job.finished
+        missing = job.drain()
+        if missing and self.engine.mark_missing(missing):
+            self.file_list_view.redraw()
+        if not finished:
+            self.after(100, self.poll_existence_check, job)
             return
+        self.existence_job = None
+        if job.missing_count:
+            logger.info(f"[LLMCodePromptBuilder] {job.missing_count} saved files no longer exist.")
 
-        # Restore whitelist
-        exts = state.get("whitelisted_extensions")
-        if isinstance(exts, list):
-            self.whitelisted_extensions = [str(x).strip().lower() for x in exts if str(x).strip()]
-            self.whitelist_entry.delete(0, tk.END)
-            self.whitelist_entry.insert(0, ", ".join(self.whitelisted_extensions))
-
-        # Restore last query (if any)
-        last_query = state.get("last_query")
-        if isinstance(last_query, str) and last_query.strip():
-            self.last_query_text = last_query
-            self.query_input.delete("1.0", tk.END)
-            self.query_input.insert("1.0", last_query)
-
-        # Restore files
-        for file_state in state.get("files", []):
-            path = file_state.get("path")
-            selected = bool(file_state.get("selected"))
-            if not path:
-                continue
-            if not os.path.exists(path):
-                # Skip non-existing files on load
-                continue
-
-            self.add_file(path)
-            # After add_file, self.file_entries should contain this path
-            info = self.file_entries.get(path)
-            if info:
-                info.check_var.set(selected)
+    def on_workspace_change(self, event=None):
+        name = self.workspace_combobox.get().strip()
+        if not name or name == self.engine.workspace_name:
+            return
+        self.cancel_ingestion()
+        self.ingest_jobs = []  # results still in flight belong to the workspace we're leaving
+        self.cancel_prompt_build()
+        # Park the current widgets' settings in the workspace we're leaving
+        self.reload_whitelist()
+        self.reload_scan_options()
+        self.engine.switch_workspace(name)
+        self.prompt_document = None
+        self.refresh_preview()
+        self.update_counts()
+        self.show_workspace()
+        self.save_state()
 
-        self.filter_files()
-        self.update_file_selection_count()
+    def delete_workspace(self):
+        current = self.engine.workspace_name
+        others = [name for name in self.engine.workspace_names() if name != current]
+        if not others:
+            messagebox.showinfo("Delete Workspace", "This is the only workspace.")
+            return
+        if not messagebox.askyesno("Delete Workspace", f"Delete workspace '{current}' and its file list?"):
+            return
+        self.workspace_combobox.set(others[0])
+        self.on_workspace_change()
+        self.engine.delete_workspace(current)
+        self.workspace_combobox.config(values=self.engine.workspace_names())
+        self.save_state()
 
     # <<< NEW
     def on_file_checkbox_toggled(self, file_info):
         """Called when a file's checkbox is toggled."""
         self.update_file_selection_count()
+        if self.prompt_document is not None:
+            if self.engine.segment_processor.dedupe or self.engine.diff_only:
+                # Which copy carries a duplicated body depends on the whole selection; diffs come from one git call
+                self.update_prompt()
+            else:
+                self.splice_file_into_prompt(file_info)
+        self.save_state()
+
+    def on_file_outline_toggled(self, file_info):
+        """Switch one file between full contents and its outline in the built prompt."""
+        if self.prompt_document is not None and self.file_entries.is_selected(file_info.file_path):
+            if self.engine.diff_only:
+                return  # diffs are never outlined
+            if self.engine.segment_processor.dedupe:
+                self.update_prompt()
+            else:
+                self.splice_file_into_prompt(file_info)
+        self.save_state()
+
+    def on_post_processing_change(self):
+        self.engine.segment_processor.minify = self.minify_var.get()
+        self.engine.segment_processor.dedupe = self.dedupe_var.get()
+        if self.prompt_document is not None:
+            self.update_prompt()
+        self.save_state()
+
+    def on_diff_options_change(self, event=None):
+        base = self.diff_base_entry.get().strip()
+        context = self.diff_context_entry.get().strip()
+        changed = (self.diff_only_var.get() != self.engine.diff_only
+                   or (base and base != self.engine.diff_base)
+                   or (context.isdigit() and int(context) != self.engine.diff_context))
+        self.engine.diff_only = self.diff_only_var.get()
+        if base:
+            self.engine.diff_base = base
+        if context.isdigit():
+            self.engine.diff_context = int(context)
+        self.diff_base_entry.delete(0, tk.END)
+        self.diff_base_entry.insert(0, self.engine.diff_base)
+        self.diff_context_entry.delete(0, tk.END)
+        self.diff_context_entry.insert(0, str(self.engine.diff_context))
+        if changed:
+            if self.prompt_document is not None:
+                self.update_prompt()
+            self.save_state()
+
+    def select_changed_files(self):
+        """Select the files that differ from the diff base (adding new ones found in watched folders)."""
+        self.on_diff_options_change()
+        try:
+            changed = self.engine.select_changed_files()
+        except OSError as e:
+            messagebox.showerror("Select Changed", str(e))
+            return
+        self.filter_files()
+        self.save_state()
+        if not changed:
+            messagebox.showinfo("Select Changed", f"No loaded files differ from {self.engine.diff_base}.")
+
+    def splice_file_into_prompt(self, file_info):
+        """Add/remove a single file's segment in the built prompt without rebuilding the rest."""
+        if self.file_entries.is_selected(file_info.file_path):
+            try:
+                content = self.content_cache.read(file_info.file_path)
+                if file_info.outline:
+                    content = self.engine.outline_cache.outline(file_info.file_path, content)
+                if self.engine.segment_processor.minify:
+                    content = self.engine.segment_processor.process(file_info.file_path, content)[0]
+            except OSError as e:
+                logger.warning(f"[LLMCodePromptBuilder] Error reading file {file_info.file_path}: {e}")
+                return
+            edit = self.prompt_document.set_segment(file_info.file_path, format_segment(file_info.censored_path, content, file_info.outline))
+        else:
+            edit = self.prompt_document.remove_segment(file_info.file_path)
+
+        if edit is not None:
+            tokens = self.prompt_document.segment_tokens(file_info.file_path)
+            if tokens is not None:
+                file_info.token_count = tokens
+            self.refresh_preview([edit])
+            self.update_counts()
+            self.file_list_view.redraw()
+            self.mark_prompt_updated()
+
+    def on_token_budget_change(self, event=None):
+        text = self.token_budget_entry.get().strip().replace(',', '')
+        if text.isdigit() and int(text) > 0:
+            self.engine.token_budget = int(text)
+        else:
+            self.token_budget_entry.delete(0, tk.END)
+            self.token_budget_entry.insert(0, str(self.engine.token_budget))
+        self.update_counts()
         self.save_state()
 
     def on_mouse_wheel(self, event):
         if event.num == 4:  # For Linux/Mac scroll up
-            self.file_list_canvas.yview_scroll(-1, "units")
+            self.file_list_view.yview_scroll(-1, "units")
         elif event.num == 5:  # For Linux/Mac scroll down
-            self.file_list_canvas.yview_scroll(1, "units")
+            self.file_list_view.yview_scroll(1, "units")
         else:  # For Windows scroll
-            self.file_list_canvas.yview_scroll(-1 * int(event.delta / 120), "units")
+            self.file_list_view.yview_scroll(-1 * int(event.delta / 120), "units")
 
     def remove_all(self):
-        search_term = self.search_entry.get().lower()
-        to_remove = [path for path, info in self.file_entries.items() if search_term in path.lower()]
-        for path in to_remove:
-            self.file_entries[path].checkbox_frame.destroy()
-            del self.file_entries[path]
-        self.update_file_selection_count()
+        # The view's rows are exactly the files matching the current search
+        self.file_entries.remove_indices(self.file_list_view.rows)
+        self.forget_folders_if_empty()
+        self.filter_files()
         self.save_state()  # <<< NEW
 
+    def forget_folders_if_empty(self):
+        # Once every file is gone, watch mode should not keep pulling files in from the old folders
+        if not len(self.file_entries):
+            self.engine.watched_folders.clear()
+
     def add_separator(self):
         separator = tk.Frame(self, height=2, bd=1, relief=tk.SUNKEN)
         separator.pack(fill=tk.X, padx=5, pady=10)
 
     def process_file_path(self, file_path):
-        # Reload whitelisted extensions before processing
-        whitelist_input = self.whitelist_entry.get().strip()
-        self.whitelisted_extensions = [ext.strip().lower() for ext in whitelist_input.split(',') if ext.strip()]
-
-        if (file_path.startswith('"') and file_path.endswith('"')) or (file_path.startswith("'") and file_path.endswith("'")):
-            file_path = file_path[1:-1]
+        self.process_file_paths([file_path])
 
-        normalized_path = os.path.normpath(file_path)
-        if normalized_path in self.file_entries:
-            return
+    def process_file_paths(self, file_paths):
+        """Normalize the given files/folders and ingest them on a background job."""
+        normalized_paths = []
+        for file_path in file_paths:
+            normalized_path = normalize_input_path(file_path)
+            if normalized_path in self.file_entries:
+                continue
 
-        if not os.path.exists(normalized_path):
-            return
+            if not os.path.exists(normalized_path):
+                continue
 
-        if os.path.isdir(normalized_path):
-            self.process_directory(normalized_path)
+            normalized_paths.append(normalized_path)
+
+        if normalized_paths:
+            self.start_ingestion(normalized_paths)
+
+    def start_ingestion(self, paths):
+        # Read all Tk state here; the worker thread must not touch widgets
+        self.reload_scan_options()
+        for path in paths:
+            if os.path.isdir(path):
+                self.engine.remember_folder(path, self.recursion_var.get())
+        job = IngestJob(
+            paths,
+            self.reload_whitelist(),
+            self.recursion_var.get(),
+            ignore_patterns=self.engine.ignore_patterns,
+            max_depth=self.engine.scan_max_depth,
+            max_files=self.engine.scan_max_files,
+        ).start()
+        self.ingest_jobs.append(job)
+        if len(self.ingest_jobs) == 1:
+            self.ingest_progress_frame.pack(side=tk.RIGHT)
+            self.ingest_progress_bar.start(10)
+            self.after(50, self.poll_ingestion)
+
+    def poll_ingestion(self):
+        """Merge everything the ingest jobs produced since the last tick: one merge, one render, one save."""
+        new_paths = []
+        for job in list(self.ingest_jobs):
+            finished = job.finished  # read before draining so no batch is left behind
+            new_paths.extend(job.drain())
+            if finished:
+                self.ingest_jobs.remove(job)
+
+        if new_paths and self.file_entries.add_many(new_paths):
+            self.filter_files()
+            self.save_state()
+
+        scanned = sum(job.scanned_count for job in self.ingest_jobs)
+        self.ingest_progress_label.config(text=f"Scanning... {scanned} files seen, {len(self.file_entries)} loaded")
+
+        if self.ingest_jobs:
+            self.after(50, self.poll_ingestion)
+        else:
+            self.ingest_progress_bar.stop()
+            self.ingest_progress_frame.pack_forget()
+
+    def cancel_ingestion(self):
+        for job in self.ingest_jobs:
+            job.cancel()
+
+    def on_watch_toggle(self):
+        if self.watch_var.get():
+            self.file_watcher = FileWatcher().start()
+            self.watched_version = None
+            logger.info(f"[LLMCodePromptBuilder] Watching files ({self.file_watcher.backend}).")
+            self.after(self.WATCH_POLL_MS, self.poll_watch, self.file_watcher)
         else:
-            self.add_file(normalized_path)
+            self.stop_watching()
+
+    def stop_watching(self):
+        if self.file_watcher is not None:
+            self.file_watcher.stop()
+            self.file_watcher = None
+
+    def poll_watch(self, watcher):
+        if watcher is not self.file_watcher:
+            return  # watching was switched off
+
+        events = watcher.drain()
+        if events:
+            changed, added, removed = self.engine.apply_watch_events(events)
+            if added or removed:
+                self.filter_files()
+                self.save_state()
+            elif changed:
+                self.file_list_view.redraw()  # token counts of edited files are now unknown
+            affected = [path for path in changed if self.file_entries.is_selected(path)] + removed
+            affected += [path for path in added if self.file_entries.is_selected(path)]
+            if affected and self.prompt_document is not None:
+                if self.auto_rebuild_var.get():
+                    self.update_prompt()
+                else:
+                    self.stale_file_count += len(affected)
+                    self.update_timestamp_label.config(
+                        text=f"Latest Update: {self.last_update} ({self.stale_file_count} files changed since)"
+                    )
+
+        # Re-target after any change to the list (ours above, or the user's) or when folders appeared
+        if self.file_entries.version != self.watched_version or events.created_dirs:
+            watcher.set_targets(self.file_entries, self.engine.watched_folders, self.engine.ignore_patterns)
+            self.watched_version = self.file_entries.version
+        self.after(self.WATCH_POLL_MS, self.poll_watch, watcher)
+
+    def schedule_filter_files(self, event=None):
+        """Filter once typing pauses for SEARCH_DELAY_MS instead of on every key."""
+        if self.search_after_id is not None:
+            self.after_cancel(self.search_after_id)
+        self.search_after_id = self.after(self.SEARCH_DELAY_MS, self.filter_files)
 
     def filter_files(self, event=None):
-        search_term = self.search_entry.get().lower()
+        if self.search_after_id is not None:
+            self.after_cancel(self.search_after_id)
+            self.search_after_id = None
+        search_term = self.search_entry.get()
+
+        # The store is already sorted and indexed; the view keeps the matching rows, which the bulk
+        # actions (Select All, Deselect All, Remove All) reuse instead of searching again
+        with timed("filter_files", files=len(self.file_entries)) as span:
+            try:
+                rows = self.file_entries.match(search_term, self.search_mode_combobox.get())
+            except re.error:
+                self.search_entry.config(background="#ffd6d6")  # incomplete/invalid regex: keep the last result
+                return
+            self.search_entry.config(background=self.search_entry_background)
+            if self.rank_order is not None:
+                rank_order, paths, unranked = self.rank_order, self.file_entries.path_at, len(self.rank_order)
+                rows = sorted(rows, key=lambda row: rank_order.get(paths(row), unranked))
+            self.file_list_view.set_rows(rows)
+            span["rows"] = len(rows)
 
-        # Clear current view
-        for file_info in self.file_entries.values():
-            file_info.checkbox_frame.pack_forget()
+        self.update_file_selection_count()
 
-        # Sort the files alphabetically by their path
-        sorted_paths = sorted(self.file_entries.keys())
+    def rank_by_query(self):
+        """Bring the relevance index up to date in the background, then rank the list by the query text."""
+        query_text = self.query_input.get("1.0", tk.END).strip()
+        if not query_text:
+            self.rank_order = None  # an empty query restores path order
+            self.rank_status_label.config(text="")
+            self.filter_files()
+            return
+        if self.rank_job is not None:
+            return  # still indexing; the ranking happens when it finishes
+        self.rank_button.config(state=tk.DISABLED)
+        self.rank_job = self.engine.start_relevance_index()
+        self.after(100, self.poll_rank_job, self.rank_job)
+
+    def poll_rank_job(self, job):
+        if not job.finished:
+            self.rank_status_label.config(text=f"Indexing {job.completed_count:,}/{job.total:,}...")
+            self.after(100, self.poll_rank_job, job)
+            return
+        self.rank_job = None
+        self.rank_button.config(state=tk.NORMAL)
+        if job.cancelled:
+            return
 
-        # Show only the files that match the search term
-        for path in sorted_paths:
-            file_info = self.file_entries[path]
-            if search_term in file_info.file_path.lower():
-                file_info.checkbox_frame.pack(anchor='w', fill='x')
+        top_k_text = self.rank_top_k_entry.get().strip()
+        top_k = int(top_k_text) if top_k_text.isdigit() and int(top_k_text) > 0 else self.DEFAULT_RANK_TOP_K
+        ranked = self.engine.rank_files(self.query_input.get("1.0", tk.END).strip())
+        query_ms = self.engine.relevance_index.last_query_seconds * 1000
+        self.rank_order = {path: position for position, (path, _) in enumerate(ranked)}
+        if self.rank_select_var.get():
+            self.engine.select_paths([path for path, _ in ranked[:top_k]], clear=True)
+            self.save_state()
+        self.file_list_view.top = 0
+        self.filter_files()
 
-        self.update_file_selection_count()
+        self.rank_status_label.config(
+            text=f"{len(ranked):,} matching · query {query_ms:.1f} ms · index {len(self.engine.relevance_index):,} files, "
+                 f"{job.updated_count:,} updated in {job.elapsed:.2f}s"
+        )
+        logger.info(f"[LLMCodePromptBuilder] Ranked {len(ranked)} files in {query_ms:.1f} ms "
+                    f"(index update {job.elapsed:.2f}s, {job.updated_count} files re-indexed).")
 
     def add_file(self, file_path):
         # Reload whitelisted extensions from the entry field
-        whitelist_input = self.whitelist_entry.get().strip()
-        self.whitelisted_extensions = [ext.strip().lower() for ext in whitelist_input.split(',') if ext.strip()]
+        self.reload_whitelist()
 
-        extension = os.path.splitext(file_path)[1].lower().lstrip('.')
-        if self.whitelisted_extensions and extension not in self.whitelisted_extensions:
-            logger.info(f"Skipping {file_path} due to extension '{extension}' not in whitelist.")
-            return
-
-        if file_path not in self.file_entries:  # Ensure no duplicates
-            file_info = FileInfo(file_path)
-            file_info.checkbox_frame = Frame(self.file_list_frame)
-            # <<< CHANGED: hook checkbox to our handler so we can save state
-            file_info.checkbox = Checkbutton(
-                file_info.checkbox_frame,
-                variable=file_info.check_var,
-                command=lambda fi=file_info: self.on_file_checkbox_toggled(fi)
-            )
-            file_info.checkbox.pack(side=tk.LEFT)
-            file_info.label = Label(file_info.checkbox_frame, text=file_info.censored_path, wraplength=400,
-                                    justify='left')
-            file_info.label.pack(side=tk.LEFT)
-            file_info.label.bind("<Button-1>", lambda e, cb=file_info.checkbox: cb.invoke())
-            self.file_entries[file_path] = file_info
+        if self.engine.add_file(file_path):  # Ensure no duplicates
             self.filter_files()  # Update and sort the list after adding a file
             self.update_file_selection_count()
             self.save_state()  # <<< NEW
 
     def process_directory(self, dir_path):
-        for root, dirs, files in os.walk(dir_path):
-            for file_name in files:
-                file_path = os.path.join(root, file_name)
-                normalized_path = os.path.normpath(file_path)
-                if normalized_path not in self.file_entries:
-                    self.add_file(normalized_path)
-            if not self.recursion_var.get():
-                break
+        self.start_ingestion([dir_path])
 
     def add_path(self, event=None):
         path = self.path_entry.get().strip()
         if path:
             self.process_file_path(path)
             self.path_entry.delete(0, tk.END)
-            self.save_state()  # <<< NEW
 
     def select_file(self):
         file_path = filedialog.askopenfilename()
         if file_path:
             self.process_file_path(file_path)
-            self.save_state()  # <<< NEW
 
     def select_folder(self):
         folder_path = filedialog.askdirectory()
         if folder_path:
             self.process_file_path(folder_path)
-            self.save_state()  # <<< NEW
 
     def drop(self, event):
         file_paths = self.parse_file_paths(event.data)
-        for file_path in file_paths:
-            self.process_file_path(file_path)
-        self.save_state()  # <<< NEW
+        self.process_file_paths(file_paths)
 
     def update_prompt(self):
+        self.start_prompt_build(self.apply_prompt_result)
+
+    def fit_to_budget(self):
+        """Build the checked files, then keep the best subset that fits the token budget."""
+        self.on_token_budget_change()
+        self.start_prompt_build(self.apply_budget_fit)
+
+    def start_prompt_build(self, on_done):
         # Reload whitelist (keeps behavior consistent with other methods)
-        whitelist_input = self.whitelist_entry.get().strip()
-        self.whitelisted_extensions = [ext.strip().lower() for ext in whitelist_input.split(',') if ext.strip()]
+        self.reload_whitelist()
 
         # All checked files
-        checked_files = [file_info for file_info in self.file_entries.values() if file_info.check_var.get()]
+        checked_files = self.file_entries.selected_infos()
 
         if len(checked_files) == 0:
             return
 
         # <<< NEW: record the query text used for this prompt
-        self.last_query_text = self.query_input.get("1.0", tk.END).rstrip("\n")
-
-        prompt_text = self.last_query_text + "\n\n"
-
-        missing_paths = []
-        any_file_added = False
-
-        for path, file_info in list(self.file_entries.items()):
-            if not file_info.check_var.get():
-                continue
-
-            # If the file no longer exists, log and mark for removal
-            if not os.path.exists(file_info.file_path):
-                logger.warning(f"[LLMCodePromptBuilder] File missing, removing from list: {file_info.file_path}")
-                missing_paths.append(path)
-                continue
+        self.engine.last_query_text = self.query_input.get("1.0", tk.END).rstrip("\n")
+
+        # A newer Update supersedes any build still in flight
+        if self.build_job is not None:
+            self.build_job.cancel()
+
+        self.build_job = PromptBuildJob(
+            self.engine.last_query_text, checked_files, self.content_cache, token_counter=self.token_counter,
+            processor=self.engine.segment_processor, outline_cache=self.engine.outline_cache,
+            diff_provider=self.engine.diff_provider(),
+        ).start()
+        self.build_progress_bar.config(maximum=len(checked_files), value=0)
+        self.build_progress_frame.pack(side=tk.TOP)
+        self.after(50, self.poll_prompt_build, self.build_job, on_done, time.perf_counter())
+
+    def poll_prompt_build(self, job, on_done, started):
+        if job is not self.build_job:
+            return  # superseded or cancelled
+
+        if not job.finished:
+            self.build_progress_bar.config(value=job.completed_count)
+            self.after(50, self.poll_prompt_build, job, on_done, started)
+            return
 
-            # Try reading the file; if it fails, log and skip but don't remove
-            try:
-                with open(file_info.file_path, 'r', encoding='utf-8') as file:
-                    content = file.read()
-                    prompt_text += f"CONTENTS OF {file_info.censored_path}:\n\n{content}\n"
-                    any_file_added = True
-            except OSError as e:
-                logger.warning(f"[LLMCodePromptBuilder] Error reading file {file_info.file_path}: {e}")
+        self.build_job = None
+        self.build_progress_frame.pack_forget()
+        if job.result is None:
+            logger.warning("[LLMCodePromptBuilder] Prompt build did not produce a result.")
+            return
+        on_done(job.result)
+        # From the click to the prompt being shown: the background build plus applying it to the preview
+        record_span("update_prompt", time.perf_counter() - started, files=job.total)
+
+    def apply_budget_fit(self, result):
+        """Deselect the files the packer dropped and show the prompt made of the ones it kept."""
+        budget = self.engine.token_budget - self.token_counter.count(format_header(result.query_text))
+        # With dedupe on, a "(identical to X)" reference is only meaningful next to X, so each file is packed
+        # as one candidate together with its duplicates
+        groups = {}
+        for path, segment in result.segments:
+            groups.setdefault(result.duplicate_of.get(path, path), []).append((path, segment))
+        candidates = []
+        for key, members in groups.items():
+            infos = [self.file_entries.get(path) for path, _ in members]
+            candidates.append(PackCandidate(
+                key,
+                sum(self.token_counter.count(segment) for _, segment in members),
+                priority=max(info.priority if info else PRIORITY_NORMAL for info in infos),
+                pinned=any(info and info.pinned for info in infos),
+            ))
+        packed = pack_to_budget(candidates, budget)
+
+        dropped_paths = [path for c in packed.dropped for path, _ in groups[c.key]]
+        for path in dropped_paths:
+            self.file_entries.set_selected(path, False)
+        kept_paths = {path for c in packed.kept for path, _ in groups[c.key]}
+        kept_result = PromptBuildResult(
+            result.query_text,
+            [(path, segment) for path, segment in result.segments if path in kept_paths],
+            result.missing_paths,
+            result.cache_hits,
+            result.cache_misses,
+            result.skipped,
+            result.truncated_paths,
+        )
+        self.apply_prompt_result(kept_result)
 
-        # Remove missing files from the UI and internal dict
-        for path in missing_paths:
-            file_info = self.file_entries[path]
-            file_info.checkbox_frame.destroy()
-            del self.file_entries[path]
+        summary = (
+            f"Kept {len(kept_paths)} files ({packed.used_tokens:,} tokens), "
+            f"dropped {len(dropped_paths)} files ({packed.dropped_tokens:,} tokens).\n"
+            f"Room left: {packed.remaining_tokens:,} tokens of {budget:,} available for files."
+        )
+        if packed.over_budget:
+            summary += "\n\nPinned files alone exceed the budget."
+        if dropped_paths:
+            shown = [self.file_entries.get(path).censored_path if path in self.file_entries else path for path in dropped_paths[:25]]
+            summary += "\n\nDropped:\n" + "\n".join(shown)
+            if len(dropped_paths) > 25:
+                summary += f"\n... and {len(dropped_paths) - 25} more"
+        logger.info(f"[LLMCodePromptBuilder] Fit to budget: {summary}")
+        messagebox.showinfo("Fit to Budget", summary, parent=self)
+
+    def show_file_context_menu(self, file_info, event):
+        self.file_context_info = file_info
+        self.file_pinned_var.set(file_info.pinned)
+        self.file_priority_var.set(file_info.priority)
+        self.file_context_menu.tk_popup(event.x_root, event.y_root)
+
+    def on_file_pin_changed(self):
+        if self.file_context_info is not None:
+            self.file_context_info.pinned = self.file_pinned_var.get()
+            self.file_list_view.redraw()
+            self.save_state()
+
+    def on_file_priority_changed(self):
+        if self.file_context_info is not None:
+            self.file_context_info.priority = self.file_priority_var.get()
+            self.file_list_view.redraw()
+            self.save_state()
+
+    def cancel_prompt_build(self):
+        if self.build_job is not None:
+            self.build_job.cancel()
+            self.build_job = None
+            self.build_progress_frame.pack_forget()
+
+    def apply_prompt_result(self, result):
+        missing_paths = result.missing_paths
+
+        self.cache_stats_label.config(text=f"Cache: {result.cache_hits} hits / {result.cache_misses} misses")
+        self.show_post_processing_savings(result)
+
+        # Remove missing files from the UI and internal store
+        self.file_entries.remove_many(missing_paths)
+        self.show_read_notes(result)
 
         if missing_paths:
             self.save_state()  # <<< NEW (state changed)
@@ -468,76 +1052,275 @@ class LLMCodePromptBuilder(TkinterDnD.Tk):
         self.update_file_selection_count()
 
         # If no files could be read, still show the query text so the user sees *something*
+        if self.prompt_document is None:
+            self.prompt_document = PromptDocument(result.query_text, result.segments, token_counter=self.token_counter)
+            self.refresh_preview()
+        else:
+            # Only the segments that changed since the last build are spliced into the preview
+            self.refresh_preview(self.prompt_document.sync(result.query_text, result.segments))
+
+        for path, _ in result.segments:
+            file_info = self.file_entries.get(path)
+            if file_info is not None:
+                file_info.token_count = self.prompt_document.segment_tokens(path)
+        self.file_list_view.redraw()
+
+        self.update_counts()
+        self.mark_prompt_updated()
+
+        # <<< NEW: persist the fact that this query was the latest used
+        self.save_state()
+
+    def show_post_processing_savings(self, result):
+        if self.engine.diff_only:
+            self.post_process_label.config(text=f"Diffs of {len(result.segments):,} changed files, "
+                                                f"{result.unchanged_count:,} unchanged left out")
+            return
+        if result.original_chars is None:
+            self.post_process_label.config(text="")
+            return
+        after = result.segment_chars
+        saved = 100 * (result.original_chars - after) / result.original_chars if result.original_chars else 0
+        text = f"Files: {result.original_chars:,} → {after:,} chars (-{saved:.0f}%)"
+        if result.duplicate_count:
+            text += f", {result.duplicate_count} duplicates"
+        self.post_process_label.config(text=text)
+
+    def show_read_notes(self, result):
+        """Flag skipped and truncated files in the list and summarize them under the prompt."""
+        for path, _ in result.segments:
+            info = self.file_entries.get(path)
+            if info is not None:
+                info.read_note = None
+        for path, reason in result.skipped:
+            info = self.file_entries.get(path)
+            if info is not None:
+                info.read_note = reason
+        for path in result.truncated_paths:
+            info = self.file_entries.get(path)
+            if info is not None:
+                info.read_note = "truncated"
+
+        self.read_issues = (result.skipped, result.truncated_paths)
+        parts = []
+        if result.skipped:
+            parts.append(f"Skipped: {len(result.skipped)}")
+        if result.truncated_paths:
+            parts.append(f"Truncated: {len(result.truncated_paths)}")
+        self.read_issues_label.config(text=" · ".join(parts))
+
+    def show_read_issues(self, event=None):
+        skipped, truncated_paths = self.read_issues
+        if not skipped and not truncated_paths:
+            return
+        censor = FileInfo.censor_username
+        lines = [f"Skipped ({reason}): {censor(path)}" for path, reason in skipped[:25]]
+        lines += [f"Truncated: {censor(path)}" for path in truncated_paths[:25]]
+        if len(skipped) > 25 or len(truncated_paths) > 25:
+            lines.append("...")
+        messagebox.showinfo("Skipped and Truncated Files", "\n".join(lines), parent=self)
+
+    def refresh_preview(self, edits=None):
+        """
+        Bring the preview in line with prompt_document. Small prompts are shown whole and edits are spliced in;
+        prompts over PREVIEW_FULL_CHARS only ever show a bounded window of head and tail.
+        """
+        document = self.prompt_document
+        if document is None:
+            self.show_prompt_text("")
+            self.preview_is_full = True
+        elif document.char_count > self.PREVIEW_FULL_CHARS:
+            self.show_prompt_text(
+                document.head(self.PREVIEW_HEAD_CHARS)
+                + f"\n\n... [{document.char_count - self.PREVIEW_HEAD_CHARS - self.PREVIEW_TAIL_CHARS:,} characters not "
+                f"shown; pick a file under Jump to, or use Copy / Save to File for the whole prompt] ...\n\n"
+                + document.tail(self.PREVIEW_TAIL_CHARS)
+            )
+            self.preview_is_full = False
+        elif edits is not None and self.preview_is_full and len(edits) <= self.MAX_SPLICE_EDITS:
+            self.apply_prompt_edits(edits)
+        else:
+            self.show_prompt_text(document.text)
+            self.preview_is_full = True
+        self.update_jump_list()
+
+    def update_jump_list(self):
+        document = self.prompt_document
+        self.jump_paths = document.paths if document is not None else []
+        self.jump_combobox.config(values=[
+            self.file_entries.get(path).censored_path if path in self.file_entries else path for path in self.jump_paths
+        ])
+        self.jump_combobox.set("")
+
+    def on_jump_selected(self, event=None):
+        index = self.jump_combobox.current()
+        document = self.prompt_document
+        if document is None or not 0 <= index < len(self.jump_paths):
+            return
+        path = self.jump_paths[index]
+        if self.preview_is_full:
+            widget_range = document.widget_range(path)
+            if widget_range is not None:
+                self.text_display.see(f"1.0 + {widget_range[1]} chars")
+                self.text_display.see(f"1.0 + {widget_range[0]} chars")
+            return
+        # Large prompt: show just this file's segment (bounded like the rest of the preview)
+        segment = document.segment_text(path) or ""
+        if len(segment) > self.PREVIEW_HEAD_CHARS:
+            segment = segment[:self.PREVIEW_HEAD_CHARS] + f"\n... [{len(segment) - self.PREVIEW_HEAD_CHARS:,} more characters] ...\n"
+        self.show_prompt_text(segment)
+
+    def show_prompt_text(self, prompt_text):
         self.text_display.config(state='normal')
         self.text_display.delete(1.0, tk.END)
         self.text_display.insert(tk.INSERT, prompt_text)
         self.text_display.config(state='disabled')
 
-        self.update_counts(prompt_text)
+    def apply_prompt_edits(self, edits):
+        self.text_display.config(state='normal')
+        for edit in edits:
+            start = f"1.0 + {edit.start} chars"
+            if edit.old_length:
+                self.text_display.delete(start, f"1.0 + {edit.start + edit.old_length} chars")
+            if edit.new_text:
+                self.text_display.insert(start, edit.new_text)
+        self.text_display.config(state='disabled')
+
+    def mark_prompt_updated(self):
+        self.stale_file_count = 0
         self.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.update_timestamp_label.config(text=f"Latest Update: {self.last_update}")
 
-        # <<< NEW: persist the fact that this query was the latest used
-        self.save_state()
-
-    def update_counts(self, text):
-        char_count = len(text)
-        word_count = len(text.split())
+    def update_counts(self):
+        # Totals are maintained by the prompt document as segments come and go
+        document = self.prompt_document
+        char_count = document.char_count if document else 0
+        word_count = document.word_count if document else 0
+        token_count = document.token_count if document else 0
         self.char_count_label.config(text=f"Characters: {char_count}")
         self.word_count_label.config(text=f"Words: {word_count}")
 
+        percent = 100 * token_count / self.engine.token_budget
+        if token_count > self.engine.token_budget:
+            self.token_count_label.config(
+                text=f"Tokens: {token_count:,} / {self.engine.token_budget:,} ({percent:.0f}%) - OVER BUDGET by {token_count - self.engine.token_budget:,}",
+                fg="red",
+            )
+        else:
+            self.token_count_label.config(text=f"Tokens: {token_count:,} / {self.engine.token_budget:,} ({percent:.0f}%)", fg="black")
+
     def update_file_selection_count(self):
-        count = sum(file_info.check_var.get() for file_info in self.file_entries.values())
+        count = self.file_entries.selected_count()
         self.file_selection_count_label.config(text=f"Selected Files: {count}")
 
     def remove_selected(self):
-        selected_files = [path for path, info in self.file_entries.items() if info.check_var.get()]
-        for path in selected_files:
-            self.file_entries[path].checkbox_frame.destroy()
-            del self.file_entries[path]
+        self.file_entries.remove_selected()
+        self.forget_folders_if_empty()
         self.filter_files()  # Update and sort the list after removing a file
         self.update_file_selection_count()
         self.save_state()  # <<< NEW
 
-    def on_frame_configure(self, event=None):
-        self.file_list_canvas.configure(scrollregion=self.file_list_canvas.bbox("all"))
-
     @staticmethod
     def parse_file_paths(data_string):
-        file_paths = []
-        if '{' in data_string and '}' in data_string:
-            current_path = ''
-            inside_braces = False
-            for char in data_string:
-                if char == '{':
-                    inside_braces = True
-                    current_path = ''
-                elif char == '}':
-                    inside_braces = False
-                    file_paths.append(current_path.strip())
-                elif inside_braces:
-                    current_path += char
-        else:
-            file_paths = data_string.split()
-        return file_paths
+        return parse_file_paths(data_string)
 
     def copy_to_clipboard(self):
+        # From the built prompt, not the preview: the widget may only hold part of it
+        if self.prompt_document is None:
+            return
+        self.clipboard_clear()
+        self.clipboard_append(self.prompt_document.text)
+
+    def save_prompt_to_file(self):
+        if self.prompt_document is None:
+            return
+        file_path = filedialog.asksaveasfilename(
+            parent=self, defaultextension=".txt", filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        try:
+            with open(file_path, "w", encoding="utf-8", newline="\n") as f:
+                for chunk in self.prompt_document.iter_chunks():
+                    f.write(chunk)
+        except OSError as e:
+            logger.warning(f"[LLMCodePromptBuilder] Failed to save prompt to {file_path}: {e}")
+            messagebox.showerror("Save to File", f"Could not save the prompt:\n{e}", parent=self)
+            return
+        logger.info(f"[LLMCodePromptBuilder] Saved prompt ({self.prompt_document.char_count:,} characters) to {file_path}")
+
+    def plan_prompt_parts(self):
+        """Split plan for the built prompt: parts of at most the context budget, in tokens. None if it can't be split."""
+        document = self.prompt_document
+        if document is None:
+            return None
+        try:
+            return plan_parts(document.query_text, document.iter_segments(), self.engine.token_budget, self.token_counter.count)
+        except ValueError as e:
+            messagebox.showerror("Split Prompt", f"Could not split the prompt:\n{e}", parent=self)
+            return None
+
+    def refresh_part_choices(self):
+        plan = self.plan_prompt_parts()
+        count = len(plan) if plan else 0
+        self.part_combobox.config(values=[f"{number} of {count}" for number in range(1, count + 1)])
+
+    def copy_part_to_clipboard(self, event=None):
+        choice = self.part_combobox.get()
+        self.part_combobox.set("")
+        plan = self.plan_prompt_parts()
+        if not choice or not plan:
+            return
+        number = int(choice.split()[0])
+        if number > len(plan):
+            return
+        document = self.prompt_document
+        text = "".join(chunk for part, chunk in iter_parts(document.query_text, document.iter_segments(), plan)
+                       if part == number)
         self.clipboard_clear()
-        self.clipboard_append(self.text_display.get(1.0, tk.END))
+        self.clipboard_append(text)
+        logger.info(f"[LLMCodePromptBuilder] Copied part {number} of {len(plan)} ({len(text):,} characters)")
+
+    def save_parts_to_files(self):
+        plan = self.plan_prompt_parts()
+        if not plan:
+            return
+        file_path = filedialog.asksaveasfilename(
+            parent=self, defaultextension=".txt", filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
+            title="Save Parts (numbered files are written next to this name)",
+        )
+        if not file_path:
+            return
+        document = self.prompt_document
+        try:
+            paths = write_parts(document.query_text, document.iter_segments(), plan, file_path)
+        except OSError as e:
+            logger.warning(f"[LLMCodePromptBuilder] Failed to save prompt parts to {file_path}: {e}")
+            messagebox.showerror("Save Parts", f"Could not save the prompt parts:\n{e}", parent=self)
+            return
+        logger.info(f"[LLMCodePromptBuilder] Saved prompt in {len(paths)} parts of at most "
+                    f"{self.engine.token_budget:,} tokens: {paths[0]} ...")
+
+    def add_dependencies(self):
+        depth = self.dependency_depth_combobox.get()
+        added = self.engine.add_dependencies(None if depth == "All" else int(depth))
+        if added:
+            self.file_list_view.redraw()
+            self.update_file_selection_count()
+            self.save_state()
+        self.rank_status_label.config(
+            text=f"Added {len(added):,} dependencies in {self.engine.dependency_graph.last_expand_seconds * 1000:.1f} ms"
+        )
 
     def select_all(self):
-        search_term = self.search_entry.get().lower()
-        for file_info in self.file_entries.values():
-            if search_term in file_info.file_path.lower():
-                file_info.check_var.set(True)
+        self.file_entries.set_selected_indices(self.file_list_view.rows, True)
+        self.file_list_view.redraw()
         self.update_file_selection_count()
         self.save_state()  # <<< NEW
 
     def deselect_all(self):
-        search_term = self.search_entry.get().lower()
-        for file_info in self.file_entries.values():
-            if search_term in file_info.file_path.lower():
-                file_info.check_var.set(False)
+        self.file_entries.set_selected_indices(self.file_list_view.rows, False)
+        self.file_list_view.redraw()
         self.update_file_selection_count()
         self.save_state()  # <<< NEW
 
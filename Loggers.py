@@ -1,9 +1,19 @@
 import logging
 import sys
 import io
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
 
 _MAIN_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 
+# Timing spans go to their own logger, one JSON object per line, at DEBUG (off unless configure_perf_logger is called)
+PERF_LOGGER_NAME = "perf"
+_perf_logger = logging.getLogger(PERF_LOGGER_NAME)
+# The latest spans, newest last, for the in-app perf panel; appends from worker threads are safe
+recent_spans = deque(maxlen=500)
+
 def _make_utf8_stdout():
     """
     Ensure sys.stdout is UTF-8 so logging a.k.a. StreamHandler(sys.stdout) won't choke on Unicode.
@@ -18,16 +28,72 @@ def _make_utf8_stdout():
         except Exception:
             return sys.stdout
 
-def _add_console_handler(logger, level):
-    stream = _make_utf8_stdout()
+def _add_console_handler(logger, level, stream=None):
+    stream = stream if stream is not None else _make_utf8_stdout()
     console_handler = logging.StreamHandler(stream)
     console_handler.setLevel(level)
     console_formatter = logging.Formatter(_MAIN_FORMAT)
     console_handler.setFormatter(console_formatter)
+    console_handler._is_console_handler = True
     logger.addHandler(console_handler)
+    return console_handler
 
 
-def configure_console_logger(level=logging.INFO):
+def configure_console_logger(level=logging.INFO, stream=None):
+    """
+    Log to stdout (or the given stream). Calling this again replaces the previous console handler
+    instead of adding a second one, so modules can call it defensively at import time.
+    """
     logger = logging.getLogger()
     logger.setLevel(level)
-    _add_console_handler(logger, level)
+    for handler in list(logger.handlers):
+        if getattr(handler, "_is_console_handler", False):
+            logger.removeHandler(handler)
+    _add_console_handler(logger, level, stream)
+
+
+def configure_perf_logger(stream=None, path=None):
+    """
+    Emit timing spans as JSON lines to `path` (appended) or the given stream (default stderr). They are not
+    passed on to the console handler, so enabling them doesn't interleave JSON with the regular log.
+    """
+    handler = logging.FileHandler(path, encoding="utf-8") if path else logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    for old_handler in list(_perf_logger.handlers):
+        _perf_logger.removeHandler(old_handler)
+    _perf_logger.addHandler(handler)
+    _perf_logger.setLevel(logging.DEBUG)
+    _perf_logger.propagate = False
+    return handler
+
+
+@contextmanager
+def timed(stage, **fields):
+    """
+    Time a block as one span: {"stage": ..., <fields>, "ms": ...}. The yielded dict takes fields known only
+    at the end (e.g. counts). The span is kept in recent_spans and logged as JSON on the perf logger.
+    """
+    span = {"stage": stage, **fields}
+    started = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        span["error"] = type(e).__name__
+        raise
+    finally:
+        span["ms"] = round((time.perf_counter() - started) * 1000, 3)
+        _emit_span(span)
+
+
+def record_span(stage, seconds, **fields):
+    """Log a span timed elsewhere, e.g. a background job measured from start to its result being shown."""
+    span = {"stage": stage, **fields, "ms": round(seconds * 1000, 3)}
+    _emit_span(span)
+    return span
+
+
+def _emit_span(span):
+    span["at"] = round(time.time(), 3)
+    recent_spans.append(span)
+    if _perf_logger.isEnabledFor(logging.DEBUG):
+        _perf_logger.debug(json.dumps(span, default=str))
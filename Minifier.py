@@ -0,0 +1,195 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import tokenize
+from collections import OrderedDict
+
+
+logger = logging.getLogger(__name__)
+
+
+def content_digest(text):
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+def _drop_blank_lines(lines, keep=frozenset()):
+    """Strip trailing whitespace and drop blank lines, except the (0-based) line numbers in `keep`."""
+    out = []
+    for number, line in enumerate(lines):
+        if number in keep:
+            out.append(line)
+            continue
+        line = line.rstrip()
+        if line:
+            out.append(line)
+    return "\n".join(out) + "\n" if out else ""
+
+
+def minify_python(text):
+    """Remove comments, trailing whitespace and blank lines; string contents (docstrings included) are kept as-is."""
+    lines = text.splitlines()
+    comments = {}  # line number -> column where its comment starts
+    protected = set()  # lines inside multi-line strings
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(text).readline):
+            if token.type == tokenize.COMMENT:
+                comments[token.start[0] - 1] = token.start[1]
+            elif token.type == tokenize.STRING and token.end[0] > token.start[0]:
+                protected.update(range(token.start[0], token.end[0]))
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return _drop_blank_lines(lines)  # not valid Python: at least drop the blank lines
+
+    for number, column in comments.items():
+        lines[number] = lines[number][:column]
+    # A line that opens a multi-line string is not protected itself, only the ones after it
+    return _drop_blank_lines(lines, keep=protected)
+
+
+def _is_digit_separator(text, i):
+    """True if the ' at text[i] separates digits of a number (C++14 1'000'000, 0xFF'FF) rather than opening a char."""
+    if i == 0 or i + 1 >= len(text) or not text[i - 1].isalnum() or not text[i + 1].isalnum():
+        return False
+    j = i - 1
+    while j > 0 and (text[j - 1].isalnum() or text[j - 1] in "_.'"):
+        j -= 1
+    # u8'a', L'a' etc. are char literals: the token before the quote must itself be a number
+    return text[j].isdigit()
+
+
+def _is_verbatim_string(text, i):
+    """True if the " at text[i] opens a C# verbatim string: @"...", $@"..." or @$"..."."""
+    return i > 0 and (text[i - 1] == '@' or (text[i - 1] == '$' and i > 1 and text[i - 2] == '@'))
+
+
+def strip_c_comments(text, verbatim_strings=False):
+    """
+    Remove // and /* */ comments from C-family source, leaving string and char literals alone.
+    With verbatim_strings, C# @"..." (and $@"/@$" interpolated) literals, where "" escapes a quote and backslash
+    is literal, are understood. A ' between digits is a C++14 digit separator, not a char literal.
+    """
+    out = []
+    i = 0
+    n = len(text)
+    start = 0
+    while i < n:
+        char = text[i]
+        if char == '/' and i + 1 < n and text[i + 1] in '/*':
+            out.append(text[start:i])
+            if text[i + 1] == '/':
+                end = text.find('\n', i)
+                i = n if end < 0 else end
+            else:
+                end = text.find('*/', i + 2)
+                comment = text[i:n if end < 0 else end + 2]
+                i = n if end < 0 else end + 2
+                # Keep line structure so following code doesn't merge into the line before it
+                out.append('\n' * comment.count('\n') if '\n' in comment else ' ')
+            start = i
+        elif char == '"' and verbatim_strings and _is_verbatim_string(text, i):
+            i += 1
+            while i < n:
+                if text[i] == '"':
+                    if i + 1 < n and text[i + 1] == '"':
+                        i += 2
+                        continue
+                    break
+                i += 1
+            i += 1
+        elif char == "'" and _is_digit_separator(text, i):
+            i += 1
+        elif char == '"' or char == "'":
+            i += 1
+            while i < n and text[i] != char and text[i] != '\n':
+                i += 2 if text[i] == '\\' else 1
+            i += 1
+        else:
+            i += 1
+    out.append(text[start:])
+    return "".join(out)
+
+
+def minify_c_like(text, verbatim_strings=False):
+    return _drop_blank_lines(strip_c_comments(text, verbatim_strings).splitlines())
+
+
+def minify_csharp(text):
+    return minify_c_like(text, verbatim_strings=True)
+
+
+def minify_json(text):
+    """Re-serialize compactly; JSON with comments (jsonc) is de-commented first. Invalid JSON is only trimmed."""
+    for candidate in (text, strip_c_comments(text)):
+        try:
+            return json.dumps(json.loads(candidate), separators=(',', ':'), ensure_ascii=False) + "\n"
+        except ValueError:
+            continue
+    return _drop_blank_lines(text.splitlines())
+
+
+MINIFIERS = {
+    "py": minify_python,
+    "pyw": minify_python,
+    "cs": minify_csharp,
+    "cpp": minify_c_like,
+    "cc": minify_c_like,
+    "cxx": minify_c_like,
+    "c": minify_c_like,
+    "h": minify_c_like,
+    "hpp": minify_c_like,
+    "java": minify_c_like,
+    "js": minify_c_like,
+    "ts": minify_c_like,
+    "json": minify_json,
+}
+
+
+def minifier_for(path):
+    return MINIFIERS.get(os.path.splitext(path)[1].lower().lstrip('.'))
+
+
+class SegmentProcessor:
+    """
+    Optional post-processing of file contents during prompt assembly: per-extension minification and
+    content-hash deduplication.
+
+    Minified bodies are cached by (content digest, extension), so unchanged files, and identical files at
+    other paths, are minified once. Safe to share between the build's worker threads.
+    """
+
+    def __init__(self, minify=False, dedupe=False, max_entries=4096):
+        self.minify = minify
+        self.dedupe = dedupe
+        self.max_entries = max_entries
+        self._minified = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.minify or self.dedupe
+
+    def process(self, path, text):
+        """Return (body, digest of the original text)."""
+        digest = content_digest(text)
+        minifier = minifier_for(path) if self.minify else None
+        if minifier is None:
+            return text, digest
+
+        key = (digest, minifier)
+        with self._lock:
+            body = self._minified.get(key)
+            if body is not None:
+                self._minified.move_to_end(key)
+                return body, digest
+        try:
+            body = minifier(text)
+        except Exception as e:
+            logger.warning(f"[SegmentProcessor] Could not minify {path}: {e}")
+            body = text
+        with self._lock:
+            self._minified[key] = body
+            while len(self._minified) > self.max_entries:
+                self._minified.popitem(last=False)
+        return body, digest
@@ -0,0 +1,189 @@
+import ast
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from Minifier import strip_c_comments, _drop_blank_lines, _is_digit_separator, _is_verbatim_string
+
+
+logger = logging.getLogger(__name__)
+
+ELIDED = "..."
+
+# A '{' after one of these opens a scope whose members we want to see; any other block body is elided
+_SCOPE_HEADER = re.compile(r'\b(class|struct|interface|namespace|enum|record|union)\b|extern\s+"C"')
+
+
+def _python_docstring(node, indent):
+    docstring = ast.get_docstring(node, clean=False)
+    if docstring is None:
+        return []
+    return [f'{indent}"""{docstring}"""']
+
+
+def _python_outline_body(nodes, indent, lines):
+    for node in nodes:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            lines.append(indent + ast.unparse(node))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            lines.extend(f"{indent}@{ast.unparse(decorator)}" for decorator in node.decorator_list)
+            prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+            returns = f" -> {ast.unparse(node.returns)}" if node.returns is not None else ""
+            lines.append(f"{indent}{prefix} {node.name}({ast.unparse(node.args)}){returns}:")
+            lines.extend(_python_docstring(node, indent + "    "))
+            lines.append(f"{indent}    {ELIDED}")
+        elif isinstance(node, ast.ClassDef):
+            lines.extend(f"{indent}@{ast.unparse(decorator)}" for decorator in node.decorator_list)
+            bases = [ast.unparse(base) for base in node.bases] + [ast.unparse(keyword) for keyword in node.keywords]
+            lines.append(f"{indent}class {node.name}({', '.join(bases)}):" if bases else f"{indent}class {node.name}:")
+            body_start = len(lines)
+            lines.extend(_python_docstring(node, indent + "    "))
+            _python_outline_body(node.body, indent + "    ", lines)
+            if len(lines) == body_start:
+                lines.append(f"{indent}    {ELIDED}")
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            # Constants and class attributes: keep the name (and annotation), not the value
+            if isinstance(node, ast.AnnAssign):
+                lines.append(f"{indent}{ast.unparse(node.target)}: {ast.unparse(node.annotation)}")
+            else:
+                targets = " = ".join(ast.unparse(target) for target in node.targets)
+                lines.append(f"{indent}{targets} = {ELIDED}")
+
+
+def outline_python(text):
+    """Imports, classes, function signatures (with decorators) and docstrings; every body becomes '...'."""
+    tree = ast.parse(text)
+    lines = _python_docstring(tree, "")
+    _python_outline_body(tree.body, "", lines)
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def _skip_literal(text, i):
+    """Index just past the string/char literal starting at text[i]."""
+    quote = text[i]
+    if quote == "'" and _is_digit_separator(text, i):
+        return i + 1
+    if quote == '"' and _is_verbatim_string(text, i):
+        i += 1
+        while i < len(text):
+            if text[i] == '"':
+                if text[i + 1:i + 2] == '"':
+                    i += 2
+                    continue
+                return i + 1
+            i += 1
+        return i
+    i += 1
+    while i < len(text) and text[i] != quote and text[i] != '\n':
+        i += 2 if text[i] == '\\' else 1
+    return i + 1
+
+
+def _matching_brace(text, i):
+    """Index just past the '}' closing the '{' at text[i] (or len(text) if unbalanced)."""
+    depth = 0
+    while i < len(text):
+        char = text[i]
+        if char == '"' or char == "'":
+            i = _skip_literal(text, i)
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+
+def outline_c_like(text):
+    """
+    Declarations of C#/C++ source with function and property bodies elided: a small brace tokenizer keeps
+    everything at namespace/type scope and replaces every other '{...}' block with '{ ... }'.
+    """
+    text = strip_c_comments(text, verbatim_strings=True)
+    out = []
+    i = start = statement_start = 0
+    n = len(text)
+    while i < n:
+        char = text[i]
+        if char == '"' or char == "'":
+            i = _skip_literal(text, i)
+        elif char == '{':
+            header = text[statement_start:i]
+            if _SCOPE_HEADER.search(header):
+                i += 1
+                statement_start = i
+            else:
+                out.append(text[start:i])
+                out.append("{ " + ELIDED + " }")
+                i = start = statement_start = _matching_brace(text, i)
+        elif char in ';}':
+            i += 1
+            statement_start = i
+        elif char == '#' and text[statement_start:i].strip() == "":
+            # Preprocessor line: never part of a declaration header
+            end = text.find('\n', i)
+            i = statement_start = n if end < 0 else end + 1
+        else:
+            i += 1
+    out.append(text[start:])
+    return _drop_blank_lines("".join(out).splitlines())
+
+
+OUTLINERS = {
+    "py": outline_python,
+    "pyw": outline_python,
+    "cs": outline_c_like,
+    "cpp": outline_c_like,
+    "cc": outline_c_like,
+    "cxx": outline_c_like,
+    "c": outline_c_like,
+    "h": outline_c_like,
+    "hpp": outline_c_like,
+    "java": outline_c_like,
+}
+
+
+def outliner_for(path):
+    return OUTLINERS.get(os.path.splitext(path)[1].lower().lstrip('.'))
+
+
+class OutlineCache:
+    """
+    Outlines keyed by (path, mtime_ns, length of the text read), so toggling many files only parses the ones
+    that changed.
+    Files without an outliner, or that fail to parse, fall back to their full text. Thread-safe.
+    """
+
+    def __init__(self, max_entries=8192):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def outline(self, path, text):
+        outliner = outliner_for(path)
+        if outliner is None:
+            return text
+        try:
+            key = (path, os.stat(path).st_mtime_ns, len(text))
+        except OSError:
+            key = None
+        with self._lock:
+            if key is not None and key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        try:
+            result = outliner(text)
+        except (SyntaxError, ValueError, RecursionError) as e:
+            logger.info(f"[OutlineCache] Cannot outline {path} ({e}); using full contents.")
+            result = text
+        if key is not None:
+            with self._lock:
+                self._entries[key] = result
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return result
@@ -0,0 +1,83 @@
+import tkinter as tk
+from tkinter import ttk
+
+from Loggers import recent_spans
+
+
+def summarize_spans(spans):
+    """Per stage: (stage, count, last ms, mean ms, max ms, last span's other fields), stages in first-seen order."""
+    stages = {}
+    for span in spans:
+        stages.setdefault(span["stage"], []).append(span)
+    rows = []
+    for stage, stage_spans in stages.items():
+        times = [span["ms"] for span in stage_spans]
+        last = stage_spans[-1]
+        details = ", ".join(f"{key}={value}" for key, value in last.items() if key not in ("stage", "ms", "at"))
+        rows.append((stage, len(times), last["ms"], sum(times) / len(times), max(times), details))
+    return rows
+
+
+class PerfPanel:
+    """
+    Window listing the timing spans recorded by Loggers.timed (ingest, filter, build, state load/save, ...)
+    as one row per stage with its count, last, mean and max duration. Refreshed while open.
+    """
+
+    REFRESH_MS = 500
+    COLUMNS = (("stage", "Stage", 140), ("count", "Count", 60), ("last", "Last ms", 80), ("mean", "Mean ms", 80),
+               ("max", "Max ms", 80), ("details", "Last run", 320))
+
+    def __init__(self, master):
+        self.master = master
+        self.window = None
+        self.tree = None
+        self._shown_signature = None
+        self._after_id = None
+
+    @property
+    def is_open(self):
+        return self.window is not None
+
+    def open(self):
+        if self.window is not None:
+            self.window.lift()
+            return
+        self.window = tk.Toplevel(self.master)
+        self.window.title("Performance")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.tree = ttk.Treeview(self.window, columns=[key for key, _, _ in self.COLUMNS], show="headings", height=14)
+        for key, title, width in self.COLUMNS:
+            self.tree.heading(key, text=title)
+            self.tree.column(key, width=width, anchor=tk.W if key in ("stage", "details") else tk.E)
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        buttons = tk.Frame(self.window)
+        buttons.pack(fill=tk.X, padx=5, pady=(0, 5))
+        tk.Button(buttons, text="Clear", command=self.clear).pack(side=tk.RIGHT)
+        self._shown_signature = None
+        self.refresh()
+
+    def close(self):
+        if self._after_id is not None:
+            self.master.after_cancel(self._after_id)
+            self._after_id = None
+        if self.window is not None:
+            self.window.destroy()
+            self.window = self.tree = None
+
+    def clear(self):
+        recent_spans.clear()
+        self._shown_signature = None
+
+    def refresh(self):
+        if self.window is None:
+            return
+        spans = list(recent_spans)
+        # Redraw only when spans came or went (the deque is bounded, so compare the newest one too)
+        signature = (len(spans), spans[-1]["at"] if spans else None)
+        if signature != self._shown_signature:
+            self._shown_signature = signature
+            self.tree.delete(*self.tree.get_children())
+            for stage, count, last, mean, longest, details in summarize_spans(spans):
+                self.tree.insert("", tk.END, values=(stage, count, f"{last:,.1f}", f"{mean:,.1f}", f"{longest:,.1f}", details))
+        self._after_id = self.master.after(self.REFRESH_MS, self.refresh)
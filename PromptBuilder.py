@@ -0,0 +1,552 @@
+import bisect
+import itertools
+import logging
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from FileReader import BinaryFileError
+from Minifier import content_digest
+from Loggers import timed
+
+
+logger = logging.getLogger(__name__)
+
+
+# Characters outside the BMP are stored by Tk as surrogate pairs and count as two text-widget positions
+_ASTRAL_CHARS = re.compile('[\U00010000-\U0010FFFF]')
+
+
+def format_header(query_text):
+    return query_text + "\n\n"
+
+
+def format_segment(censored_path, content, outline=False):
+    label = "OUTLINE OF" if outline else "CONTENTS OF"
+    return f"{label} {censored_path}:\n\n{content}\n"
+
+
+def format_diff_segment(censored_path, diff):
+    return f"DIFF OF {censored_path}:\n\n{diff}\n"
+
+
+def format_duplicate_segment(censored_path, original_censored_path, outline=False):
+    label = "OUTLINE OF" if outline else "CONTENTS OF"
+    return f"{label} {censored_path}:\n\n(identical to {original_censored_path})\n"
+
+
+def dedupe_key(raw_text, digest, outline):
+    """
+    Key under which a file's segment is deduplicated. Always derived from the file's own text: outlines of
+    different files can coincide, so an outlined file is keyed by its raw text plus the outline flag.
+    """
+    return ("outline", content_digest(raw_text)) if outline else digest
+
+
+def widget_length(text):
+    return len(text) + len(_ASTRAL_CHARS.findall(text))
+
+
+class PromptBuildResult:
+    def __init__(self, query_text, segments, missing_paths, cache_hits, cache_misses, skipped=(), truncated_paths=(),
+                 original_chars=None, duplicate_count=0, unchanged_count=0, duplicate_of=None):
+        self.query_text = query_text
+        self.segments = segments  # [(path, segment text)] in prompt order
+        self.missing_paths = missing_paths
+        self.cache_hits = cache_hits
+        self.cache_misses = cache_misses
+        self.skipped = list(skipped)  # [(path, reason)] for binary or unreadable files
+        self.truncated_paths = list(truncated_paths)  # files cut to the per-file byte cap
+        # With minify/dedupe on: size of the segments before post-processing, and files emitted as references
+        self.original_chars = original_chars
+        self.duplicate_count = duplicate_count
+        # With dedupe on: path of each file emitted as a reference -> path of the file whose segment carries the body
+        self.duplicate_of = duplicate_of or {}
+        # In diff mode: selected files left out because they don't differ from the base revision
+        self.unchanged_count = unchanged_count
+
+    @property
+    def segment_chars(self):
+        return sum(len(segment) for _, segment in self.segments)
+
+    @property
+    def prompt_text(self):
+        return format_header(self.query_text) + "".join(segment for _, segment in self.segments)
+
+
+class SegmentEdit:
+    """Replace `old_length` text-widget positions starting at `start` with `new_text`."""
+
+    __slots__ = ("start", "old_length", "new_text")
+
+    def __init__(self, start, old_length, new_text):
+        self.start = start
+        self.old_length = old_length
+        self.new_text = new_text
+
+
+class PromptDocument:
+    """
+    Ordered index of the segments that make up a built prompt: the query header, then one segment per file
+    in path order.
+
+    Each segment keeps its length, its length in text-widget positions, its word count and its token count,
+    so a single file can be inserted, replaced or removed by returning a SegmentEdit for the preview while the
+    totals are adjusted by deltas. The joined text is only rebuilt when someone asks for it.
+
+    Segment offsets come from prefix sums that stay valid up to the first edited segment and are extended on
+    demand, so looking up offsets in path order (as sync() does) costs one pass however many segments change.
+    """
+
+    def __init__(self, query_text, segments=(), token_counter=None):
+        self.token_counter = token_counter
+        self.query_text = query_text
+        self.header = format_header(query_text)
+        self._paths = []
+        self._texts = []
+        self._widget_lengths = []
+        self._word_counts = []
+        self._token_counts = []
+        self.char_count = len(self.header)
+        self.word_count = len(self.header.split())
+        self.header_tokens = self._count_tokens(self.header)
+        self.token_count = self.header_tokens
+        self._joined = None
+        # _char_starts[i] / _widget_starts[i]: offset of segment i in `text` / in the widget, for i < len(...)
+        self._char_starts = [len(self.header)]
+        self._widget_starts = [widget_length(self.header)]
+        segments = list(segments)
+        if all(a[0] < b[0] for a, b in zip(segments, segments[1:])):
+            # Builds hand over segments in path order: append them in one pass
+            for path, text in segments:
+                self._append(path, text)
+        else:
+            for path, text in segments:
+                self.set_segment(path, text)
+
+    def __contains__(self, path):
+        return self._index_of(path) >= 0
+
+    def __len__(self):
+        return len(self._paths)
+
+    @property
+    def paths(self):
+        return list(self._paths)
+
+    @property
+    def text(self):
+        if self._joined is None:
+            self._joined = self.header + "".join(self._texts)
+        return self._joined
+
+    def iter_chunks(self):
+        """The prompt as its header and segments, for writing it out without joining it."""
+        yield self.header
+        yield from self._texts
+
+    def iter_segments(self):
+        """The file segments, without the header."""
+        return iter(self._texts)
+
+    def head(self, max_chars):
+        """The first max_chars characters of `text`, gathered from the segments without joining them all."""
+        parts = []
+        remaining = max_chars
+        for chunk in self.iter_chunks():
+            if remaining <= 0:
+                break
+            parts.append(chunk[:remaining])
+            remaining -= len(chunk)
+        return "".join(parts)
+
+    def tail(self, max_chars):
+        """The last max_chars characters of `text`."""
+        parts = []
+        remaining = max_chars
+        for chunk in reversed([self.header] + self._texts):
+            if remaining <= 0:
+                break
+            parts.append(chunk[-remaining:])
+            remaining -= len(chunk)
+        return "".join(reversed(parts))
+
+    def segment_text(self, path):
+        i = self._index_of(path)
+        return self._texts[i] if i >= 0 else None
+
+    def segment_tokens(self, path):
+        i = self._index_of(path)
+        return self._token_counts[i] if i >= 0 else None
+
+    def segment_range(self, path):
+        """(start, end) character offsets of the file's segment in `text`, or None."""
+        i = self._index_of(path)
+        if i < 0:
+            return None
+        start = self._char_offset(i)
+        return start, start + len(self._texts[i])
+
+    def widget_range(self, path):
+        """(start, end) text-widget positions of the file's segment, or None."""
+        i = self._index_of(path)
+        if i < 0:
+            return None
+        start = self._widget_offset(i)
+        return start, start + self._widget_lengths[i]
+
+    def set_header(self, query_text):
+        header = format_header(query_text)
+        if header == self.header:
+            return None
+        edit = SegmentEdit(0, widget_length(self.header), header)
+        header_tokens = self._count_tokens(header)
+        self.char_count += len(header) - len(self.header)
+        self.word_count += len(header.split()) - len(self.header.split())
+        self.token_count += header_tokens - self.header_tokens
+        self.query_text = query_text
+        self.header = header
+        self.header_tokens = header_tokens
+        self._joined = None
+        self._char_starts = [len(header)]
+        self._widget_starts = [widget_length(header)]
+        return edit
+
+    def set_segment(self, path, text):
+        """Insert or replace a file's segment. Returns the SegmentEdit, or None if nothing changed."""
+        i = bisect.bisect_left(self._paths, path)
+        if i < len(self._paths) and self._paths[i] == path:
+            old_text = self._texts[i]
+            if old_text == text:
+                return None
+            w_length, words, tokens = widget_length(text), len(text.split()), self._count_tokens(text)
+            edit = SegmentEdit(self._widget_offset(i), self._widget_lengths[i], text)
+            self.char_count += len(text) - len(old_text)
+            self.word_count += words - self._word_counts[i]
+            self.token_count += tokens - self._token_counts[i]
+            self._texts[i] = text
+            self._widget_lengths[i] = w_length
+            self._word_counts[i] = words
+            self._token_counts[i] = tokens
+        elif i == len(self._paths):
+            edit = SegmentEdit(self._widget_offset(i), 0, text)
+            self._append(path, text)
+            return edit
+        else:
+            w_length, words, tokens = widget_length(text), len(text.split()), self._count_tokens(text)
+            edit = SegmentEdit(self._widget_offset(i), 0, text)
+            self.char_count += len(text)
+            self.word_count += words
+            self.token_count += tokens
+            self._paths.insert(i, path)
+            self._texts.insert(i, text)
+            self._widget_lengths.insert(i, w_length)
+            self._word_counts.insert(i, words)
+            self._token_counts.insert(i, tokens)
+        self._invalidate_from(i)
+        self._joined = None
+        return edit
+
+    def remove_segment(self, path):
+        i = self._index_of(path)
+        if i < 0:
+            return None
+        edit = SegmentEdit(self._widget_offset(i), self._widget_lengths[i], "")
+        self.char_count -= len(self._texts[i])
+        self.word_count -= self._word_counts[i]
+        self.token_count -= self._token_counts[i]
+        del self._paths[i], self._texts[i], self._widget_lengths[i], self._word_counts[i], self._token_counts[i]
+        self._invalidate_from(i)
+        self._joined = None
+        return edit
+
+    def sync(self, query_text, segments):
+        """Bring the document in line with a fresh build; returns the edits to apply in order."""
+        edits = [self.set_header(query_text)]
+        wanted = dict(segments)
+        for path in [p for p in self._paths if p not in wanted]:
+            edits.append(self.remove_segment(path))
+        for path, text in segments:
+            edits.append(self.set_segment(path, text))
+        return [edit for edit in edits if edit is not None]
+
+    def _count_tokens(self, text):
+        return self.token_counter.count(text) if self.token_counter else 0
+
+    def _index_of(self, path):
+        i = bisect.bisect_left(self._paths, path)
+        return i if i < len(self._paths) and self._paths[i] == path else -1
+
+    def _append(self, path, text):
+        """Add a segment after the last one (`path` sorts after every other)."""
+        w_length, words, tokens = widget_length(text), len(text.split()), self._count_tokens(text)
+        self.char_count += len(text)
+        self.word_count += words
+        self.token_count += tokens
+        self._paths.append(path)
+        self._texts.append(text)
+        self._widget_lengths.append(w_length)
+        self._word_counts.append(words)
+        self._token_counts.append(tokens)
+        self._joined = None
+
+    def _invalidate_from(self, i):
+        """Segment i changed length (or was inserted or removed): offsets after it are stale."""
+        del self._char_starts[i + 1:]
+        del self._widget_starts[i + 1:]
+
+    @staticmethod
+    def _extend_starts(starts, lengths):
+        """Append the running sums of `lengths` (those of the segments whose starts are missing) to `starts`."""
+        starts.extend(itertools.islice(itertools.accumulate(lengths, initial=starts[-1]), 1, None))
+
+    def _char_offset(self, i):
+        if len(self._char_starts) <= i:
+            self._extend_starts(self._char_starts, map(len, self._texts[len(self._char_starts) - 1:i]))
+        return self._char_starts[i]
+
+    def _widget_offset(self, i):
+        if len(self._widget_starts) <= i:
+            self._extend_starts(self._widget_starts, self._widget_lengths[len(self._widget_starts) - 1:i])
+        return self._widget_starts[i]
+
+
+class PromptBuildJob:
+    """
+    Assembles a prompt on a background thread.
+
+    Files are read through the shared ContentCache by a thread pool; the per-file segments are kept
+    in selection order and joined once at the end. The GUI polls `finished`/`completed_count` from
+    after() and reads `result` when done. A cancelled job never produces a result.
+    """
+
+    def __init__(self, query_text, file_infos, content_cache, token_counter=None, max_workers=None, processor=None,
+                 outline_cache=None, diff_provider=None):
+        self.query_text = query_text
+        self.file_infos = list(file_infos)
+        self.content_cache = content_cache
+        self.token_counter = token_counter
+        self.processor = processor if processor is not None and processor.enabled else None
+        self.outline_cache = outline_cache
+        # Diff mode: callable(paths) -> {path: diff} run on the worker thread; files it leaves out are unchanged
+        self.diff_provider = diff_provider
+        self._diffs = None
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+
+        self.total = len(self.file_infos)
+        self.completed_count = 0
+        self.finished = False
+        self.result = None
+
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self.run, name="PromptBuildJob", daemon=True)
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _read(self, file_info):
+        """
+        Returns (segment or None, missing, cache_hit, note, digest, original_length); note is 'truncated',
+        'binary', 'unreadable' or None, digest/original_length are only set when a processor is in use.
+        """
+        if self._cancelled.is_set():
+            return None, False, False, None, None, 0
+        if self._diffs is not None:
+            self.completed_count += 1
+            diff = self._diffs.get(file_info.file_path)
+            if diff is None:
+                return None, False, False, "unchanged", None, 0
+            segment = format_diff_segment(file_info.censored_path, diff)
+            if self.token_counter is not None:
+                self.token_counter.count(segment)
+            return segment, False, False, None, None, len(segment)
+        try:
+            file_text, hit = self.content_cache.read_entry(file_info.file_path)
+            note = "truncated" if file_text.truncated else None
+            text = file_text.text
+            outline = file_info.outline and self.outline_cache is not None
+            if outline:
+                text = self.outline_cache.outline(file_info.file_path, text)
+            if self.processor is None:
+                segment = format_segment(file_info.censored_path, text, outline)
+                digest, original_length = None, len(segment)
+            else:
+                body, digest = self.processor.process(file_info.file_path, text)
+                if self.processor.dedupe:
+                    digest = dedupe_key(file_text.text, digest, outline)
+                segment = format_segment(file_info.censored_path, body, outline)
+                original_length = len(segment) - len(body) + len(text)
+            if self.token_counter is not None:
+                # Warm the shared token cache here so the UI thread only does lookups
+                self.token_counter.count(segment)
+            return segment, False, hit, note, digest, original_length
+        except FileNotFoundError:
+            # If the file no longer exists, log and mark for removal
+            logger.warning(f"[PromptBuildJob] File missing, removing from list: {file_info.file_path}")
+            self.content_cache.invalidate(file_info.file_path)
+            return None, True, False, None, None, 0
+        except BinaryFileError:
+            logger.info(f"[PromptBuildJob] Skipping binary file {file_info.file_path}")
+            return None, False, False, "binary", None, 0
+        except OSError as e:
+            # Try reading the file; if it fails, log and skip but don't remove
+            logger.warning(f"[PromptBuildJob] Error reading file {file_info.file_path}: {e}")
+            return None, False, False, "unreadable", None, 0
+        finally:
+            self.completed_count += 1
+
+    def run(self):
+        """Build synchronously on the calling thread; start() runs this on a background thread."""
+        with timed("build_prompt", files=self.total, diff=self.diff_provider is not None) as span:
+            self._build()
+            span["cancelled"] = self.cancelled
+            if self.result is not None:
+                span["cache_hits"] = self.result.cache_hits
+                span["cache_misses"] = self.result.cache_misses
+
+    def _build(self):
+        segments = []
+        missing_paths = []
+        skipped = []
+        truncated_paths = []
+        hits = misses = 0
+        original_chars = 0
+        first_by_digest = {}  # dedupe: content digest -> (path, censored path) of the file that carries the body
+        duplicate_of = {}
+        unchanged_count = 0
+        try:
+            if self.diff_provider is not None:
+                try:
+                    self._diffs = self.diff_provider([file_info.file_path for file_info in self.file_infos])
+                except OSError as e:
+                    logger.warning(f"[PromptBuildJob] Diff unavailable, including whole files: {e}")
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="PromptRead") as pool:
+                # map() yields in submission order, so segments stay in selection order
+                results = pool.map(self._read, self.file_infos)
+                for file_info, (segment, missing, hit, note, digest, original_length) in zip(self.file_infos, results):
+                    if self._cancelled.is_set():
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        return
+                    if note == "truncated":
+                        truncated_paths.append(file_info.file_path)
+                    if note == "unchanged":
+                        unchanged_count += 1
+                    elif missing:
+                        missing_paths.append(file_info.file_path)
+                    elif segment is None:
+                        skipped.append((file_info.file_path, note))
+                    else:
+                        original_chars += original_length
+                        if self.processor is not None and self.processor.dedupe and digest is not None:
+                            if digest in first_by_digest:
+                                original_path, original_censored_path = first_by_digest[digest]
+                                segment = format_duplicate_segment(
+                                    file_info.censored_path, original_censored_path,
+                                    file_info.outline and self.outline_cache is not None,
+                                )
+                                duplicate_of[file_info.file_path] = original_path
+                            else:
+                                first_by_digest[digest] = (file_info.file_path, file_info.censored_path)
+                        segments.append((file_info.file_path, segment))
+                        if hit:
+                            hits += 1
+                        else:
+                            misses += 1
+            self.result = PromptBuildResult(
+                self.query_text, segments, missing_paths, hits, misses, skipped, truncated_paths,
+                original_chars=original_chars if self.processor is not None else None,
+                duplicate_count=len(duplicate_of), unchanged_count=unchanged_count, duplicate_of=duplicate_of,
+            )
+        except Exception as e:
+            logger.warning(f"[PromptBuildJob] Prompt build failed: {e}")
+        finally:
+            self.finished = True
+
+
+def iter_prompt_chunks(query_text, file_infos, read_text, max_workers=4, prefetch=8, missing_paths=None, skipped=None,
+                       processor=None, outline_cache=None, diff_provider=None):
+    """
+    Yield the prompt piece by piece: the header, then one segment per readable file, in order.
+
+    Reads run ahead on a small pool by at most `prefetch` files, so memory stays bounded by a handful of
+    files no matter how large the selection is. Paths that no longer exist are appended to missing_paths,
+    (path, reason) pairs for binary or unreadable files to skipped. An enabled SegmentProcessor minifies
+    and/or deduplicates bodies as they stream by; files with their outline toggle on are outlined first.
+    With a diff_provider, only the diffs of changed files are emitted.
+    """
+    yield format_header(query_text)
+    if diff_provider is not None:
+        file_infos = list(file_infos)
+        try:
+            diffs = diff_provider([file_info.file_path for file_info in file_infos])
+        except OSError as e:
+            logger.warning(f"[PromptBuilder] Diff unavailable, including whole files: {e}")
+        else:
+            for file_info in file_infos:
+                diff = diffs.get(file_info.file_path)
+                if diff is not None:
+                    yield format_diff_segment(file_info.censored_path, diff)
+            return
+    processor = processor if processor is not None and processor.enabled else None
+    first_by_digest = {}
+    outline_enabled = outline_cache is not None
+
+    def read(file_info):
+        try:
+            raw_text = content = read_text(file_info.file_path)
+            outline = file_info.outline and outline_enabled
+            if outline:
+                content = outline_cache.outline(file_info.file_path, content)
+            if processor is not None:
+                body, digest = processor.process(file_info.file_path, content)
+                if processor.dedupe:
+                    digest = dedupe_key(raw_text, digest, outline)
+                return (body, digest), None
+            return (content, None), None
+        except OSError as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="PromptStream") as pool:
+        pending = deque()
+        infos = iter(file_infos)
+        for file_info in infos:
+            pending.append((file_info, pool.submit(read, file_info)))
+            if len(pending) >= prefetch:
+                break
+        while pending:
+            file_info, future = pending.popleft()
+            next_info = next(infos, None)
+            if next_info is not None:
+                pending.append((next_info, pool.submit(read, next_info)))
+            processed, error = future.result()
+            if error is None:
+                content, digest = processed
+                if processor is not None and processor.dedupe:
+                    if digest in first_by_digest:
+                        yield format_duplicate_segment(file_info.censored_path, first_by_digest[digest],
+                                                       file_info.outline and outline_enabled)
+                        continue
+                    first_by_digest[digest] = file_info.censored_path
+                yield format_segment(file_info.censored_path, content, file_info.outline and outline_enabled)
+            elif isinstance(error, FileNotFoundError):
+                logger.warning(f"[PromptBuilder] File missing, skipping: {file_info.file_path}")
+                if missing_paths is not None:
+                    missing_paths.append(file_info.file_path)
+            elif isinstance(error, BinaryFileError):
+                logger.info(f"[PromptBuilder] Skipping binary file {file_info.file_path}")
+                if skipped is not None:
+                    skipped.append((file_info.file_path, "binary"))
+            else:
+                logger.warning(f"[PromptBuilder] Error reading file {file_info.file_path}: {error}")
+                if skipped is not None:
+                    skipped.append((file_info.file_path, "unreadable"))
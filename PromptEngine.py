@@ -0,0 +1,568 @@
+import json
+import logging
+import os
+
+from FileStore import FileStore
+from Ingestion import ExistenceCheckJob, iter_accepted_files, is_whitelisted, parse_whitelist
+from DirectoryScanner import DEFAULT_IGNORE_PATTERNS, DirectoryScanner, compile_ignore_patterns, is_path_ignored
+from PromptBuilder import PromptBuildJob, iter_prompt_chunks
+from BudgetPacker import PRIORITY_NAMES, PRIORITY_NORMAL
+from Minifier import SegmentProcessor
+from Outliner import OutlineCache
+from RelevanceIndex import RelevanceIndex, RelevanceIndexJob
+from DependencyGraph import DependencyGraph
+from GitDiff import DEFAULT_BASE, DEFAULT_CONTEXT_LINES, GitDiffCache
+from FileReader import DEFAULT_MAX_FILE_BYTES, read_file_text
+from StatePersister import StatePersister, atomic_write_text, dumps_state
+from Loggers import timed
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WHITELISTED_EXTENSIONS = ['py', 'cs', 'cpp', 'json']
+DEFAULT_TOKEN_BUDGET = 128000
+STATE_FILE_NAME = "llm_code_prompt_builder_state.json"
+STATE_VERSION = 2
+DEFAULT_WORKSPACE = "default"
+# Bits of the flags column in saved file rows
+FILE_SELECTED = 1
+FILE_PINNED = 2
+FILE_OUTLINE = 4
+
+
+def default_state_file_path():
+    """Where the app keeps its state: next to the application's scripts."""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), STATE_FILE_NAME)
+
+
+def normalize_input_path(file_path):
+    """Strip one pair of surrounding quotes (pasted paths often have them) and normalize separators."""
+    file_path = file_path.strip()
+    if (file_path.startswith('"') and file_path.endswith('"')) or (file_path.startswith("'") and file_path.endswith("'")):
+        file_path = file_path[1:-1]
+    return os.path.normpath(file_path)
+
+
+def parse_file_paths(data_string):
+    """Split a Tk drop payload into paths; paths containing spaces arrive wrapped in {braces}."""
+    with timed("parse_file_paths", chars=len(data_string)) as span:
+        file_paths = []
+        if '{' in data_string and '}' in data_string:
+            current_path = ''
+            inside_braces = False
+            for char in data_string:
+                if char == '{':
+                    inside_braces = True
+                    current_path = ''
+                elif char == '}':
+                    inside_braces = False
+                    file_paths.append(current_path.strip())
+                elif inside_braces:
+                    current_path += char
+        else:
+            file_paths = data_string.split()
+        span["paths"] = len(file_paths)
+        return file_paths
+
+
+class PromptEngine:
+    """
+    GUI-independent core of the prompt builder: the file list, whitelist filtering, directory scanning,
+    prompt assembly and state load/save.
+
+    The Tk app and the command line both drive one of these; nothing in here imports tkinter.
+    """
+
+    def __init__(self, state_file_path=None, content_cache=None, token_counter=None):
+        self.state_file_path = state_file_path or default_state_file_path()
+        self.file_entries = FileStore()
+        self.content_cache = content_cache
+        self.token_counter = token_counter
+
+        self.whitelisted_extensions = list(DEFAULT_WHITELISTED_EXTENSIONS)
+        self.ignore_patterns = list(DEFAULT_IGNORE_PATTERNS)
+        self._compiled_ignore = (None, [])  # (patterns, rules) last compiled by ignore_rules()
+        self.scan_max_depth = None
+        self.scan_max_files = None
+        self.token_budget = DEFAULT_TOKEN_BUDGET
+        # Files larger than this are cut to their head and tail (None: no cap)
+        self.max_file_bytes = DEFAULT_MAX_FILE_BYTES
+        if content_cache is not None:
+            content_cache.max_file_bytes = self.max_file_bytes
+        # Optional minify/dedupe stage of prompt assembly; its cache outlives individual builds
+        self.segment_processor = SegmentProcessor()
+        # Signature skeletons for files whose outline toggle is on, cached by (path, mtime)
+        self.outline_cache = OutlineCache()
+        # BM25 index over file contents for Rank by Query; loaded from and saved next to the state file
+        self.relevance_index = RelevanceIndex(max_file_bytes=self.max_file_bytes)
+        # Import/include graph over the loaded files, for Add Dependencies
+        self.dependency_graph = DependencyGraph(self.file_entries, self.read_text)
+        # Diff mode: selected files contribute their git diff against diff_base instead of their contents
+        self.diff_only = False
+        self.diff_base = DEFAULT_BASE
+        self.diff_context = DEFAULT_CONTEXT_LINES
+        self.git_diff_cache = GitDiffCache(max_file_bytes=self.max_file_bytes)
+        self.last_query_text = ""
+        # Folders files were added from (path -> recursive); watch mode auto-adds new files found in them
+        self.watched_folders = {}
+        # Set by enable_write_behind(); without it save_state() writes synchronously
+        self.persister = None
+        self.workspace_name = DEFAULT_WORKSPACE
+        # Saved workspaces other than the active one, kept as loaded so saving round-trips them untouched
+        self._other_workspaces = {}
+
+    # --- Settings ---
+
+    def set_whitelist(self, whitelist_input):
+        self.whitelisted_extensions = parse_whitelist(whitelist_input)
+        return self.whitelisted_extensions
+
+    def set_max_file_bytes(self, max_file_bytes):
+        self.max_file_bytes = max_file_bytes
+        if self.content_cache is not None:
+            # Part of the cache key, so entries read under another cap are simply re-read
+            self.content_cache.max_file_bytes = max_file_bytes
+        self.git_diff_cache.max_file_bytes = max_file_bytes
+        if self.relevance_index.max_file_bytes != max_file_bytes:
+            self.relevance_index.max_file_bytes = max_file_bytes
+            self.relevance_index.clear()
+
+    # --- File list ---
+
+    def add_file(self, file_path, selected=False):
+        """Add one file if its extension is whitelisted. Returns True if it was added."""
+        if not is_whitelisted(file_path, set(self.whitelisted_extensions)):
+            extension = os.path.splitext(file_path)[1].lower().lstrip('.')
+            logger.info(f"Skipping {file_path} due to extension '{extension}' not in whitelist.")
+            return False
+        return self.file_entries.add(file_path, selected=selected)
+
+    def iter_accepted_files(self, paths, recursive, cancelled=None, stats=None):
+        return iter_accepted_files(
+            paths,
+            set(self.whitelisted_extensions),
+            recursive,
+            ignore_patterns=self.ignore_patterns,
+            max_depth=self.scan_max_depth,
+            max_files=self.scan_max_files,
+            cancelled=cancelled,
+            stats=stats,
+        )
+
+    def process_directory(self, dir_path, recursive=False, selected=False):
+        """Scan a folder synchronously and add its whitelisted files in one merge. Returns the added paths."""
+        self.remember_folder(dir_path, recursive)
+        with timed("process_directory", recursive=recursive) as span:
+            added = self.file_entries.add_many(self.iter_accepted_files([dir_path], recursive), selected=selected)
+            span["added"] = len(added)
+        return added
+
+    def remember_folder(self, dir_path, recursive):
+        dir_path = os.path.normpath(os.path.abspath(dir_path))
+        self.watched_folders[dir_path] = recursive or self.watched_folders.get(dir_path, False)
+
+    def process_file_path(self, file_path, recursive=False, selected=False):
+        """Add a file or folder given as typed/pasted/dropped text. Returns the added paths."""
+        normalized_path = normalize_input_path(file_path)
+        if normalized_path in self.file_entries or not os.path.exists(normalized_path):
+            return []
+        if os.path.isdir(normalized_path):
+            return self.process_directory(normalized_path, recursive, selected)
+        return [normalized_path] if self.add_file(normalized_path, selected) else []
+
+    # --- Prompt assembly ---
+
+    def read_text(self, path):
+        if self.content_cache is not None:
+            return self.content_cache.read(path)
+        return read_file_text(path, self.max_file_bytes).text
+
+    def build_prompt(self, query_text=None, file_infos=None):
+        """Build synchronously and return a PromptBuildResult (requires a content_cache)."""
+        query_text = self.last_query_text if query_text is None else query_text
+        file_infos = self.file_entries.selected_infos() if file_infos is None else file_infos
+        job = PromptBuildJob(query_text, file_infos, self.content_cache, token_counter=self.token_counter,
+                             processor=self.segment_processor, outline_cache=self.outline_cache,
+                             diff_provider=self.diff_provider())
+        job.run()
+        return job.result
+
+    def iter_prompt(self, query_text=None, file_infos=None, missing_paths=None, skipped=None):
+        """Stream the prompt in pieces without ever holding all of it in memory."""
+        query_text = self.last_query_text if query_text is None else query_text
+        file_infos = self.file_entries.selected_infos() if file_infos is None else file_infos
+        return iter_prompt_chunks(query_text, file_infos, self.read_text, missing_paths=missing_paths, skipped=skipped,
+                                  processor=self.segment_processor, outline_cache=self.outline_cache,
+                                  diff_provider=self.diff_provider())
+
+    # --- Relevance ranking ---
+
+    def relevance_index_path(self):
+        return os.path.splitext(self.state_file_path)[0] + ".index.json"
+
+    def all_workspace_paths(self):
+        """Paths of the files in every workspace, so updating the index for one doesn't evict the others."""
+        paths = set(self.file_entries)
+        for state in self._other_workspaces.values():
+            paths.update(row[0] for row in state.get("files", []) if isinstance(row, list) and row)
+        return paths
+
+    def start_relevance_index(self):
+        """Start a RelevanceIndexJob that brings the index up to date with the loaded files."""
+        return RelevanceIndexJob(self.relevance_index, list(self.file_entries), index_path=self.relevance_index_path(),
+                                 keep_paths=self.all_workspace_paths()).start()
+
+    def rank_files(self, query_text=None, top_k=None):
+        """[(path, score)] of the loaded files for the query, best first (the index must be up to date)."""
+        query_text = self.last_query_text if query_text is None else query_text
+        return self.relevance_index.query(query_text, top_k=top_k, paths=self.file_entries)
+
+    def select_paths(self, paths, clear=False):
+        """Select the given loaded paths (after deselecting everything, with clear). Returns how many were selected."""
+        if clear:
+            self.file_entries.set_selected_indices(range(len(self.file_entries)), False)
+        count = 0
+        for path in paths:
+            if path in self.file_entries:
+                self.file_entries.set_selected(path, True)
+                count += 1
+        return count
+
+    # --- Git diff mode ---
+
+    def diff_provider(self):
+        """Callable(paths) -> {path: diff} for PromptBuildJob when diff mode is on, else None."""
+        if not self.diff_only:
+            return None
+        base, context = self.diff_base, self.diff_context
+        return lambda paths: self.git_diff_cache.diffs(paths, base, context)
+
+    def select_changed_files(self):
+        """
+        Select exactly the files that differ from diff_base in the repositories of the loaded files and watched
+        folders. Changed files not loaded yet are added when a watched folder would have picked them up.
+        Returns the selected paths; raises GitError if git fails.
+        """
+        cache = self.git_diff_cache
+        roots = set(cache.group_by_repository(self.file_entries))
+        roots.update(cache.folder_repository_root(folder) for folder in self.watched_folders)
+        roots.discard(None)
+        changed = cache.changed_paths(sorted(roots), self.diff_base)
+        # git reports absolute paths; files added by hand may be stored relative to the working directory
+        loaded = {os.path.abspath(path): path for path in self.file_entries}
+        extensions = set(self.whitelisted_extensions)
+        new_paths = [path for path in changed if path not in loaded and is_whitelisted(path, extensions)
+                     and self.watched_folder_for(path) is not None]
+        self.file_entries.add_many(new_paths)
+        changed = [loaded.get(path, path) for path in changed if path in loaded or path in self.file_entries]
+        self.select_paths(changed, clear=True)
+        logger.info(f"[PromptEngine] Selected {len(changed)} changed files ({len(new_paths)} newly added) "
+                    f"against {self.diff_base}.")
+        return changed
+
+    # --- Dependencies ---
+
+    def add_dependencies(self, depth=1):
+        """
+        Select the loaded files that the selected ones import or include, transitively up to `depth` hops
+        (None: no limit). Returns the newly selected paths.
+        """
+        selected = self.file_entries.selected_paths()
+        found = self.dependency_graph.expand(selected, depth)
+        added = [path for path in found if not self.file_entries.is_selected(path)]
+        self.select_paths(added)
+        logger.info(f"[PromptEngine] Added {len(added)} dependencies of {len(selected)} files "
+                    f"in {self.dependency_graph.last_expand_seconds * 1000:.1f} ms.")
+        return added
+
+    # --- State ---
+
+    def workspace_names(self):
+        return sorted(set(self._other_workspaces) | {self.workspace_name})
+
+    def workspace_state(self):
+        """The active workspace: settings plus one compact [path, flags(, priority)] row per file."""
+        return {
+            "whitelisted_extensions": list(self.whitelisted_extensions),
+            "ignore_patterns": list(self.ignore_patterns),
+            "scan_max_depth": self.scan_max_depth,
+            "scan_max_files": self.scan_max_files,
+            "files": self._file_rows(),
+            "folders": [[path, recursive] for path, recursive in self.watched_folders.items()],
+            # store last query that was used when Update Prompt last succeeded
+            "last_query": self.last_query_text,
+            "token_budget": self.token_budget,
+            "max_file_bytes": self.max_file_bytes,
+            "minify": self.segment_processor.minify,
+            "dedupe": self.segment_processor.dedupe,
+            "diff_only": self.diff_only,
+            "diff_base": self.diff_base,
+            "diff_context": self.diff_context,
+        }
+
+    def state_dict(self):
+        workspaces = dict(self._other_workspaces)
+        workspaces[self.workspace_name] = self.workspace_state()
+        return {"version": STATE_VERSION, "active_workspace": self.workspace_name, "workspaces": workspaces}
+
+    def _file_rows(self):
+        file_entries = self.file_entries
+        rows = []
+        for i, (path, info) in enumerate(file_entries.items()):
+            flags = ((FILE_SELECTED if file_entries.is_selected_at(i) else 0) | (FILE_PINNED if info.pinned else 0)
+                     | (FILE_OUTLINE if info.outline else 0))
+            rows.append([path, flags, info.priority] if info.priority != PRIORITY_NORMAL else [path, flags])
+        return rows
+
+    def save_state(self):
+        """Save all workspaces to the state file (atomically, in compact form)."""
+        try:
+            with timed("save_state", files=len(self.file_entries), write_behind=self.persister is not None):
+                if self.persister is not None:
+                    self.persister.submit(self.state_dict())
+                else:
+                    atomic_write_text(self.state_file_path, dumps_state(self.state_dict()))
+        except Exception as e:
+            logger.warning(f"[PromptEngine] Failed to save state: {e}")
+
+    def enable_write_behind(self):
+        """Hand state writes to a background StatePersister instead of writing on the caller's thread."""
+        if self.persister is None:
+            self.persister = StatePersister(self.state_file_path)
+        return self.persister
+
+    def close_state(self):
+        """Wait for pending background writes and stop the persister."""
+        if self.persister is not None:
+            self.persister.close()
+            self.persister = None
+
+    def read_state_file(self):
+        """The state file migrated to the current format, or None."""
+        if not os.path.exists(self.state_file_path):
+            return None
+        try:
+            with open(self.state_file_path, "r", encoding="utf-8") as f:
+                return migrate_state(json.load(f))
+        except Exception as e:
+            logger.warning(f"[PromptEngine] Failed to load state: {e}")
+            return None
+
+    def load_state(self, restore_files=True, workspace=None):
+        """Load the state file and restore `workspace` (default: the one active when it was saved)."""
+        with timed("load_state") as span:
+            state = self.read_state_file()
+            if state is None:
+                return False
+
+            workspaces = state["workspaces"]
+            self.workspace_name = workspace or state.get("active_workspace") or DEFAULT_WORKSPACE
+            if self.workspace_name not in workspaces:
+                logger.info(f"[PromptEngine] Workspace '{self.workspace_name}' does not exist yet; starting it empty.")
+            self._other_workspaces = {name: ws for name, ws in workspaces.items() if name != self.workspace_name}
+            self.apply_workspace_state(workspaces.get(self.workspace_name, {}), restore_files)
+            span["files"] = len(self.file_entries)
+        return True
+
+    def apply_workspace_state(self, state, restore_files=True):
+        """Restore whitelist, scan options, budget, last query and (optionally) the file list from a workspace."""
+        # Restore whitelist
+        exts = state.get("whitelisted_extensions")
+        if isinstance(exts, list):
+            self.whitelisted_extensions = [str(x).strip().lower() for x in exts if str(x).strip()]
+
+        # Restore folder scan options
+        ignore_patterns = state.get("ignore_patterns")
+        if isinstance(ignore_patterns, list):
+            self.ignore_patterns = [str(p).strip() for p in ignore_patterns if str(p).strip()]
+        for key in ("scan_max_depth", "scan_max_files"):
+            value = state.get(key)
+            setattr(self, key, value if isinstance(value, int) and value >= 0 else None)
+
+        # Restore token budget
+        token_budget = state.get("token_budget")
+        if isinstance(token_budget, int) and token_budget > 0:
+            self.token_budget = token_budget
+
+        # Restore the per-file size cap (null: no cap)
+        if "max_file_bytes" in state:
+            max_file_bytes = state["max_file_bytes"]
+            self.set_max_file_bytes(max_file_bytes if isinstance(max_file_bytes, int) and max_file_bytes > 0 else None)
+
+        # Restore post-processing options and diff mode; a workspace saved without them gets the defaults,
+        # not whatever the previous workspace had
+        for key in ("minify", "dedupe"):
+            setattr(self.segment_processor, key, state[key] if isinstance(state.get(key), bool) else False)
+        diff_only, diff_base, diff_context = state.get("diff_only"), state.get("diff_base"), state.get("diff_context")
+        self.diff_only = diff_only if isinstance(diff_only, bool) else False
+        self.diff_base = diff_base if isinstance(diff_base, str) and diff_base.strip() else DEFAULT_BASE
+        self.diff_context = diff_context if isinstance(diff_context, int) and diff_context >= 0 else DEFAULT_CONTEXT_LINES
+
+        # Restore last query (if any)
+        last_query = state.get("last_query")
+        if isinstance(last_query, str):
+            self.last_query_text = last_query
+
+        if restore_files:
+            self.restore_files(state.get("files", []))
+            self.watched_folders = {
+                row[0]: bool(row[1]) for row in state.get("folders", [])
+                if isinstance(row, list) and len(row) == 2 and isinstance(row[0], str)
+            }
+
+    def restore_files(self, rows):
+        """
+        Rebuild the file list from saved rows in one pass. Existence is not checked here (that would block on
+        every path); use start_existence_check() to find and mark missing files afterwards.
+        """
+        extensions = set(self.whitelisted_extensions)
+        records = []
+        for row in rows:
+            if not isinstance(row, list) or not row or not isinstance(row[0], str) or not row[0]:
+                continue
+            path = row[0]
+            if not is_whitelisted(path, extensions):
+                continue
+            flags = row[1] if len(row) > 1 and isinstance(row[1], int) else 0
+            priority = row[2] if len(row) > 2 and row[2] in PRIORITY_NAMES else PRIORITY_NORMAL
+            records.append((path, bool(flags & FILE_SELECTED), bool(flags & FILE_PINNED), priority,
+                            bool(flags & FILE_OUTLINE)))
+        count = self.file_entries.load(records)
+        logger.info(f"[PromptEngine] Restored {count} files for workspace '{self.workspace_name}'.")
+        return count
+
+    def start_existence_check(self):
+        return ExistenceCheckJob(list(self.file_entries)).start()
+
+    def mark_missing(self, paths):
+        """Flag files found missing; returns how many are still in the list."""
+        marked = 0
+        for path in paths:
+            info = self.file_entries.get(path)
+            if info is not None:
+                info.missing = True
+                marked += 1
+        return marked
+
+    # --- Watch mode ---
+
+    def ignore_rules(self):
+        """ignore_patterns compiled, recompiled only when the patterns change."""
+        patterns = tuple(self.ignore_patterns)
+        if self._compiled_ignore[0] != patterns:
+            self._compiled_ignore = (patterns, compile_ignore_patterns(patterns))
+        return self._compiled_ignore[1]
+
+    def watched_folder_for(self, path):
+        """The watched folder that `path` falls under (honoring recursion and ignore rules), or None."""
+        parent = os.path.dirname(path)
+        current = parent
+        while True:
+            recursive = self.watched_folders.get(current)
+            if recursive is not None and (recursive or current == parent):
+                if not is_path_ignored(path, current, self.ignore_rules()):
+                    return current
+            up = os.path.dirname(current)
+            if up == current:
+                return None
+            current = up
+
+    def apply_watch_events(self, events):
+        """
+        Fold a FileWatcher's WatchEvents into the file list. Returns (changed, added, removed) path lists:
+        tracked files whose content may differ now, new files picked up from watched folders, and files dropped
+        because they are gone. Created/deleted events are only hints; the disk has the final word, since editors
+        often save by deleting and re-creating a file.
+        """
+        entries = self.file_entries
+        changed = set(entries) if events.overflowed else {path for path in events.changed if path in entries}
+
+        removed = set()
+        for path in events.deleted | events.created:
+            if path in entries:
+                if os.path.exists(path):
+                    changed.add(path)
+                else:
+                    removed.add(path)
+        gone_dirs = tuple(path + os.sep for path in events.deleted if path not in entries and not os.path.exists(path))
+        if gone_dirs:
+            removed.update(path for path in entries if path.startswith(gone_dirs))
+
+        # New files are accepted exactly as a folder scan would accept them (whitelist, ignore rules, .gitignore)
+        new_by_dir = {}
+        for path in events.created:
+            if path not in entries and self.watched_folder_for(path) is not None:
+                new_by_dir.setdefault(os.path.dirname(path), set()).add(path)
+        accepted = []
+        extensions = set(self.whitelisted_extensions)
+        for dir_path, paths in new_by_dir.items():
+            scanner = DirectoryScanner(extensions, ignore_patterns=self.ignore_patterns, max_depth=0)
+            accepted.extend(path for path in scanner.scan(dir_path) if path in paths)
+        for dir_path in events.created_dirs:
+            root = self.watched_folder_for(dir_path)
+            if root is not None and self.watched_folders[root]:
+                scanner = DirectoryScanner(extensions, ignore_patterns=self.ignore_patterns)
+                accepted.extend(scanner.scan(dir_path))
+
+        added = entries.add_many(accepted)
+        entries.remove_many(removed)
+        for path in changed | removed:
+            if self.content_cache is not None:
+                self.content_cache.invalidate(path)
+            info = entries.get(path)
+            if info is not None:
+                info.token_count = None
+                info.missing = False
+                info.read_note = None
+        return sorted(changed - removed), added, sorted(removed)
+
+    # --- Workspaces ---
+
+    def switch_workspace(self, name, restore_files=True):
+        """
+        Park the active workspace and activate `name`. A workspace that does not exist yet is created
+        with the current settings and an empty file list.
+        """
+        name = name.strip()
+        if not name or name == self.workspace_name:
+            return False
+        self._other_workspaces[self.workspace_name] = self.workspace_state()
+        state = self._other_workspaces.pop(name, None)
+        self.workspace_name = name
+        if state is None:
+            self.file_entries.clear()
+            self.watched_folders = {}
+        else:
+            self.apply_workspace_state(state, restore_files)
+        return True
+
+    def delete_workspace(self, name):
+        """Delete a workspace other than the active one."""
+        return self._other_workspaces.pop(name, None) is not None
+
+
+def migrate_state(state):
+    """Bring a parsed state file up to STATE_VERSION. The original format was one flat, unversioned workspace."""
+    if not isinstance(state, dict):
+        raise ValueError("state file does not contain an object")
+    version = state.get("version")
+    if version is None:
+        files = state.get("files", [])
+        workspace = {key: value for key, value in state.items() if key != "files"}
+        workspace["files"] = [_migrate_file_state(file_state) for file_state in files if isinstance(file_state, dict)]
+        return {"version": STATE_VERSION, "active_workspace": DEFAULT_WORKSPACE,
+                "workspaces": {DEFAULT_WORKSPACE: workspace}}
+    if version > STATE_VERSION:
+        logger.warning(f"[PromptEngine] State file version {version} is newer than {STATE_VERSION}; reading what we can.")
+    if not isinstance(state.get("workspaces"), dict):
+        state["workspaces"] = {}
+    state["workspaces"] = {name: ws for name, ws in state["workspaces"].items() if isinstance(ws, dict)}
+    return state
+
+
+def _migrate_file_state(file_state):
+    flags = (FILE_SELECTED if file_state.get("selected") else 0) | (FILE_PINNED if file_state.get("pinned") else 0)
+    row = [file_state.get("path"), flags]
+    if file_state.get("priority", PRIORITY_NORMAL) != PRIORITY_NORMAL:
+        row.append(file_state["priority"])
+    return row
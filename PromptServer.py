@@ -0,0 +1,289 @@
+import hmac
+import ipaddress
+import json
+import logging
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from FileStore import FileInfo
+from Ingestion import expand_path_arguments
+from PromptBuilder import iter_prompt_chunks
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_CONCURRENT = 4
+# Largest request body accepted (the JSON list of paths and the query)
+MAX_REQUEST_BYTES = 8 * 1024 * 1024
+# How long a request waits for a free build slot before getting 503
+SLOT_TIMEOUT_SECONDS = 30
+TOKEN_HEADER = "X-Prompt-Token"
+LOOPBACK_NAMES = ("localhost", "127.0.0.1", "::1")
+
+
+def is_loopback_host(host):
+    host = host.strip("[]")
+    if host.lower() in LOOPBACK_NAMES:
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class RequestError(ValueError):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class PromptServer:
+    """
+    Long-running prompt builder behind a localhost HTTP port, for editors and scripts.
+
+    One PromptEngine (file list, ContentCache, TokenCounter, outline/minify caches) is shared by every request,
+    so a file read or counted once stays warm for the next prompt. Requests are served on their own threads;
+    at most `max_concurrent` build at once and each streams its prompt as it is assembled, so memory is bounded
+    by the content cache size plus a few files per request.
+
+        POST /prompt   {"paths": [...], "query": "...", "recursive": true, "diff": false}  -> streamed text
+        POST /count    same body                                                           -> JSON totals
+        POST /reload   re-read the state file (saved selection and settings)
+        GET  /status   JSON counters
+
+    Without "paths", the files selected in the saved state are used. Paths may be files, folders or globs.
+
+    Every request must carry the server's token in an X-Prompt-Token header (or "Authorization: Bearer ...");
+    without a `token` one is generated and printed at startup. On a loopback address, requests whose Host header
+    names anything else are refused too, so web pages can't reach the server through DNS rebinding. Binding to
+    any other address requires an explicit token.
+    """
+
+    def __init__(self, engine, host=DEFAULT_HOST, port=DEFAULT_PORT, max_concurrent=DEFAULT_MAX_CONCURRENT,
+                 workspace=None, token=None):
+        if not token and not is_loopback_host(host):
+            raise ValueError(f"serving on {host} (not a loopback address) requires a token")
+        self.engine = engine
+        self.workspace = workspace
+        self.token = token or secrets.token_urlsafe(24)
+        self.loopback_only = is_loopback_host(host)
+        self.started = time.time()
+        self.request_count = 0
+        self.active_count = 0
+        self._counter_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        # Held while the file list is read or reloaded, never while a prompt streams
+        self._state_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.httpd.daemon_threads = True
+
+    @property
+    def address(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        logger.info(f"[PromptServer] Serving {len(self.engine.file_entries)} files on {self.address}")
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.httpd.server_close()
+
+    def shutdown(self):
+        self.httpd.shutdown()
+
+    def begin_request(self):
+        with self._counter_lock:
+            self.request_count += 1
+            self.active_count += 1
+
+    def end_request(self):
+        with self._counter_lock:
+            self.active_count -= 1
+
+    def check_access(self, headers):
+        """Raise RequestError unless the request names this machine in Host and carries the token."""
+        if self.loopback_only:
+            host = headers.get("Host") or ""
+            hostname = host.rsplit(":", 1)[0] if not host.startswith("[") else host.split("]", 1)[0] + "]"
+            if not is_loopback_host(hostname):
+                raise RequestError(403, "requests must be addressed to localhost")
+        token = headers.get(TOKEN_HEADER) or ""
+        authorization = headers.get("Authorization") or ""
+        if authorization.startswith("Bearer "):
+            token = token or authorization[len("Bearer "):].strip()
+        if not hmac.compare_digest(token.encode("utf-8"), self.token.encode("utf-8")):
+            raise RequestError(401, f"missing or wrong {TOKEN_HEADER}")
+
+    # --- Requests ---
+
+    def reload(self):
+        with self._state_lock:
+            self.engine.load_state(workspace=self.workspace)
+            return len(self.engine.file_entries)
+
+    def resolve_file_infos(self, request):
+        """FileInfos for a request: its paths/folders/globs, or the saved selection."""
+        paths = request.get("paths")
+        engine = self.engine
+        with self._state_lock:
+            if not paths:
+                return engine.file_entries.selected_infos()
+            if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+                raise RequestError(400, '"paths" must be a list of strings')
+            expanded = expand_path_arguments(paths, engine.ignore_patterns)
+            accepted = engine.iter_accepted_files(expanded, bool(request.get("recursive", True)))
+            # Loaded files keep their settings (outline toggle); others are included as-is
+            return [engine.file_entries.get(path) or FileInfo(path) for path in dict.fromkeys(accepted)]
+
+    def diff_provider(self, request):
+        if not request.get("diff", self.engine.diff_only):
+            return None
+        base = request.get("base") or self.engine.diff_base
+        context = request.get("context", self.engine.diff_context)
+        if not isinstance(base, str) or not isinstance(context, int) or context < 0:
+            raise RequestError(400, '"base" must be a string and "context" a non-negative integer')
+        return lambda paths: self.engine.git_diff_cache.diffs(paths, base, context)
+
+    def iter_prompt(self, request, missing_paths=None, skipped=None):
+        query = request.get("query", self.engine.last_query_text)
+        if not isinstance(query, str):
+            raise RequestError(400, '"query" must be a string')
+        file_infos = self.resolve_file_infos(request)
+        diff_provider = self.diff_provider(request)
+        engine = self.engine
+        return len(file_infos), iter_prompt_chunks(
+            query, file_infos, engine.read_text, missing_paths=missing_paths, skipped=skipped,
+            processor=engine.segment_processor, outline_cache=engine.outline_cache, diff_provider=diff_provider,
+        )
+
+    def count(self, request):
+        missing_paths = []
+        skipped = []
+        file_count, chunks = self.iter_prompt(request, missing_paths, skipped)
+        chars = tokens = 0
+        counter = self.engine.token_counter
+        for chunk in chunks:
+            chars += len(chunk)
+            if counter is not None:
+                tokens += counter.count(chunk)
+        return {
+            "files": file_count - len(missing_paths) - len(skipped),
+            "chars": chars,
+            "tokens": tokens if counter is not None else None,
+            "missing": missing_paths,
+            "skipped": [path for path, _ in skipped],
+        }
+
+    def status(self):
+        cache = self.engine.content_cache
+        with self._counter_lock:
+            request_count, active_count = self.request_count, self.active_count
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "requests": request_count,
+            "active": active_count,
+            "files": len(self.engine.file_entries),
+            "selected": self.engine.file_entries.selected_count(),
+            "content_cache": None if cache is None else {
+                "hits": cache.hits, "misses": cache.misses, "bytes": cache.current_bytes, "max_bytes": cache.max_bytes,
+            },
+        }
+
+
+def _make_handler(server):
+
+    class PromptRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            logger.info(f"[PromptServer] {self.address_string()} {format % args}")
+
+        def do_GET(self):
+            try:
+                server.check_access(self.headers)
+                if self.path != "/status":
+                    raise RequestError(404, f"unknown path {self.path}")
+                self._send_json(200, server.status())
+            except RequestError as e:
+                self._send_json(e.status, {"error": str(e)})
+
+        def do_POST(self):
+            server.begin_request()
+            try:
+                server.check_access(self.headers)
+                request = self._read_json()
+                if self.path == "/reload":
+                    self._send_json(200, {"files": server.reload()})
+                elif self.path in ("/prompt", "/count"):
+                    if not server._slots.acquire(timeout=SLOT_TIMEOUT_SECONDS):
+                        raise RequestError(503, "too many prompts being built; try again")
+                    try:
+                        if self.path == "/count":
+                            self._send_json(200, server.count(request))
+                        else:
+                            self._stream_prompt(request)
+                    finally:
+                        server._slots.release()
+                else:
+                    raise RequestError(404, f"unknown path {self.path}")
+            except RequestError as e:
+                # The body may not have been read, so this connection can't carry another request
+                self.close_connection = True
+                self._send_json(e.status, {"error": str(e)})
+            except OSError as e:
+                # Client went away mid-stream, or git/filesystem trouble before the first byte
+                logger.warning(f"[PromptServer] Request {self.path} failed: {e}")
+                self.close_connection = True
+            finally:
+                server.end_request()
+
+        def _read_json(self):
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                raise RequestError(400, "invalid Content-Length")
+            if length > MAX_REQUEST_BYTES:
+                raise RequestError(413, "request body too large")
+            body = self.rfile.read(length) if length else b"{}"
+            try:
+                request = json.loads(body.decode("utf-8"))
+            except ValueError:
+                raise RequestError(400, "request body is not valid JSON")
+            if not isinstance(request, dict):
+                raise RequestError(400, "request body must be a JSON object")
+            return request
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _stream_prompt(self, request):
+            started = time.perf_counter()
+            file_count, chunks = server.iter_prompt(request)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("X-Prompt-Files", str(file_count))
+            self.end_headers()
+            sent = 0
+            for chunk in chunks:
+                data = chunk.encode("utf-8", "replace")
+                if data:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                    sent += len(data)
+            self.wfile.write(b"0\r\n\r\n")
+            logger.info(f"[PromptServer] Streamed {file_count} files ({sent:,} bytes) "
+                        f"in {(time.perf_counter() - started) * 1000:.0f} ms.")
+
+    return PromptRequestHandler
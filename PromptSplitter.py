@@ -0,0 +1,159 @@
+import glob
+import logging
+import os
+import re
+
+from PromptBuilder import format_header
+
+
+logger = logging.getLogger(__name__)
+
+# Part numbers assumed when reserving room for the part header, so the plan never depends on the final count
+_MAX_PART_NUMBER = 99999
+
+
+def format_part_header(query_text, number, count):
+    return f"[Part {number} of {count}]\n\n" + format_header(query_text)
+
+
+def continuation_label(segment):
+    """Label repeated at the top of each later piece of a split file: 'CONTENTS OF x:' -> 'CONTENTS OF x (continued):'."""
+    first_line = segment.split("\n", 1)[0].rstrip()
+    if first_line.endswith(":"):
+        first_line = first_line[:-1]
+    return f"{first_line} (continued):\n\n"
+
+
+def _split_points(segment, budget, continued_budget, measure):
+    """
+    (start, end) offsets cutting an oversized segment into pieces: at line breaks, and inside a line only when
+    that line alone is over budget. The first piece gets `budget`, later ones `continued_budget` (they carry a label).
+    """
+    pieces = []
+    start = position = 0
+    used = 0
+    limit = budget
+    for line in segment.splitlines(keepends=True):
+        cost = measure(line)
+        if used and cost <= limit < used + cost:
+            pieces.append((start, position))
+            start, used, limit = position, 0, continued_budget
+        if cost > limit:
+            # A line longer than a whole part: fill up the current piece, cutting by characters
+            # (fewer when that many count as more than the limit, e.g. in tokens)
+            end = position + len(line)
+            while end - start > limit or measure(segment[start:end]) > limit:
+                size = min(limit, end - start)
+                while size > 1 and measure(segment[start:start + size]) > limit:
+                    size //= 2
+                pieces.append((start, start + size))
+                start += size
+                limit = continued_budget
+            used = measure(segment[start:end])
+        else:
+            used += cost
+        position += len(line)
+    if position > start or not pieces:
+        pieces.append((start, position))
+    return pieces
+
+
+def plan_parts(query_text, segments, limit, measure=len):
+    """
+    Pack prompt segments, in order, into parts of at most `limit` (as counted by `measure`: characters by default,
+    or e.g. TokenCounter.count), each part including its "[Part i of N]" + query header.
+
+    Segments are read once and not kept. Returns the plan: one list of (segment index, start, end) pieces per part.
+    A segment is only split when it does not fit in a part on its own, and then at line breaks where possible.
+    """
+    budget = limit - measure(format_part_header(query_text, _MAX_PART_NUMBER, _MAX_PART_NUMBER))
+    if budget <= 0:
+        raise ValueError(f"a part limit of {limit} leaves no room after the query")
+    parts = [[]]
+    used = 0
+    for index, segment in enumerate(segments):
+        cost = measure(segment)
+        if cost <= budget:
+            if used + cost > budget:
+                parts.append([])
+                used = 0
+            parts[-1].append((index, 0, len(segment)))
+            used += cost
+            continue
+
+        label_cost = measure(continuation_label(segment))
+        if budget - label_cost <= 0:
+            raise ValueError(f"a part limit of {limit} leaves no room for the file labels")
+        # An oversized file starts a fresh part and its pieces fill whole parts
+        if parts[-1]:
+            parts.append([])
+        pieces = _split_points(segment, budget, budget - label_cost, measure)
+        for number, (start, end) in enumerate(pieces):
+            if number:
+                parts.append([])
+            parts[-1].append((index, start, end))
+        used = measure(segment[pieces[-1][0]:pieces[-1][1]]) + (label_cost if len(pieces) > 1 else 0)
+    return parts
+
+
+def iter_parts(query_text, segments, plan):
+    """
+    Yield (part number, text) pieces of every part, in order, from the same segments the plan was made from.
+    Each part starts with its header; only one segment is held at a time.
+    """
+    count = len(plan)
+    pieces_by_segment = {}
+    for number, part in enumerate(plan, 1):
+        for index, start, end in part:
+            pieces_by_segment.setdefault(index, []).append((number, start, end))
+
+    current = 0
+    for index, segment in enumerate(segments):
+        for number, start, end in pieces_by_segment.get(index, ()):
+            if number != current:
+                current = number
+                yield number, format_part_header(query_text, number, count)
+            yield number, (continuation_label(segment) if start else "") + segment[start:end]
+    if current == 0 and count:
+        yield 1, format_part_header(query_text, 1, count)
+
+
+def part_file_paths(path, count):
+    """'out/prompt.txt' -> ['out/prompt.part1.txt', ...], numbers zero-padded so the files sort in order."""
+    stem, extension = os.path.splitext(path)
+    width = len(str(count))
+    return [f"{stem}.part{number:0{width}d}{extension or '.txt'}" for number in range(1, count + 1)]
+
+
+def existing_part_files(path):
+    """Part files already on disk for `path`, whatever their count or number padding."""
+    stem, extension = os.path.splitext(path)
+    pattern = re.compile(re.escape(os.path.basename(stem)) + r"\.part\d+" + re.escape(extension or ".txt") + "$")
+    return [candidate for candidate in glob.glob(glob.escape(stem) + ".part*")
+            if pattern.match(os.path.basename(candidate))]
+
+
+def write_parts(query_text, segments, plan, path):
+    """
+    Stream the parts into numbered files next to `path`; returns the file paths written. Part files left from
+    an earlier, longer split of the same name are removed, so no stale part is mistaken for a current one.
+    """
+    paths = part_file_paths(path, len(plan))
+    for stale_path in set(existing_part_files(path)) - set(paths):
+        try:
+            os.remove(stale_path)
+            logger.info(f"[PromptSplitter] Removed {stale_path} left from an earlier split.")
+        except OSError as e:
+            logger.warning(f"[PromptSplitter] Could not remove stale part file {stale_path}: {e}")
+    current = None
+    try:
+        for number, text in iter_parts(query_text, segments, plan):
+            if current is None or current[0] != number:
+                if current is not None:
+                    current[1].close()
+                current = (number, open(paths[number - 1], "w", encoding="utf-8", newline="\n"))
+            current[1].write(text)
+    finally:
+        if current is not None:
+            current[1].close()
+    return paths
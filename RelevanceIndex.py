@@ -0,0 +1,274 @@
+import functools
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from FileReader import DEFAULT_MAX_FILE_BYTES, read_file_text
+from StatePersister import atomic_write_text, dumps_state
+
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]+")
+# Parts of an identifier: "HTTPServer" -> HTTP, Server; "parse_file_paths" is split on '_' first
+_SUBWORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+
+@functools.lru_cache(maxsize=65536)
+def _word_terms(word):
+    terms = [word.lower()]
+    parts = [part.lower() for piece in word.split("_") for part in _SUBWORD.findall(piece)]
+    if len(parts) > 1:
+        terms.extend(part for part in parts if len(part) > 1)
+    return terms
+
+
+def term_counts(text):
+    """{term: count} of the lower-cased terms of `text`: every identifier, plus its camelCase/snake_case parts."""
+    counts = {}
+    get = counts.get
+    for word, count in Counter(_WORD.findall(text)).items():
+        if len(word) < 2:
+            continue
+        for term in _word_terms(word):
+            counts[term] = get(term, 0) + count
+    return counts
+
+
+def tokenize(text):
+    return list(term_counts(text))
+
+
+def _stat_signature(path):
+    stat_result = os.stat(path)
+    return [stat_result.st_size, stat_result.st_mtime_ns]
+
+
+class RelevanceIndex:
+    """
+    BM25 inverted index over file contents, for ranking the loaded files against a query.
+
+    Each document remembers the (size, mtime_ns) it was indexed at, so RelevanceIndexJob only re-reads files that
+    changed. Postings are derived from the per-document term counts, which are all that is persisted.
+    Safe to query from one thread while another updates it.
+    """
+
+    def __init__(self, k1=1.2, b=0.75, max_file_bytes=DEFAULT_MAX_FILE_BYTES):
+        self.k1 = k1
+        self.b = b
+        self.max_file_bytes = max_file_bytes
+        self.last_update_seconds = None
+        self.last_query_seconds = None
+        self._docs = {}  # path -> (signature, length, {term: count})
+        self._postings = {}  # term -> {path: count}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, path):
+        return path in self._docs
+
+    def is_current(self, path, signature):
+        doc = self._docs.get(path)
+        return doc is not None and doc[0] == signature
+
+    def add_document(self, path, signature, text):
+        counts = term_counts(text)
+        length = sum(counts.values())
+        with self._lock:
+            self._remove_locked(path)
+            self._docs[path] = (signature, length, counts)
+            self._total_length += length
+            postings = self._postings
+            for term, count in counts.items():
+                posting = postings.get(term)
+                if posting is None:
+                    postings[term] = {path: count}
+                else:
+                    posting[path] = count
+
+    def remove_document(self, path):
+        with self._lock:
+            self._remove_locked(path)
+
+    def clear(self):
+        with self._lock:
+            self._docs, self._postings, self._total_length = {}, {}, 0
+
+    def retain(self, paths):
+        """Drop every document not in `paths`. Returns how many were dropped."""
+        keep = set(paths)
+        doomed = [path for path in self._docs if path not in keep]
+        with self._lock:
+            for path in doomed:
+                self._remove_locked(path)
+        return len(doomed)
+
+    def _remove_locked(self, path):
+        doc = self._docs.pop(path, None)
+        if doc is None:
+            return
+        self._total_length -= doc[1]
+        for term in doc[2]:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(path, None)
+                if not posting:
+                    del self._postings[term]
+
+    def query(self, text, top_k=None, paths=None):
+        """
+        [(path, score)] for documents matching any query term, best first; `paths` restricts the candidates
+        (e.g. to the files currently loaded) and `top_k` caps the result.
+        """
+        started = time.perf_counter()
+        terms = set(tokenize(text))
+        scores = {}
+        with self._lock:
+            doc_count = len(self._docs)
+            if doc_count and terms:
+                average_length = self._total_length / doc_count or 1.0
+                k1, b, docs = self.k1, self.b, self._docs
+                for term in terms:
+                    posting = self._postings.get(term)
+                    if not posting:
+                        continue
+                    idf = math.log(1.0 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                    for path, count in posting.items():
+                        norm = k1 * (1.0 - b + b * docs[path][1] / average_length)
+                        scores[path] = scores.get(path, 0.0) + idf * count * (k1 + 1.0) / (count + norm)
+        if paths is not None:
+            scores = {path: score for path, score in scores.items() if path in paths}
+        if top_k is None:
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        else:
+            ranked = heapq.nsmallest(top_k, scores.items(), key=lambda item: (-item[1], item[0]))
+        self.last_query_seconds = time.perf_counter() - started
+        return ranked
+
+    # --- Persistence ---
+
+    def to_dict(self):
+        with self._lock:
+            docs = {path: [signature, counts] for path, (signature, _, counts) in self._docs.items()}
+        return {"version": INDEX_VERSION, "max_file_bytes": self.max_file_bytes, "docs": docs}
+
+    def load_dict(self, data):
+        """Replace the contents from a to_dict() snapshot; snapshots from another version or byte cap are ignored."""
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            return False
+        if data.get("max_file_bytes") != self.max_file_bytes:
+            return False  # documents were cut at another size; re-index them
+        docs = {}
+        postings = {}
+        total_length = 0
+        for path, (signature, counts) in data.get("docs", {}).items():
+            length = sum(counts.values())
+            docs[path] = (signature, length, counts)
+            total_length += length
+            for term, count in counts.items():
+                posting = postings.get(term)
+                if posting is None:
+                    postings[term] = {path: count}
+                else:
+                    posting[path] = count
+        with self._lock:
+            self._docs, self._postings, self._total_length = docs, postings, total_length
+        return True
+
+    def save(self, path):
+        atomic_write_text(path, dumps_state(self.to_dict()))
+
+    def load(self, path):
+        """Load a saved index; returns False (leaving the index empty) if there is none or it is unusable."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return self.load_dict(json.load(f))
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"[RelevanceIndex] Ignoring unreadable index {path}: {e}")
+            return False
+
+
+class RelevanceIndexJob:
+    """
+    Brings a RelevanceIndex up to date with a list of paths on a worker thread.
+
+    An empty index is first loaded from `index_path` if one was saved there. Files whose (size, mtime_ns) match
+    what was indexed are skipped; the rest are read and re-indexed, and documents for paths not in `keep_paths`
+    (default: `paths`) are dropped. When anything changed, the index is written back to `index_path`.
+    The GUI polls `finished`/`completed_count` from after().
+    """
+
+    def __init__(self, index, paths, index_path=None, keep_paths=None):
+        self.index = index
+        self.paths = list(paths)
+        self.index_path = index_path
+        self.keep_paths = self.paths if keep_paths is None else keep_paths
+        self.total = len(self.paths)
+        self.completed_count = 0
+        self.updated_count = 0
+        self.removed_count = 0
+        self.elapsed = None
+        self.finished = False
+
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self.run, name="RelevanceIndexJob", daemon=True)
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def run(self):
+        started = time.perf_counter()
+        index = self.index
+        try:
+            if self.index_path and not len(index):
+                index.load(self.index_path)
+            self.removed_count = index.retain(self.keep_paths)
+            for path in self.paths:
+                if self._cancelled.is_set():
+                    break
+                self.completed_count += 1
+                try:
+                    signature = _stat_signature(path)
+                except OSError:
+                    index.remove_document(path)
+                    continue
+                if index.is_current(path, signature):
+                    continue
+                try:
+                    text = read_file_text(path, index.max_file_bytes).text
+                except OSError:
+                    text = ""  # binary or unreadable: remember the signature so it isn't retried every time
+                index.add_document(path, signature, text)
+                self.updated_count += 1
+
+            if self.index_path and (self.updated_count or self.removed_count):
+                index.save(self.index_path)
+        except Exception as e:
+            logger.warning(f"[RelevanceIndexJob] Index update failed: {e}")
+        finally:
+            self.elapsed = time.perf_counter() - started
+            index.last_update_seconds = self.elapsed
+            logger.info(f"[RelevanceIndexJob] Indexed {self.updated_count} of {self.total} files "
+                        f"({self.removed_count} dropped) in {self.elapsed:.2f}s.")
+            self.finished = True
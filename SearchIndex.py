@@ -0,0 +1,125 @@
+import bisect
+import re
+from itertools import accumulate
+
+
+SEARCH_SUBSTRING = "substring"
+SEARCH_FUZZY = "fuzzy"
+SEARCH_GLOB = "glob"
+SEARCH_REGEX = "regex"
+SEARCH_MODES = (SEARCH_SUBSTRING, SEARCH_FUZZY, SEARCH_GLOB, SEARCH_REGEX)
+
+# Rows are joined with this into one haystack; no path contains it, so patterns that can't match it never span rows
+_ROW_SEPARATOR = "\n"
+
+
+def glob_to_regex(pattern):
+    """'*' and '?' stay within one path; the glob matches anywhere in the path and must run to its end."""
+    parts = []
+    # The match is unanchored at the start already; a leading '*' would only make every attempt rescan the row
+    for char in pattern.lstrip('*'):
+        if char == '*':
+            parts.append("[^\n]*")
+        elif char == '?':
+            parts.append("[^\n]")
+        else:
+            parts.append(re.escape(char))
+    return "".join(parts) + "(?=\n|\\Z)"
+
+
+def fuzzy_to_regex(term):
+    """
+    'fsto' matches 'FileStore.py': the characters in order, anything (but a row break) in between.
+    Each gap skips up to the next wanted character only, so the regex never backtracks.
+    """
+    parts = [re.escape(term[0])]
+    for char in term[1:]:
+        parts.append(f"[^{re.escape(char)}\n]*{re.escape(char)}")
+    return "".join(parts)
+
+
+class SearchIndex:
+    """
+    Search over a FileStore's pre-lowered paths.
+
+    All paths are joined into one lowercase haystack with a parallel array of row start offsets, so a
+    substring, fuzzy or glob search is a handful of C-level str.find / regex scans plus a bisect per hit
+    rather than a Python-level test per row. The index is rebuilt lazily when the store's version changes;
+    the last result is cached, and a search term that extends the previous one only re-checks its matches.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._version = None
+        self._lower_paths = []
+        self._haystack = ""
+        self._offsets = []
+        self._last_key = None
+        self._last_rows = None
+
+    def match(self, term, mode=SEARCH_SUBSTRING):
+        """Sorted row indices whose path matches `term` (case-insensitive). Raises re.error for a bad regex."""
+        # Lowering a regex would change its escapes (\S, \W, \D, \Z, ...): it is compiled as given, ignoring case
+        if mode != SEARCH_REGEX:
+            term = term.lower()
+        self._refresh()
+        if not term:
+            return list(range(len(self._lower_paths)))
+
+        key = (term, mode)
+        if key == self._last_key:
+            return list(self._last_rows)
+
+        previous_term, previous_mode = self._last_key or (None, None)
+        if mode == SEARCH_SUBSTRING and previous_mode == SEARCH_SUBSTRING and previous_term in term:
+            # Typing one more character only ever narrows the previous matches
+            lower_paths = self._lower_paths
+            rows = [i for i in self._last_rows if term in lower_paths[i]]
+        elif mode == SEARCH_SUBSTRING:
+            rows = self._find_substring(term)
+        elif mode == SEARCH_REGEX:
+            search = re.compile(term, re.IGNORECASE).search
+            rows = [i for i, path in enumerate(self._lower_paths) if search(path)]
+        else:
+            pattern = glob_to_regex(term) if mode == SEARCH_GLOB else fuzzy_to_regex(term)
+            rows = self._find_pattern(re.compile(pattern))
+
+        self._last_key, self._last_rows = key, rows
+        return list(rows)
+
+    def _refresh(self):
+        if self._version == self.store.version:
+            return
+        self._lower_paths = [info.lower_path for _, info in self.store.items()]
+        self._haystack = _ROW_SEPARATOR.join(self._lower_paths)
+        self._offsets = [0]
+        self._offsets.extend(accumulate(len(path) + 1 for path in self._lower_paths))
+        self._version = self.store.version
+        self._last_key = self._last_rows = None
+
+    def _find_substring(self, term):
+        haystack, offsets = self._haystack, self._offsets
+        hits = haystack.count(term)
+        if not hits:
+            return []
+        if hits * 8 > len(offsets):
+            # Dense hits (short terms): one pass over the rows beats a find + bisect per hit
+            return [i for i, path in enumerate(self._lower_paths) if term in path]
+        rows = []
+        position = haystack.find(term)
+        while position >= 0:
+            row = bisect.bisect_right(offsets, position) - 1
+            rows.append(row)
+            # Skip the rest of this row: each row is reported once
+            position = haystack.find(term, offsets[row + 1])
+        return rows
+
+    def _find_pattern(self, pattern):
+        haystack, offsets = self._haystack, self._offsets
+        rows = []
+        match = pattern.search(haystack)
+        while match is not None:
+            row = bisect.bisect_right(offsets, match.start()) - 1
+            rows.append(row)
+            match = pattern.search(haystack, offsets[row + 1])
+        return rows
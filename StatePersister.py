@@ -0,0 +1,108 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+def dumps_state(state):
+    return json.dumps(state, separators=(',', ':'), ensure_ascii=False)
+
+
+def atomic_write_text(path, text):
+    """Write to a temp file in the same folder, fsync, then rename over `path`; readers never see half a file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class StatePersister:
+    """
+    Write-behind saver for the state file.
+
+    submit() hands over a snapshot and returns immediately; a worker thread serializes it compactly and writes
+    it atomically. Snapshots submitted while a write is in progress replace each other, so only the newest one
+    is written, and a snapshot identical to what is already on disk is not written at all.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.submitted_count = 0
+        self.write_count = 0
+        self.coalesced_count = 0  # snapshots replaced by a newer one before being written
+        self.redundant_count = 0  # snapshots identical to the last one written
+
+        self._pending = None
+        self._last_written = None
+        self._condition = threading.Condition()
+        self._writing = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="StatePersister", daemon=True)
+        self._thread.start()
+
+    @property
+    def skipped_writes(self):
+        return self.coalesced_count + self.redundant_count
+
+    def submit(self, state):
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("StatePersister is closed")
+            if self._pending is not None:
+                self.coalesced_count += 1
+            self._pending = state
+            self.submitted_count += 1
+            self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Block until every submitted snapshot has been written (or skipped)."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending is None and not self._writing, timeout)
+
+    def close(self, timeout=5.0):
+        self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        logger.info(
+            f"[StatePersister] {self.write_count} writes for {self.submitted_count} saves "
+            f"({self.coalesced_count} coalesced, {self.redundant_count} redundant)."
+        )
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None or self._closed)
+                if self._pending is None:
+                    return  # closed and drained
+                state, self._pending = self._pending, None
+                self._writing = True
+            try:
+                text = dumps_state(state)
+                if text == self._last_written:
+                    self.redundant_count += 1
+                else:
+                    atomic_write_text(self.path, text)
+                    self._last_written = text
+                    self.write_count += 1
+            except Exception as e:
+                logger.warning(f"[StatePersister] Failed to save state: {e}")
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
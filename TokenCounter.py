@@ -0,0 +1,146 @@
+import base64
+import glob
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+
+logger = logging.getLogger(__name__)
+
+# Rough stand-in for the cl100k/o200k pre-tokenizer (Python's re has no \p{L}): contractions, letter runs,
+# up to three digits, punctuation runs, and whitespace.
+_PRE_TOKENIZE = re.compile(r"""'(?:[sdmt]|ll|ve|re)| ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+|\s+(?!\S)|\s+""", re.IGNORECASE)
+_HEURISTIC_PIECES = re.compile(r"[^\W\d_]+|\d+|[^\w\s]|\s+")
+
+VOCAB_FILE_ENV = "LLM_PROMPT_BUILDER_VOCAB"
+
+
+class HeuristicTokenEstimator:
+    """Fast approximation: ~4 characters per token for words, 1-3 digits per token, one per punctuation mark."""
+
+    name = "heuristic"
+
+    def count(self, text):
+        tokens = 0
+        for piece in _HEURISTIC_PIECES.findall(text):
+            first = piece[0]
+            if first.isspace():
+                # Runs of indentation collapse into very few tokens
+                tokens += 1 if len(piece) > 1 or first == '\n' else 0
+            elif first.isdigit():
+                tokens += (len(piece) + 2) // 3
+            elif first.isalpha():
+                tokens += (len(piece) + 3) // 4
+            else:
+                tokens += 1
+        return tokens
+
+
+class BpeTokenEstimator:
+    """
+    Byte-level BPE over a tiktoken-format vocabulary file ("<base64 token> <rank>" per line).
+
+    Merges follow token rank like tiktoken does; only the pre-tokenizer is approximated, so counts are
+    typically within a few percent of the real encoder.
+    """
+
+    def __init__(self, vocab_path, piece_cache_size=200_000):
+        self.name = f"bpe:{os.path.basename(vocab_path)}"
+        self.ranks = {}
+        with open(vocab_path, 'rb') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2:
+                    self.ranks[base64.b64decode(parts[0])] = int(parts[1])
+        self._piece_cache = OrderedDict()
+        self._piece_cache_size = piece_cache_size
+        self._lock = threading.Lock()
+
+    def _bpe_count(self, piece):
+        ranks = self.ranks
+        if piece in ranks:
+            return 1
+        parts = [piece[i:i + 1] for i in range(len(piece))]
+        while len(parts) > 1:
+            best_rank = None
+            best_index = -1
+            for i in range(len(parts) - 1):
+                rank = ranks.get(parts[i] + parts[i + 1])
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best_rank = rank
+                    best_index = i
+            if best_rank is None:
+                break
+            parts[best_index:best_index + 2] = [parts[best_index] + parts[best_index + 1]]
+        return len(parts)
+
+    def count(self, text):
+        tokens = 0
+        cache = self._piece_cache
+        for piece in _PRE_TOKENIZE.findall(text):
+            with self._lock:
+                cached = cache.get(piece)
+            if cached is None:
+                cached = self._bpe_count(piece.encode('utf-8', 'surrogatepass'))
+                with self._lock:
+                    cache[piece] = cached
+                    if len(cache) > self._piece_cache_size:
+                        cache.popitem(last=False)
+            tokens += cached
+        return tokens
+
+
+def find_vocab_file(search_dir):
+    """$LLM_PROMPT_BUILDER_VOCAB, else the first *.tiktoken file next to the application."""
+    env_path = os.environ.get(VOCAB_FILE_ENV)
+    if env_path and os.path.isfile(env_path):
+        return env_path
+    candidates = sorted(glob.glob(os.path.join(search_dir, "*.tiktoken")))
+    return candidates[0] if candidates else None
+
+
+def load_estimator(search_dir):
+    vocab_path = find_vocab_file(search_dir)
+    if vocab_path:
+        try:
+            estimator = BpeTokenEstimator(vocab_path)
+            logger.info(f"[TokenCounter] Using BPE vocabulary {vocab_path} ({len(estimator.ranks)} tokens).")
+            return estimator
+        except (OSError, ValueError) as e:
+            logger.warning(f"[TokenCounter] Failed to load vocabulary {vocab_path}, using heuristic: {e}")
+    return HeuristicTokenEstimator()
+
+
+class TokenCounter:
+    """
+    Counts tokens with a pluggable estimator, caching results by content.
+
+    Keys are (length, hash(text)); str hashes are cached on the string object, so repeat lookups for
+    the same segment are O(1). Safe to share between threads.
+    """
+
+    def __init__(self, estimator=None, max_entries=100_000):
+        self.estimator = estimator or HeuristicTokenEstimator()
+        self.max_entries = max_entries
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self.estimator.name
+
+    def count(self, text):
+        key = (len(text), hash(text))
+        with self._lock:
+            cached = self._counts.get(key)
+            if cached is not None:
+                self._counts.move_to_end(key)
+                return cached
+        tokens = self.estimator.count(text)
+        with self._lock:
+            self._counts[key] = tokens
+            if len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return tokens
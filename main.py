@@ -1,11 +1,23 @@
 import logging
-from LLMCodePromptBuilder import LLMCodePromptBuilder
+import sys
 from Loggers import configure_console_logger
 
-configure_console_logger()
 logger = logging.getLogger(__name__)
 
 
-if __name__ == "__main__":
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        # Headless: build the prompt from the command line without ever importing Tk
+        from CommandLine import main as command_line_main
+        return command_line_main(argv)
+
+    configure_console_logger()
+    from LLMCodePromptBuilder import LLMCodePromptBuilder
     app = LLMCodePromptBuilder()
     app.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import itertools
+import random
+
+from BudgetPacker import (PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, PackCandidate, _greedy, _scaled_dp,
+                          pack_to_budget)
+
+
+def weight(candidates):
+    return sum(c.weight for c in candidates)
+
+
+def tokens(candidates):
+    return sum(c.tokens for c in candidates)
+
+
+def best_weight(candidates, capacity):
+    """Brute force optimum, for small instances."""
+    return max(weight(subset) for size in range(len(candidates) + 1)
+               for subset in itertools.combinations(candidates, size) if tokens(subset) <= capacity)
+
+
+def random_candidates(rng, count, largest):
+    priorities = (PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH)
+    return [PackCandidate(f"f{i}", rng.randint(1, largest), rng.choice(priorities)) for i in range(count)]
+
+
+def test_everything_kept_when_it_fits():
+    candidates = [PackCandidate("a", 10), PackCandidate("b", 20)]
+    result = pack_to_budget(candidates, 30)
+    assert [c.key for c in result.kept] == ["a", "b"] and not result.dropped
+    assert result.remaining_tokens == 0 and not result.over_budget
+
+
+def test_pinned_always_kept():
+    candidates = [PackCandidate("big", 80, pinned=True), PackCandidate("a", 30, PRIORITY_HIGH), PackCandidate("b", 15)]
+    result = pack_to_budget(candidates, 100)
+    assert [c.key for c in result.kept] == ["big", "b"]
+    result = pack_to_budget(candidates, 50)
+    assert [c.key for c in result.kept] == ["big"] and result.over_budget
+
+
+def test_zero_token_candidates_kept_with_no_room_left():
+    candidates = [PackCandidate("pin", 10, pinned=True), PackCandidate("empty", 0), PackCandidate("a", 5)]
+    assert [c.key for c in pack_to_budget(candidates, 10).kept] == ["pin", "empty"]
+
+
+def test_greedy_single_item_guard():
+    # Density prefers the small file, which then leaves no room for the much more valuable big one
+    candidates = [PackCandidate("small", 1, PRIORITY_LOW), PackCandidate("big", 100, PRIORITY_HIGH)]
+    assert [c.key for c in _greedy(candidates, 100)] == ["big"]
+
+
+def test_greedy_stays_under_capacity():
+    rng = random.Random(1)
+    for _ in range(50):
+        candidates = random_candidates(rng, 30, 500)
+        assert tokens(_greedy(candidates, 2000)) <= 2000
+
+
+def test_scaled_dp_is_exact_when_costs_are_not_scaled():
+    rng = random.Random(2)
+    for _ in range(40):
+        candidates = random_candidates(rng, 10, 40)
+        chosen = _scaled_dp(candidates, 100)
+        assert tokens(chosen) <= 100
+        assert weight(chosen) == best_weight(candidates, 100)
+
+
+def test_scaled_dp_stays_feasible_when_scaled():
+    rng = random.Random(3)
+    for _ in range(20):
+        candidates = random_candidates(rng, 400, 5000)
+        chosen = _scaled_dp(candidates, 200_000)
+        assert tokens(chosen) <= 200_000
+
+
+def test_pack_matches_optimum_on_small_instances():
+    rng = random.Random(4)
+    for _ in range(40):
+        candidates = random_candidates(rng, 9, 60)
+        result = pack_to_budget(candidates, 120)
+        assert result.used_tokens <= 120
+        assert weight(result.kept) == best_weight(candidates, 120)
+        assert {c.key for c in result.kept} | {c.key for c in result.dropped} == {c.key for c in candidates}
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from DirectoryScanner import DirectoryScanner, compile_ignore_patterns, is_ignored
+
+
+def ignored(patterns, rel_path, is_dir=False, base="/repo"):
+    path = os.path.join(base, *rel_path.split("/"))
+    return is_ignored([(base, compile_ignore_patterns(patterns))], path, os.path.basename(path), is_dir)
+
+
+def test_negation_last_match_wins():
+    patterns = ["*.log", "!keep.log"]
+    assert ignored(patterns, "debug.log")
+    assert not ignored(patterns, "sub/keep.log")
+    assert ignored(patterns + ["keep.log"], "keep.log")
+
+
+def test_anchoring():
+    assert ignored(["/build.txt"], "build.txt")
+    assert not ignored(["/build.txt"], "sub/build.txt")
+    assert ignored(["build.txt"], "sub/build.txt")
+    assert ignored(["docs/*.md"], "docs/a.md")
+    assert not ignored(["docs/*.md"], "sub/docs/a.md")
+    assert not ignored(["docs/*.md"], "docs/deep/a.md")
+
+
+def test_double_star():
+    assert ignored(["**/gen/*.py"], "gen/a.py")
+    assert ignored(["**/gen/*.py"], "x/y/gen/a.py")
+    assert ignored(["a/**/b"], "a/b")
+    assert ignored(["a/**/b"], "a/x/y/b")
+    assert not ignored(["a/**/b"], "c/a/x/b")
+    assert ignored(["logs/**"], "logs/x/y.txt")
+
+
+def test_dir_only():
+    assert ignored(["tmp/"], "tmp", is_dir=True)
+    assert not ignored(["tmp/"], "tmp")
+    assert ignored(["tmp"], "tmp")
+
+
+def test_comments_escapes_and_blank_lines():
+    assert compile_ignore_patterns(["# comment\n", "\n", "   \n"]) == []
+    assert ignored(["\\#name"], "#name")
+    assert ignored(["\\!name"], "!name")
+
+
+def write(root, rel_path, text=""):
+    path = root / rel_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def scan(root, **options):
+    return sorted(os.path.relpath(path, root).replace(os.sep, "/") for path in DirectoryScanner(**options).scan(str(root)))
+
+
+def test_scan_applies_nested_ignore_files(tmp_path):
+    write(tmp_path, ".gitignore", "*.log\n/top.txt\nbuild/\n")
+    write(tmp_path, "sub/.gitignore", "!keep.log\n")
+    for name in ("a.py", "top.txt", "x.log", "build/out.py", "sub/top.txt", "sub/keep.log", "sub/other.log"):
+        write(tmp_path, name)
+    assert scan(tmp_path, ignore_patterns=()) == [".gitignore", "a.py", "sub/.gitignore", "sub/keep.log", "sub/top.txt"]
+
+
+def test_scan_uses_parent_ignore_files_only_inside_a_repository(tmp_path):
+    write(tmp_path, ".gitignore", "*.txt\n")
+    write(tmp_path, "project/a.txt")
+    write(tmp_path, "project/a.py")
+    assert scan(tmp_path / "project", ignore_patterns=()) == ["a.py", "a.txt"]
+    (tmp_path / ".git").mkdir()
+    assert scan(tmp_path / "project", ignore_patterns=()) == ["a.py"]
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="no symlinks")
+def test_scan_skips_linked_folders(tmp_path):
+    write(tmp_path, "real/a.py")
+    write(tmp_path, "target.py")
+    try:
+        os.symlink(tmp_path / "real", tmp_path / "linked", target_is_directory=True)
+        os.symlink(tmp_path / "target.py", tmp_path / "link.py")
+    except OSError:
+        pytest.skip("symlinks not permitted")
+    assert scan(tmp_path, ignore_patterns=()) == ["link.py", "real/a.py", "target.py"]
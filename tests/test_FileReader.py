@@ -0,0 +1,20 @@
+from FileReader import read_file_text
+
+
+def test_newlines_normalized_like_text_mode(tmp_path):
+    path = tmp_path / "crlf.txt"
+    path.write_bytes(b"one\r\ntwo\rthree\n")
+    assert read_file_text(str(path)).text == "one\ntwo\nthree\n"
+    path.write_bytes("\ufeffone\r\ntwo\r\n".encode("utf-16-le"))
+    assert read_file_text(str(path)).text == "one\ntwo\n"
+
+
+def test_truncation_without_newlines_keeps_utf8(tmp_path):
+    path = tmp_path / "long.txt"
+    path.write_bytes("é".encode("utf-8") * 200)
+    for max_bytes in (99, 100, 101):
+        result = read_file_text(str(path), max_bytes)
+        assert result.truncated and result.encoding == "utf-8"
+        head, tail = result.text.split("\n... [truncated: ")
+        assert set(head) == {"é"}
+        assert set(tail.split("] ...\n")[1]) == {"é"}
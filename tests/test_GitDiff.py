@@ -0,0 +1,82 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from GitDiff import GitDiffCache, split_file_diffs, unquote_path
+from PromptEngine import PromptEngine
+
+
+requires_git = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+def git(root, *args):
+    subprocess.run(["git", "-C", str(root), "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    """A repository with two committed files, one of them then modified, and one untracked file; cwd is its root."""
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.py").write_text("one\ntwo\n", encoding="utf-8")
+    (tmp_path / "src" / "b.py").write_text("unchanged\n", encoding="utf-8")
+    git(tmp_path, "init", "-q")
+    git(tmp_path, "add", ".")
+    git(tmp_path, "commit", "-q", "-m", "initial")
+    (tmp_path / "src" / "a.py").write_text("one\nthree\n", encoding="utf-8")
+    (tmp_path / "src" / "new.py").write_text("fresh\n", encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_unquote_path():
+    assert unquote_path("b/plain name.txt") == "b/plain name.txt"
+    assert unquote_path('"b/t\\303\\251st.txt"') == "b/tést.txt"
+    assert unquote_path('"b/tab\\there \\"quoted\\"\\\\"') == 'b/tab\there "quoted"\\'
+
+
+def test_split_file_diffs_names():
+    patch = (
+        "diff --git a/with space.txt b/with space.txt\n"
+        "--- a/with space.txt\t\n"
+        "+++ b/with space.txt\t\n"
+        "@@ -1 +1 @@\n-old\n+new\n"
+        'diff --git "a/t\\303\\251st.txt" "b/t\\303\\251st.txt"\n'
+        '--- "a/t\\303\\251st.txt"\n'
+        '+++ "b/t\\303\\251st.txt"\n'
+        "@@ -1 +1 @@\n-x\n+y\n"
+        "diff --git a/gone.txt b/gone.txt\n"
+        "--- a/gone.txt\n"
+        "+++ /dev/null\n"
+        "@@ -1 +0,0 @@\n-bye\n"
+    )
+    diffs = split_file_diffs(patch, "/repo")
+    assert sorted(diffs) == ["/repo/tést.txt", "/repo/with space.txt"]
+    assert diffs["/repo/with space.txt"] == "@@ -1 +1 @@\n-old\n+new\n"
+
+
+@requires_git
+def test_diffs_ignore_noprefix_config(repo):
+    git(repo, "config", "diff.noprefix", "true")
+    path = str(repo / "src" / "a.py")
+    assert "+three\n" in GitDiffCache().diffs([path])[path]
+
+
+@requires_git
+def test_diffs_keyed_by_relative_paths(repo):
+    paths = [os.path.join("src", name) for name in ("a.py", "b.py", "new.py")]
+    diffs = GitDiffCache().diffs(paths)
+    assert sorted(diffs) == [os.path.join("src", "a.py"), os.path.join("src", "new.py")]
+    assert "-two\n+three\n" in diffs[os.path.join("src", "a.py")]
+    assert "+fresh\n" in diffs[os.path.join("src", "new.py")]
+
+
+@requires_git
+def test_select_changed_files_with_relative_paths(repo):
+    engine = PromptEngine(state_file_path=str(repo / "state.json"))
+    engine.set_whitelist("py")
+    for name in ("a.py", "b.py"):
+        engine.process_file_path(os.path.join("src", name))
+    assert engine.select_changed_files() == [os.path.join("src", "a.py")]
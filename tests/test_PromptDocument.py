@@ -0,0 +1,45 @@
+import random
+
+from PromptBuilder import PromptDocument, widget_length
+
+
+def check_offsets(document):
+    text = document.text
+    widget_start = widget_length(document.header)
+    for path in document.paths:
+        start, end = document.segment_range(path)
+        assert text[start:end] == document.segment_text(path)
+        assert document.widget_range(path) == (widget_start, widget_start + widget_length(document.segment_text(path)))
+        widget_start += widget_length(document.segment_text(path))
+    assert document.char_count == len(text)
+
+
+def test_offsets_follow_edits():
+    rng = random.Random(7)
+    document = PromptDocument("query", [(f"f{i:03d}", f"text {i}\n" * (i % 5 + 1)) for i in range(0, 200, 2)])
+    check_offsets(document)
+    for _ in range(300):
+        path = f"f{rng.randrange(200):03d}"
+        if rng.random() < 0.3:
+            document.remove_segment(path)
+        else:
+            document.set_segment(path, "x\U0001F600\n" * rng.randrange(1, 6))
+        if rng.random() < 0.05:
+            document.set_header(f"query {rng.random()}")
+        if rng.random() < 0.2:
+            check_offsets(document)
+    check_offsets(document)
+
+
+def test_edits_reproduce_preview_text():
+    document = PromptDocument("q", [("b", "B\n"), ("d", "D\n")])
+    preview = document.text
+    for edit in document.sync("q2", [("a", "A\n"), ("d", "DD\n")]):
+        preview = preview[:edit.start] + edit.new_text + preview[edit.start + edit.old_length:]
+    assert preview == document.text
+
+
+def test_unsorted_segments():
+    document = PromptDocument("q", [("b", "B\n"), ("a", "A\n"), ("b", "B2\n")])
+    assert document.paths == ["a", "b"]
+    check_offsets(document)
@@ -0,0 +1,83 @@
+import json
+import os
+
+import pytest
+
+from BudgetPacker import PRIORITY_HIGH, PRIORITY_LOW
+from GitDiff import DEFAULT_BASE, DEFAULT_CONTEXT_LINES
+from PromptEngine import (DEFAULT_WORKSPACE, FILE_PINNED, FILE_SELECTED, STATE_VERSION, PromptEngine,
+                          migrate_state)
+
+
+LEGACY_STATE = {
+    "whitelisted_extensions": ["py", "md"],
+    "last_query": "why?",
+    "files": [
+        {"path": "/p/a.py", "selected": True},
+        {"path": "/p/b.py", "pinned": True, "priority": PRIORITY_HIGH},
+        {"path": "/p/c.md", "selected": True, "pinned": True, "priority": PRIORITY_LOW},
+        {"path": "/p/d.py"},
+        "not a file record",
+    ],
+}
+
+
+def test_migrate_flat_state():
+    state = migrate_state(json.loads(json.dumps(LEGACY_STATE)))
+    assert state["version"] == STATE_VERSION and state["active_workspace"] == DEFAULT_WORKSPACE
+    workspace = state["workspaces"][DEFAULT_WORKSPACE]
+    assert workspace["last_query"] == "why?" and workspace["whitelisted_extensions"] == ["py", "md"]
+    assert workspace["files"] == [["/p/a.py", FILE_SELECTED], ["/p/b.py", FILE_PINNED, PRIORITY_HIGH],
+                                  ["/p/c.md", FILE_SELECTED | FILE_PINNED, PRIORITY_LOW], ["/p/d.py", 0]]
+
+
+def test_migrate_versioned_state():
+    state = {"version": STATE_VERSION, "active_workspace": "w", "workspaces": {"w": {"files": []}, "bad": []}}
+    assert migrate_state(state)["workspaces"] == {"w": {"files": []}}
+    assert migrate_state({"version": STATE_VERSION})["workspaces"] == {}
+    # Newer files are read as far as they go
+    assert migrate_state({"version": STATE_VERSION + 1, "workspaces": {"w": {}}})["workspaces"] == {"w": {}}
+    with pytest.raises(ValueError):
+        migrate_state([])
+
+
+def test_legacy_state_file_loads_and_round_trips(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text(json.dumps(LEGACY_STATE), encoding="utf-8")
+    engine = PromptEngine(state_file_path=str(path))
+    assert engine.load_state()
+    store = engine.file_entries
+    assert list(store) == ["/p/a.py", "/p/b.py", "/p/c.md", "/p/d.py"]
+    assert store.selected_paths() == ["/p/a.py", "/p/c.md"]
+    assert (store.get("/p/b.py").pinned, store.get("/p/b.py").priority) == (True, PRIORITY_HIGH)
+    assert engine.last_query_text == "why?"
+
+    engine.save_state()
+    assert json.loads(path.read_text(encoding="utf-8"))["version"] == STATE_VERSION
+    reloaded = PromptEngine(state_file_path=str(path))
+    assert reloaded.load_state()
+    assert list(reloaded.file_entries) == list(store)
+    assert reloaded.file_entries.selected_paths() == store.selected_paths()
+    assert reloaded.file_entries.get("/p/c.md").priority == PRIORITY_LOW
+
+
+def test_workspace_without_options_gets_defaults(tmp_path):
+    engine = PromptEngine(state_file_path=str(tmp_path / "state.json"))
+    engine.apply_workspace_state({"minify": True, "dedupe": True, "diff_only": True, "diff_base": "main",
+                                  "diff_context": 9})
+    assert engine.segment_processor.minify and engine.diff_base == "main"
+    engine.apply_workspace_state({"whitelisted_extensions": ["py"]})
+    assert not engine.segment_processor.minify and not engine.segment_processor.dedupe
+    assert (engine.diff_only, engine.diff_base, engine.diff_context) == (False, DEFAULT_BASE, DEFAULT_CONTEXT_LINES)
+
+
+def test_ignore_rules_recompiled_only_on_change(tmp_path):
+    engine = PromptEngine(state_file_path=str(tmp_path / "state.json"))
+    rules = engine.ignore_rules()
+    assert engine.ignore_rules() is rules
+    engine.ignore_patterns = ["*.log"]
+    assert engine.ignore_rules() is not rules
+    folder = str(tmp_path)
+    engine.watched_folders = {folder: True}
+    assert engine.watched_folder_for(os.path.join(folder, "sub", "a.py")) == folder
+    assert engine.watched_folder_for(os.path.join(folder, "sub", "a.log")) is None
@@ -0,0 +1,69 @@
+import os
+import random
+
+import pytest
+
+from PromptSplitter import _split_points, iter_parts, plan_parts, write_parts
+
+
+def word_measure(text):
+    """A stand-in for a token count: words plus line breaks."""
+    return len(text.split()) + text.count("\n")
+
+
+def random_segments(rng, count):
+    segments = []
+    for i in range(count):
+        lines = [" ".join("w" * rng.randint(1, 12) for _ in range(rng.randint(0, 30))) + "\n"
+                 for _ in range(rng.randint(1, 40))]
+        if rng.random() < 0.1:
+            lines.append("x" * rng.randint(500, 3000) + "\n")  # one line longer than a part
+        segments.append(f"CONTENTS OF f{i}.py:\n\n" + "".join(lines) + "\n\n")
+    return segments
+
+
+def part_texts(query, segments, plan):
+    texts = {}
+    for number, text in iter_parts(query, segments, plan):
+        texts[number] = texts.get(number, "") + text
+    return [texts[number] for number in sorted(texts)]
+
+
+@pytest.mark.parametrize("measure, limit", [(len, 400), (len, 1500), (word_measure, 60), (word_measure, 300)])
+def test_parts_fit_and_reassemble(measure, limit):
+    rng = random.Random(limit)
+    segments = random_segments(rng, 40)
+    plan = plan_parts("Explain.", segments, limit, measure)
+    texts = part_texts("Explain.", segments, plan)
+    assert len(texts) == len(plan)
+    assert all(measure(text) <= limit for text in texts)
+    assert "".join(segments[index][start:end] for part in plan for index, start, end in part) == "".join(segments)
+    assert all(text.startswith(f"[Part {number} of {len(plan)}]") for number, text in enumerate(texts, 1))
+
+
+def test_whole_files_are_not_split():
+    segments = ["a" * 90 + "\n", "b" * 90 + "\n", "c" * 90 + "\n"]
+    plan = plan_parts("q", segments, 250)
+    assert all(start == 0 and end == len(segments[index]) for part in plan for index, start, end in part)
+
+
+def test_split_points_prefer_line_breaks():
+    segment = "".join(f"line {i:03d}\n" for i in range(50))
+    pieces = _split_points(segment, 100, 80, len)
+    assert [end for _, end in pieces[:-1]] == [start for start, _ in pieces[1:]]
+    assert all(segment[end - 1] == "\n" for _, end in pieces)
+    assert pieces[0][1] - pieces[0][0] <= 100 and all(end - start <= 80 for start, end in pieces[1:])
+
+
+def test_limit_too_small_for_the_query():
+    with pytest.raises(ValueError):
+        plan_parts("a long query " * 20, ["x\n"], 50)
+
+
+def test_write_parts_removes_stale_parts(tmp_path):
+    path = str(tmp_path / "prompt.txt")
+    segments = ["CONTENTS OF a:\n\n" + "x\n" * 200]
+    assert len(write_parts("q", segments, plan_parts("q", segments, 120), path)) > 3
+    written = write_parts("q", segments, plan_parts("q", segments, 300), path)
+    assert len(written) == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(os.path.basename(name) for name in written)
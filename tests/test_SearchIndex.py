@@ -0,0 +1,52 @@
+import re
+
+import pytest
+
+from FileStore import FileStore
+from SearchIndex import SEARCH_FUZZY, SEARCH_GLOB, SEARCH_REGEX, SEARCH_SUBSTRING
+
+
+PATHS = ["/a/FileStore.py", "/a/module_1.py", "/a/module_x.py", "/b/README.md", "/b/sub dir/notes.md"]
+
+
+@pytest.fixture
+def store():
+    store = FileStore()
+    store.add_many(PATHS)
+    return store
+
+
+def matching(store, term, mode):
+    paths = list(store)
+    return [paths[i] for i in store.match(term, mode)]
+
+
+def test_substring_ignores_case_and_narrows(store):
+    assert matching(store, "MOD", SEARCH_SUBSTRING) == ["/a/module_1.py", "/a/module_x.py"]
+    assert matching(store, "module_1", SEARCH_SUBSTRING) == ["/a/module_1.py"]
+    assert matching(store, "", SEARCH_SUBSTRING) == PATHS
+
+
+def test_fuzzy_and_glob(store):
+    assert matching(store, "fsto", SEARCH_FUZZY) == ["/a/FileStore.py"]
+    assert matching(store, "*/b/*.md", SEARCH_GLOB) == ["/b/README.md", "/b/sub dir/notes.md"]
+    assert matching(store, "/b/*.md", SEARCH_GLOB) == ["/b/README.md", "/b/sub dir/notes.md"]
+    assert matching(store, "*.MD", SEARCH_GLOB) == ["/b/README.md", "/b/sub dir/notes.md"]
+
+
+def test_regex_keeps_escapes(store):
+    assert matching(store, r"_\D+\.py$", SEARCH_REGEX) == ["/a/module_x.py"]
+    assert matching(store, r"md\Z", SEARCH_REGEX) == ["/b/README.md", "/b/sub dir/notes.md"]
+    assert matching(store, r"\S+\s", SEARCH_REGEX) == ["/b/sub dir/notes.md"]
+    assert matching(store, r"README\.MD", SEARCH_REGEX) == ["/b/README.md"]
+
+
+def test_regex_and_substring_results_not_confused(store):
+    assert matching(store, r"\D", SEARCH_REGEX) == PATHS
+    assert matching(store, r"\d", SEARCH_REGEX) == ["/a/module_1.py"]
+    assert matching(store, "\\d", SEARCH_SUBSTRING) == []
+
+
+def test_bad_regex_raises(store):
+    with pytest.raises(re.error):
+        store.match("(", SEARCH_REGEX)